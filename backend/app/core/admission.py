@@ -0,0 +1,172 @@
+import asyncio
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from app.core.cache import get_cache_client
+from app.core.metrics import metrics
+from app.logger import get_logger
+
+logger = get_logger("admission")
+
+metrics.describe("admission_active", "Requests holding an admission slot on this worker")
+metrics.describe("admission_queue_depth", "Requests waiting for an admission slot on this worker")
+metrics.describe("admission_rejected_total", "Requests rejected by admission control, by reason")
+
+# Drop expired leases, then take a slot if the cluster is below its limit
+ACQUIRE_LEASE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[3]) then
+    redis.call('ZADD', KEYS[1], ARGV[2], ARGV[4])
+    return 1
+end
+return 0
+"""
+
+
+class AdmissionRejected(Exception):
+    """The request can't be admitted; the client should retry after `retry_after` seconds"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Too many summary requests ({reason}), retry in {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounds concurrent expensive requests per worker and across the cluster.
+
+    - at most `worker_limit` requests run at once on this worker, and at most
+      `queue_limit` more wait (up to `queue_timeout` seconds) for a slot
+    - at most `cluster_limit` run across all workers, tracked as expiring
+      leases in a Redis sorted set (skipped if Redis is unavailable)
+    - one user may hold at most `per_user_limit` running-or-waiting requests,
+      so a single user's bulk clicking can't fill the queue
+    Anything beyond that is rejected immediately with AdmissionRejected.
+    """
+
+    def __init__(self, name: str, worker_limit: int, queue_limit: int, cluster_limit: int,
+                 per_user_limit: int, queue_timeout: float, lease_seconds: int = 180):
+        self.name = name
+        self.worker_limit = worker_limit
+        self.queue_limit = queue_limit
+        self.cluster_limit = cluster_limit
+        self.per_user_limit = per_user_limit
+        self.queue_timeout = queue_timeout
+        self.lease_seconds = lease_seconds
+        self.redis_key = f"admission:{name}"
+
+        self.semaphore = asyncio.Semaphore(worker_limit)
+        self.active = 0
+        self.waiting = 0
+        self.per_user: Dict[str, int] = {}
+        self._script = None
+        self._publish()
+
+    def _publish(self):
+        metrics.set("admission_active", self.active, endpoint=self.name)
+        metrics.set("admission_queue_depth", self.waiting, endpoint=self.name)
+
+    def _reject(self, reason: str, retry_after: int):
+        metrics.inc("admission_rejected_total", endpoint=self.name, reason=reason)
+        logger.warning(f"Admission rejected for {self.name}: {reason}")
+        raise AdmissionRejected(reason, retry_after)
+
+    async def _acquire_cluster_lease(self, deadline: float) -> Optional[str]:
+        """Take a cluster-wide lease, polling until the deadline; returns the lease id"""
+        cache_client = await get_cache_client()
+        client = cache_client.client
+        if client is None:
+            return ""
+        if self._script is None:
+            self._script = client.register_script(ACQUIRE_LEASE_SCRIPT)
+
+        lease_id = uuid.uuid4().hex
+        while True:
+            now = time.time()
+            try:
+                acquired = await self._script(
+                    keys=[self.redis_key],
+                    args=[now, now + self.lease_seconds, self.cluster_limit, lease_id]
+                )
+            except Exception as e:
+                logger.error(f"Cluster admission unavailable, using worker limit only: {str(e)}")
+                return ""
+            if acquired:
+                return lease_id
+            if time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(0.25)
+
+    async def _release_cluster_lease(self, lease_id: str):
+        if not lease_id:
+            return
+        cache_client = await get_cache_client()
+        if cache_client.client is None:
+            return
+        try:
+            await cache_client.client.zrem(self.redis_key, lease_id)
+        except Exception as e:
+            logger.error(f"Error releasing admission lease: {str(e)}")
+
+    @asynccontextmanager
+    async def admit(self, user_key: str):
+        """Hold an admission slot for the duration of the block"""
+        if self.per_user.get(user_key, 0) >= self.per_user_limit:
+            self._reject("per_user", 5)
+        if self.semaphore.locked() and self.waiting >= self.queue_limit:
+            self._reject("queue_full", int(self.queue_timeout))
+
+        self.per_user[user_key] = self.per_user.get(user_key, 0) + 1
+        deadline = time.monotonic() + self.queue_timeout
+        self.waiting += 1
+        self._publish()
+        try:
+            try:
+                await asyncio.wait_for(self.semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._reject("queue_timeout", int(self.queue_timeout))
+            finally:
+                self.waiting -= 1
+                self._publish()
+
+            try:
+                lease_id = await self._acquire_cluster_lease(deadline)
+                if lease_id is None:
+                    self._reject("cluster_full", int(self.queue_timeout))
+
+                self.active += 1
+                self._publish()
+                try:
+                    yield
+                finally:
+                    self.active -= 1
+                    self._publish()
+                    await self._release_cluster_lease(lease_id)
+            finally:
+                self.semaphore.release()
+        finally:
+            self.per_user[user_key] -= 1
+            if not self.per_user[user_key]:
+                del self.per_user[user_key]
+
+
+# Global controller for the summary generation path
+summary_admission = None
+
+
+def get_summary_admission() -> AdmissionController:
+    """Get or create the summary admission controller"""
+    global summary_admission
+    if summary_admission is None:
+        summary_admission = AdmissionController(
+            "summarize",
+            worker_limit=int(os.getenv("SUMMARY_MAX_CONCURRENT_PER_WORKER", "8")),
+            queue_limit=int(os.getenv("SUMMARY_MAX_QUEUE_PER_WORKER", "16")),
+            cluster_limit=int(os.getenv("SUMMARY_MAX_CONCURRENT_CLUSTER", "32")),
+            per_user_limit=int(os.getenv("SUMMARY_MAX_PER_USER", "2")),
+            queue_timeout=float(os.getenv("SUMMARY_QUEUE_TIMEOUT_SECONDS", "10"))
+        )
+    return summary_admission
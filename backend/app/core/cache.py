@@ -1,11 +1,24 @@
+import asyncio
 import os
-import json
+import math
+import random
+import time
+import uuid
 import redis.asyncio as redis
-from typing import Optional, Any
+from typing import Optional, Any, Dict, Tuple
+from app.core.codecs import CacheSerializer
 from app.logger import get_logger
 
 logger = get_logger("cache")
 
+# Delete a lock only if it is still held with the caller's token
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
 
 class RedisCache:
     """Redis cache client for storing Claude summaries"""
@@ -13,81 +26,251 @@ class RedisCache:
     def __init__(self):
         self.redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
         self.client: Optional[redis.Redis] = None
-        self.cache_minutes = int(os.getenv("ANTHROPIC_SUMMARY_CACHE_MINUTES", "60"))
+        self._release_script = None
+        # Soft TTL: after this a summary is still served but gets refreshed in the background
+        self.cache_minutes = int(os.getenv("ANTHROPIC_SUMMARY_CACHE_MINUTES", "10080"))
+        # Hard TTL: after this Redis evicts the summary and the next viewer sees a miss
+        self.hard_cache_minutes = int(os.getenv("ANTHROPIC_SUMMARY_HARD_CACHE_MINUTES", "20160"))
+        # +/- fraction applied to both TTLs so entries written together don't expire together
+        self.ttl_jitter = float(os.getenv("SUMMARY_CACHE_TTL_JITTER", "0.1"))
+        # Early expiration aggressiveness (XFetch beta); higher refreshes earlier
+        self.early_expiration_beta = float(os.getenv("SUMMARY_CACHE_EARLY_EXPIRATION_BETA", "1.0"))
+        # Values above the threshold are stored compressed with the configured codec
+        self.serializer = CacheSerializer(
+            os.getenv("SUMMARY_CACHE_CODEC", "msgpack+zstd"),
+            int(os.getenv("SUMMARY_CACHE_COMPRESS_MIN_BYTES", "1024"))
+        )
         
         logger.info(f"Redis cache initialized with URL: {self.redis_url}")
-        logger.info(f"Cache TTL set to {self.cache_minutes} minutes")
+        logger.info(f"Cache TTL set to {self.cache_minutes} minutes (hard TTL {self.hard_cache_minutes} minutes)")
     
     async def connect(self):
         """Connect to Redis"""
         try:
-            self.client = redis.from_url(self.redis_url, decode_responses=True)
+            # Values may be binary (compressed), so responses are left as bytes
+            self.client = redis.from_url(self.redis_url, decode_responses=False)
             await self.client.ping()
             logger.info("Successfully connected to Redis")
         except Exception as e:
             logger.error(f"Failed to connect to Redis: {str(e)}")
             self.client = None
     
+    async def ping(self) -> bool:
+        """Whether Redis is reachable, reconnecting if the startup connection failed"""
+        if not self.client:
+            await self.connect()
+            if not self.client:
+                return False
+        try:
+            return bool(await self.client.ping())
+        except Exception as e:
+            logger.error(f"Redis ping failed: {str(e)}")
+            return False
+    
     async def disconnect(self):
         """Disconnect from Redis"""
         if self.client:
             await self.client.close()
             logger.info("Disconnected from Redis")
     
-    def _generate_cache_key(self, user_id: str, patient_id: int, form_id: int) -> str:
-        """Generate a unique cache key for a summary"""
-        return f"summary:{user_id}:{patient_id}:{form_id}"
+    def _generate_cache_key(self, user_id: str, patient_id: int, form_id: int, revision: str = "") -> str:
+        """
+        Generate a unique cache key for a summary.
+        
+        `revision` folds in the form, patient and prompt template versions, so
+        any change to them makes older entries unreachable (they age out via TTL).
+        """
+        return f"summary:{user_id}:{patient_id}:{form_id}:{revision}"
+    
+    def _jittered_seconds(self, minutes: int) -> int:
+        """Convert a TTL to seconds with random jitter applied"""
+        jitter = random.uniform(-self.ttl_jitter, self.ttl_jitter)
+        return max(1, int(minutes * 60 * (1 + jitter)))
     
-    async def get_summary(self, user_id: str, patient_id: int, form_id: int) -> Optional[dict]:
-        """Get a cached summary"""
+    def _should_refresh(self, entry: dict) -> bool:
+        """
+        Probabilistic early expiration (XFetch): the closer an entry is to its
+        soft expiry, and the longer it took to generate, the more likely a
+        read triggers a refresh. Past the soft expiry a refresh always triggers.
+        """
+        expires_at = entry["created_at"] + entry["soft_ttl"]
+        compute_seconds = entry.get("compute_seconds") or 1.0
+        early = -compute_seconds * self.early_expiration_beta * math.log(1.0 - random.random())
+        return time.time() + early >= expires_at
+    
+    async def get_summary_entry(self, user_id: str, patient_id: int, form_id: int, revision: str = "") -> Optional[Tuple[dict, bool]]:
+        """Get a cached summary along with whether it is due for a background refresh"""
         if not self.client:
             logger.warning("Redis client not available")
             return None
         
         try:
-            cache_key = self._generate_cache_key(user_id, patient_id, form_id)
+            cache_key = self._generate_cache_key(user_id, patient_id, form_id, revision)
             cached_data = await self.client.get(cache_key)
             
-            if cached_data:
-                logger.info(f"Cache hit for key: {cache_key}")
-                return json.loads(cached_data)
-            else:
+            if not cached_data:
                 logger.info(f"Cache miss for key: {cache_key}")
                 return None
+            
+            entry = self.serializer.decode(cached_data)
+            if "summary" not in entry or "created_at" not in entry:
+                # Entry written before soft TTLs existed - serve it and refresh it
+                logger.info(f"Cache hit (legacy entry) for key: {cache_key}")
+                return entry, True
+            
+            should_refresh = self._should_refresh(entry)
+            logger.info(f"Cache hit for key: {cache_key} (refresh={should_refresh})")
+            return entry["summary"], should_refresh
                 
         except Exception as e:
             logger.error(f"Error getting cached summary: {str(e)}")
             return None
     
-    async def set_summary(self, user_id: str, patient_id: int, form_id: int, summary_data: dict) -> bool:
-        """Cache a summary"""
+    async def get_summary(self, user_id: str, patient_id: int, form_id: int, revision: str = "") -> Optional[dict]:
+        """Get a cached summary"""
+        entry = await self.get_summary_entry(user_id, patient_id, form_id, revision)
+        return entry[0] if entry else None
+    
+    async def get_summaries(self, user_id: str, patient_id: int, form_revisions: Dict[int, str]) -> Dict[int, dict]:
+        """Get cached summaries for many forms of one patient in a single MGET round trip"""
+        if not self.client or not form_revisions:
+            return {}
+        
+        try:
+            form_ids = list(form_revisions)
+            cache_keys = [
+                self._generate_cache_key(user_id, patient_id, form_id, form_revisions[form_id])
+                for form_id in form_ids
+            ]
+            values = await self.client.mget(cache_keys)
+            
+            summaries = {}
+            for form_id, cached_data in zip(form_ids, values):
+                if cached_data:
+                    entry = self.serializer.decode(cached_data)
+                    summaries[form_id] = entry["summary"] if "created_at" in entry else entry
+            
+            logger.info(f"Batch cache lookup for patient_id={patient_id}: {len(summaries)}/{len(form_ids)} hits")
+            return summaries
+            
+        except Exception as e:
+            logger.error(f"Error getting cached summaries: {str(e)}")
+            return {}
+    
+    async def set_summary(
+        self,
+        user_id: str,
+        patient_id: int,
+        form_id: int,
+        summary_data: dict,
+        revision: str = "",
+        compute_seconds: float = 0.0
+    ) -> bool:
+        """Cache a summary with a jittered soft TTL and hard TTL"""
         if not self.client:
             logger.warning("Redis client not available")
             return False
         
         try:
-            cache_key = self._generate_cache_key(user_id, patient_id, form_id)
-            cache_value = json.dumps(summary_data)
+            cache_key = self._generate_cache_key(user_id, patient_id, form_id, revision)
+            soft_ttl = self._jittered_seconds(self.cache_minutes)
+            hard_ttl = max(soft_ttl, self._jittered_seconds(self.hard_cache_minutes))
+            cache_value = self.serializer.encode({
+                "summary": summary_data,
+                "created_at": time.time(),
+                "soft_ttl": soft_ttl,
+                "compute_seconds": compute_seconds
+            })
             
-            # Set with TTL in seconds
-            ttl_seconds = self.cache_minutes * 60
-            await self.client.setex(cache_key, ttl_seconds, cache_value)
+            # Redis only enforces the hard TTL; the soft TTL is checked on read
+            await self.client.setex(cache_key, hard_ttl, cache_value)
             
-            logger.info(f"Cached summary for key: {cache_key} with TTL: {self.cache_minutes} minutes")
+            logger.info(f"Cached summary for key: {cache_key} with soft TTL: {soft_ttl}s, hard TTL: {hard_ttl}s")
             return True
             
         except Exception as e:
             logger.error(f"Error caching summary: {str(e)}")
             return False
     
-    async def delete_summary(self, user_id: str, patient_id: int, form_id: int) -> bool:
+    async def get_value(self, key: str) -> Optional[Any]:
+        """Get a derived value (diffs, scores, ...) cached under its own key"""
+        if not self.client:
+            return None
+        
+        try:
+            cached_data = await self.client.get(key)
+            return self.serializer.decode(cached_data) if cached_data else None
+        except Exception as e:
+            logger.error(f"Error getting cached value {key}: {str(e)}")
+            return None
+    
+    async def set_value(self, key: str, value: Any, ttl_seconds: int) -> bool:
+        """Cache a derived value; keys should embed the revisions it was computed from"""
+        if not self.client:
+            return False
+        
+        try:
+            await self.client.setex(key, ttl_seconds, self.serializer.encode(value))
+            return True
+        except Exception as e:
+            logger.error(f"Error caching value {key}: {str(e)}")
+            return False
+    
+    async def acquire_refresh_lock(self, user_id: str, patient_id: int, form_id: int, revision: str = "", ttl_seconds: int = 120) -> Optional[str]:
+        """
+        Claim the right to regenerate a summary; only one worker wins per key.
+
+        Returns the holder token to release the lock with, "" when Redis is
+        unavailable (nothing to release), or None when another worker holds it.
+        """
+        if not self.client:
+            return ""
+        
+        try:
+            lock_key = f"lock:{self._generate_cache_key(user_id, patient_id, form_id, revision)}"
+            token = uuid.uuid4().hex
+            return token if await self.client.set(lock_key, token, nx=True, ex=ttl_seconds) else None
+        except Exception as e:
+            logger.error(f"Error acquiring refresh lock: {str(e)}")
+            return ""
+    
+    async def wait_for_refresh(self, user_id: str, patient_id: int, form_id: int, revision: str = "", timeout: float = 90.0) -> bool:
+        """Wait until another worker's refresh lock is released; False on timeout"""
+        if not self.client:
+            return True
+        
+        lock_key = f"lock:{self._generate_cache_key(user_id, patient_id, form_id, revision)}"
+        deadline = time.monotonic() + timeout
+        try:
+            while time.monotonic() < deadline:
+                if not await self.client.exists(lock_key):
+                    return True
+                await asyncio.sleep(0.5)
+        except Exception as e:
+            logger.error(f"Error waiting for refresh lock: {str(e)}")
+        return False
+    
+    async def release_refresh_lock(self, user_id: str, patient_id: int, form_id: int, revision: str = "", token: Optional[str] = None):
+        """Release a refresh lock taken with acquire_refresh_lock, unless it expired and another worker took it"""
+        if not self.client or not token:
+            return
+        
+        try:
+            if self._release_script is None:
+                self._release_script = self.client.register_script(RELEASE_LOCK_SCRIPT)
+            lock_key = f"lock:{self._generate_cache_key(user_id, patient_id, form_id, revision)}"
+            await self._release_script(keys=[lock_key], args=[token])
+        except Exception as e:
+            logger.error(f"Error releasing refresh lock: {str(e)}")
+    
+    async def delete_summary(self, user_id: str, patient_id: int, form_id: int, revision: str = "") -> bool:
         """Delete a cached summary"""
         if not self.client:
             logger.warning("Redis client not available")
             return False
         
         try:
-            cache_key = self._generate_cache_key(user_id, patient_id, form_id)
+            cache_key = self._generate_cache_key(user_id, patient_id, form_id, revision)
             result = await self.client.delete(cache_key)
             
             if result:
@@ -0,0 +1,127 @@
+import json
+import zlib
+from typing import Any, Dict, Optional
+from app.core.metrics import metrics
+from app.logger import get_logger
+
+logger = get_logger("codecs")
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+# Encoded values start with MAGIC followed by a one-byte codec id. 0xC1 never
+# appears in UTF-8 text, so plain JSON entries (written before codecs existed,
+# or below the compression threshold) can't be mistaken for encoded ones.
+MAGIC = b"\xc1\xce"
+
+metrics.describe("cache_values_encoded_total", "Cache values written, by codec")
+metrics.describe("cache_raw_bytes_total", "Cache value bytes serialized before compression, by codec")
+metrics.describe("cache_stored_bytes_total", "Cache value bytes written to Redis, by codec")
+
+
+class Codec:
+    """
+    Serializes cache values to bytes in two steps, pack then compress, so the
+    packed size can be checked before paying for compression; subclasses set
+    a unique codec_id
+    """
+    name = "json"
+    codec_id: Optional[int] = None
+    packs_json = True
+
+    def pack(self, value: Any) -> bytes:
+        return json.dumps(value).encode("utf-8")
+
+    def compress(self, packed: bytes) -> bytes:
+        return packed
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class JsonZlibCodec(Codec):
+    """Standard library fallback when msgpack/zstandard are not installed"""
+    name = "json+zlib"
+    codec_id = 1
+
+    def compress(self, packed: bytes) -> bytes:
+        return zlib.compress(packed, 6)
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(zlib.decompress(data))
+
+
+class MsgpackZstdCodec(Codec):
+    name = "msgpack+zstd"
+    codec_id = 2
+    packs_json = False
+
+    def __init__(self, level: int = 6):
+        self.compressor = zstandard.ZstdCompressor(level=level)
+        self.decompressor = zstandard.ZstdDecompressor()
+
+    def pack(self, value: Any) -> bytes:
+        return msgpack.packb(value, use_bin_type=True)
+
+    def compress(self, packed: bytes) -> bytes:
+        return self.compressor.compress(packed)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(self.decompressor.decompress(data), raw=False)
+
+
+def _available_codecs() -> Dict[str, Codec]:
+    codecs = {"json": Codec(), "json+zlib": JsonZlibCodec()}
+    if msgpack is not None and zstandard is not None:
+        codecs["msgpack+zstd"] = MsgpackZstdCodec()
+    return codecs
+
+
+class CacheSerializer:
+    """
+    Encodes cache values with the configured codec once their packed size
+    exceeds a threshold, and decodes any value ever written (including plain JSON).
+    """
+
+    def __init__(self, codec_name: str = "msgpack+zstd", min_bytes: int = 1024):
+        self.codecs = _available_codecs()
+        self.by_id = {c.codec_id: c for c in self.codecs.values() if c.codec_id is not None}
+        if codec_name not in self.codecs:
+            logger.warning(f"Cache codec {codec_name!r} unavailable, falling back to json+zlib")
+            codec_name = "json+zlib"
+        self.codec = self.codecs[codec_name]
+        self.min_bytes = min_bytes
+
+    def encode(self, value: Any) -> bytes:
+        codec = self.codec
+        packed = codec.pack(value)
+        if codec.codec_id is None or len(packed) < self.min_bytes:
+            if not codec.packs_json:
+                # Below the threshold, so re-serializing it as plain JSON is cheap
+                packed = self.codecs["json"].pack(value)
+            codec = self.codecs["json"]
+            encoded = packed
+        else:
+            encoded = MAGIC + bytes([codec.codec_id]) + codec.compress(packed)
+
+        metrics.inc("cache_values_encoded_total", codec=codec.name)
+        metrics.inc("cache_raw_bytes_total", len(packed), codec=codec.name)
+        metrics.inc("cache_stored_bytes_total", len(encoded), codec=codec.name)
+        return encoded
+
+    def decode(self, data: bytes) -> Any:
+        if isinstance(data, str):
+            return json.loads(data)
+        if data[:len(MAGIC)] == MAGIC:
+            codec = self.by_id.get(data[len(MAGIC)])
+            if codec is None:
+                raise ValueError(f"Unknown cache codec id {data[len(MAGIC)]}")
+            return codec.loads(data[len(MAGIC) + 1:])
+        return json.loads(data)
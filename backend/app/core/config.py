@@ -6,6 +6,8 @@ class Settings(BaseSettings):
     # Database settings
     mongodb_url: str = "mongodb://localhost:27017"
     database_name: str = "patient_dashboard"
+    # Connection pool size per worker process
+    mongodb_max_pool_size: int = 100
     
     # JWT settings
     secret_key: str = "your-secret-key-change-in-production"
@@ -0,0 +1,23 @@
+from pymongo import ReturnDocument
+
+
+async def seed_sequence(db, name: str, collection: str, field: str):
+    """Make sure a sequence starts above the highest existing value of a field"""
+    latest = await db[collection].find_one({}, {field: 1}, sort=[(field, -1)])
+    current = latest[field] if latest and latest.get(field) is not None else 0
+    await db.counters.update_one({"_id": name}, {"$max": {"value": current}}, upsert=True)
+
+
+async def next_sequence(db, name: str, count: int = 1) -> int:
+    """
+    Atomically reserve `count` consecutive IDs from a named sequence.
+
+    Returns the first ID of the reserved block.
+    """
+    counter = await db.counters.find_one_and_update(
+        {"_id": name},
+        {"$inc": {"value": count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter["value"] - count + 1
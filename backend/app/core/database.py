@@ -1,22 +1,69 @@
+import hashlib
+from typing import Optional
 from beanie import init_beanie
 from motor.motor_asyncio import AsyncIOMotorClient
 from app.core.config import settings
 from app.models.user import User
-from app.models.patient import Patient
+from app.models.patient import HPDocument, Patient
 from app.models.question import Question
 from app.models.form import Form
+from app.models.summary import Summary
+from app.logger import get_logger
+
+logger = get_logger("database")
+
+DOCUMENT_MODELS = [User, Patient, HPDocument, Question, Form, Summary]
+
+# Per-process client; each worker opens its own connection pool
+mongo_client: Optional[AsyncIOMotorClient] = None
 
 
 async def init_db():
     """Initialize database connection and Beanie ODM"""
-    client = AsyncIOMotorClient(settings.mongodb_url)
+    global mongo_client
+    mongo_client = AsyncIOMotorClient(settings.mongodb_url, maxPoolSize=settings.mongodb_max_pool_size)
     await init_beanie(
-        database=client[settings.database_name],
-        document_models=[User, Patient, Question, Form]
+        database=mongo_client[settings.database_name],
+        document_models=DOCUMENT_MODELS,
+        # Indexes are built by the migration step (ensure_indexes), not on every boot
+        skip_indexes=True
     )
 
 
+def index_version() -> str:
+    """Fingerprint of the declared indexes; changes whenever a model's indexes do"""
+    specs = []
+    for model in DOCUMENT_MODELS:
+        for index in getattr(model.Settings, "indexes", []):
+            # IndexModel, or a plain field name
+            specs.append(f"{model.Settings.name}:{getattr(index, 'document', index)}")
+    return hashlib.sha256("\n".join(sorted(specs)).encode("utf-8")).hexdigest()[:16]
+
+
+async def ensure_indexes(database):
+    """Create the models' indexes, replacing any whose options changed"""
+    await init_beanie(
+        database=database,
+        document_models=DOCUMENT_MODELS,
+        allow_index_dropping=True
+    )
+
+
+async def ping_db() -> bool:
+    """Whether the database is reachable"""
+    if mongo_client is None:
+        return False
+    try:
+        await mongo_client.admin.command("ping")
+        return True
+    except Exception as e:
+        logger.error(f"Database ping failed: {str(e)}")
+        return False
+
+
 async def close_db():
     """Close database connection"""
-    # Beanie handles connection cleanup automatically
-    pass 
\ No newline at end of file
+    global mongo_client
+    if mongo_client is not None:
+        mongo_client.close()
+        mongo_client = None
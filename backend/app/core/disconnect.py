@@ -0,0 +1,45 @@
+import asyncio
+from typing import Awaitable, TypeVar
+from fastapi import Request
+from app.core.metrics import metrics
+from app.logger import get_logger
+
+logger = get_logger("disconnect")
+
+T = TypeVar("T")
+
+metrics.describe("client_disconnects_total", "Requests abandoned by the client before a response, by endpoint")
+
+
+class ClientDisconnected(Exception):
+    """The client went away before the work finished"""
+
+
+async def cancel_on_disconnect(request: Request, work: Awaitable[T], endpoint: str, poll_interval: float = 0.5) -> T:
+    """
+    Await `work`, cancelling it if the client disconnects first.
+
+    Starlette doesn't cancel a handler when its client goes away, so long
+    waits (LLM calls) poll for the disconnect themselves. Raises
+    ClientDisconnected after cancelling the work.
+    """
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                break
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+    logger.info(f"Client disconnected from {endpoint}, cancelling")
+    metrics.inc("client_disconnects_total", endpoint=endpoint)
+    task.cancel()
+    try:
+        await task
+    except (asyncio.CancelledError, Exception):
+        pass
+    raise ClientDisconnected()
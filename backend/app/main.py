@@ -1,8 +1,10 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.core.database import init_db, close_db
-from app.routers import auth, patients, status, questions, forms
+from app.core.cache import get_cache_client, close_cache_client
+from app.routers import auth, patients, status, questions, forms, summary_jobs, analytics
 from app.logger import get_logger
 
 logger = get_logger("main")
@@ -28,6 +30,32 @@ app.include_router(auth.router)
 app.include_router(patients.router)
 app.include_router(questions.router)
 app.include_router(forms.router)
+app.include_router(summary_jobs.router)
+app.include_router(analytics.router)
+
+
+# Set once this worker's dependencies are connected; GET /ready reports it
+app.state.ready = False
+
+
+async def prewarm_services():
+    """
+    Build the lazily-initialized services in the background, so the first
+    request doesn't pay for them and startup doesn't wait on them
+    """
+    await get_cache_client()
+    try:
+        from services.claude import get_claude_service
+        claude_service = get_claude_service()
+        claude_service._get_client()
+        logger.info("Claude service initialized successfully")
+    except Exception as e:
+        logger.error(f"Failed to initialize Claude service: {e}")
+    try:
+        from services.search import refresh_patient_index
+        await refresh_patient_index()
+    except Exception as e:
+        logger.error(f"Failed to build patient search index: {e}")
 
 
 @app.on_event("startup")
@@ -37,20 +65,22 @@ async def startup_event():
     await init_db()
     logger.info("Database initialized successfully")
     
-    # Test Claude service initialization
-    try:
-        from services.claude import get_claude_service
-        claude_service = get_claude_service()
-        logger.info("Claude service initialized successfully")
-    except Exception as e:
-        logger.error(f"Failed to initialize Claude service: {e}")
+    # Held on app.state so the task isn't garbage collected mid-run
+    app.state.prewarm = asyncio.create_task(prewarm_services())
     
+    app.state.ready = True
     logger.info("Patient Dashboard API startup complete")
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Clean up on shutdown"""
+    app.state.ready = False
+    from services.claude import close_claude_service
+    from services.summary_jobs import close_summary_jobs
+    await close_summary_jobs()
+    await close_claude_service()
+    await close_cache_client()
     await close_db()
 
 
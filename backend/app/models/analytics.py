@@ -0,0 +1,35 @@
+from typing import Any, Dict, List, Optional
+from datetime import date
+from pydantic import BaseModel
+from app.models.form import FormType
+
+
+class QuestionCompletion(BaseModel):
+    qid: str
+    total: int  # times the question appears on matching forms
+    answered: int
+    completion_rate: float
+
+
+class AnswerCount(BaseModel):
+    value: Any
+    count: int
+
+
+class AnswerDistribution(BaseModel):
+    qid: str
+    by_form_type: Dict[str, List[AnswerCount]]
+
+
+class TrendPoint(BaseModel):
+    form_id: int
+    form_type: FormType
+    form_date: date
+    value: Any = None  # None when left blank on that visit
+    numeric: Optional[float] = None
+
+
+class PatientTrend(BaseModel):
+    patient_id: int
+    qid: str
+    points: List[TrendPoint]
@@ -0,0 +1,22 @@
+from typing import List, Optional
+from pydantic import BaseModel
+from app.models.form import FormType
+
+
+class DocumentationGap(BaseModel):
+    """A required question left unanswered"""
+    qid: str
+    category: Optional[str] = None
+    description: str
+    # For conditionally required questions, the answer that requires them
+    # (e.g. "Social Security Status: Yes")
+    required_by: Optional[str] = None
+
+
+class CompletenessReport(BaseModel):
+    form_id: int
+    form_type: FormType
+    score: float  # answered / required, 0-100
+    required: int
+    answered: int
+    gaps: List[DocumentationGap]
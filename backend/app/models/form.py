@@ -1,7 +1,8 @@
-from typing import Optional, Dict, Any, Union
+from typing import Optional, Dict, Any, List, Union
 from datetime import date, datetime
 from enum import Enum
-from beanie import Document
+from beanie import Document, Insert, Replace, Save, SaveChanges, before_event
+from pymongo import ASCENDING, DESCENDING, IndexModel
 from pydantic import BaseModel, Field, field_validator
 
 
@@ -19,6 +20,8 @@ class Form(Document):
     form_date: Union[date, datetime]  # Date for the visit
     form_type: FormType  # Type of form
     survey_data: Dict[str, Any]  # JSON object with form data
+    revision: int = 0  # Bumped on every write; part of summary cache keys
+    content_hash: Optional[str] = None  # Set by bulk ingestion, which bumps revision only when it changes
     
     @field_validator('form_date', mode='before')
     @classmethod
@@ -27,16 +30,37 @@ class Form(Document):
             return v.date()
         return v
     
+    @before_event(Insert, Replace, Save, SaveChanges)
+    def bump_revision(self):
+        # Raw collection writes (bulk scripts) must bump revision themselves.
+        # The content no longer matches what was ingested, so re-ingesting must bump it again
+        self.revision += 1
+        self.content_hash = None
+    
     class Settings:
         name = "forms"
         indexes = [
-            "form_id",
-            "patient_id",
-            "form_date",
-            "form_type"
+            IndexModel([("form_id", ASCENDING)], unique=True),
+            # Patient timeline, optionally narrowed to one form type
+            IndexModel([
+                ("patient_id", ASCENDING),
+                ("form_type", ASCENDING),
+                ("form_date", DESCENDING)
+            ]),
+            IndexModel([("patient_id", ASCENDING), ("form_date", DESCENDING)]),
+            IndexModel([("form_type", ASCENDING), ("form_date", DESCENDING)])
         ]
 
 
+class FormHeader(BaseModel):
+    """Projection of a form without survey_data, for listings"""
+    form_id: int
+    patient_id: int
+    form_date: Union[date, datetime]
+    form_type: FormType
+    revision: int = 0
+
+
 class FormResponse(BaseModel):
     form_id: int
     patient_id: int
@@ -63,4 +87,82 @@ class FormCreate(BaseModel):
     def validate_form_date(cls, v):
         if isinstance(v, datetime):
             return v.date()
-        return v 
\ No newline at end of file
+        return v
+    
+    @field_validator('survey_data')
+    @classmethod
+    def validate_survey_shape(cls, v):
+        # Only the shape (form type -> category -> fields); answers are checked
+        # against the question catalog by services/validation.py
+        for section, categories in v.items():
+            if section not in FormType.__members__:
+                raise ValueError(f"unknown form type section {section!r}")
+            if not isinstance(categories, dict) or not all(isinstance(fields, dict) for fields in categories.values()):
+                raise ValueError(f"{section} must map categories to objects of fields")
+        return v
+
+
+class FormValidationIssue(BaseModel):
+    """One problem found in a form's answers"""
+    path: str  # "<form type>.<category>.<field>"
+    code: str  # unknown_field, invalid_type, invalid_option, orphan_subitem
+    message: str
+
+
+class FormValidationResult(BaseModel):
+    valid: bool  # True when there are no errors; warnings don't block ingestion
+    errors: List[FormValidationIssue] = []
+    warnings: List[FormValidationIssue] = []
+
+
+class FormWriteStatus(str, Enum):
+    CREATED = "created"
+    INVALID = "invalid"  # rejected by validation; see errors
+    FAILED = "failed"  # valid, but the write failed
+
+
+class FormWriteResult(BaseModel):
+    """Outcome of writing one form; index is the record's line in a bulk upload"""
+    index: int
+    status: FormWriteStatus
+    form_id: Optional[int] = None
+    errors: List[FormValidationIssue] = []
+    warnings: List[FormValidationIssue] = []
+
+
+class BulkFormWriteResponse(BaseModel):
+    created: int
+    invalid: int
+    failed: int
+    results: List[FormWriteResult]
+
+
+class AnswerChange(BaseModel):
+    """One answered question that differs between two forms"""
+    category: str
+    qid: str
+    description: Optional[str] = None
+    left: Any = None  # None when the question is only answered on the right
+    right: Any = None  # None when the question is only answered on the left
+
+
+class FormComparison(BaseModel):
+    """Deterministic diff of two forms' answers, keyed by category and qid"""
+    patient_id: int
+    left_form_id: int
+    right_form_id: int
+    left_form_type: FormType
+    right_form_type: FormType
+    left_form_date: date
+    right_form_date: date
+    added: List[AnswerChange]  # answered on the right only
+    removed: List[AnswerChange]  # answered on the left only
+    changed: List[AnswerChange]  # answered on both, differently
+    unchanged: int
+
+    @field_validator('left_form_date', 'right_form_date', mode='before')
+    @classmethod
+    def validate_form_date(cls, v):
+        if isinstance(v, datetime):
+            return v.date()
+        return v
@@ -1,19 +1,52 @@
-from typing import Optional, Union
+import re
+from typing import List, Optional, Union
 from datetime import date, datetime
-from beanie import Document
+from beanie import Document, Insert, Replace, Save, SaveChanges, before_event
+from pymongo import ASCENDING, IndexModel
 from pydantic import BaseModel, EmailStr, Field, field_validator
 
+NAME_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def name_tokens(name: Optional[str]) -> List[str]:
+    """Lowercased words of a name, stored so patient search can prefix-match them through an index"""
+    return sorted(set(NAME_TOKEN.findall((name or "").lower())))
+
+
+class HPReference(BaseModel):
+    """Pointer from a patient to its H&P in hp_documents"""
+    sha256: str  # Hex SHA-256 of the raw XML; also the hp_documents _id and the ETag
+    size: int  # Raw XML bytes
+    compressed_size: int
+
+
+class HPDocument(Document):
+    """An H&P XML document, compressed and stored apart from the patient"""
+    id: str  # The content's SHA-256, so identical uploads share one document
+    codec: str  # "zstd", or "zlib" where zstandard is unavailable
+    data: bytes
+    size: int
+    compressed_size: int
+    created_at: datetime
+
+    class Settings:
+        name = "hp_documents"
+
 
 class Patient(Document):
     patient_id: int
     name: str
+    name_tokens: List[str] = []  # name_tokens(name); raw writes that change the name must set it too
     dob: Optional[Union[date, datetime]] = None
     gender: str
     mrn: int = Field(ge=0)  # Medical Record Number as bigint
     address: str
     phone: str
     email: EmailStr
-    xml_data: Optional[str] = None  # Store the full XML content
+    hp: Optional[HPReference] = None  # H&P XML, fetched on demand from hp_documents
+    xml_data: Optional[str] = None  # Inline H&P from before the hp_storage migration
+    revision: int = 0  # Bumped on every write; part of summary cache keys
+    content_hash: Optional[str] = None  # Set by bulk ingestion, which bumps revision only when it changes
     
     @field_validator('dob', mode='before')
     @classmethod
@@ -24,15 +57,49 @@ class Patient(Document):
             return v.date()
         return v
     
+    @before_event(Insert, Replace, Save, SaveChanges)
+    def bump_revision(self):
+        # Raw collection writes (bulk scripts) must bump revision themselves.
+        # The content no longer matches what was ingested, so re-ingesting must bump it again
+        self.revision += 1
+        self.content_hash = None
+        self.name_tokens = name_tokens(self.name)
+    
     class Settings:
         name = "patients"
         indexes = [
-            "patient_id",
-            "mrn",
+            IndexModel([("patient_id", ASCENDING)], unique=True),
+            # Bulk H&P ingestion upserts by MRN
+            IndexModel([("mrn", ASCENDING)], unique=True),
+            # Patient search matches anchored prefixes of these until its in-memory
+            # index is built, and returns the matches in name order
+            "name_tokens",
             "name"
         ]
 
 
+class PatientRevision(BaseModel):
+    """Projection used to build summary cache keys without loading xml_data"""
+    patient_id: int
+    revision: int = 0
+
+
+class PatientHP(BaseModel):
+    """Projection used to find a patient's H&P"""
+    patient_id: int
+    hp: Optional[HPReference] = None
+    xml_data: Optional[str] = None
+
+
+class PatientSearchResult(BaseModel):
+    """Patient fields returned by typeahead search"""
+    patient_id: int
+    name: str
+    dob: Optional[Union[date, datetime]] = None
+    mrn: int
+    phone: str
+
+
 class PatientResponse(BaseModel):
     patient_id: int
     name: str
@@ -42,7 +109,8 @@ class PatientResponse(BaseModel):
     address: str
     phone: str
     email: EmailStr
-    xml_data: Optional[str] = None
+    hp: Optional[HPReference] = None  # Quality administrators only; the XML is at GET /patients/{id}/hp
+    has_hp: bool = False  # GET /patients/{id}/hp has an H&P, stored or not yet migrated (quality administrators only)
     
     @field_validator('dob', mode='before')
     @classmethod
@@ -52,6 +120,14 @@ class PatientResponse(BaseModel):
         if isinstance(v, datetime):
             return v.date()
         return v
+    
+    class Settings:
+        # has_hp is computed server-side so an inline xml_data is never loaded
+        projection = {
+            "patient_id": 1, "name": 1, "dob": 1, "gender": 1, "mrn": 1,
+            "address": 1, "phone": 1, "email": 1, "hp": 1,
+            "has_hp": {"$or": [{"$gt": ["$hp", None]}, {"$gt": ["$xml_data", ""]}]}
+        }
 
 
 class PatientCreate(BaseModel):
@@ -1,5 +1,6 @@
 from typing import Optional, Dict, Any, List
 from beanie import Document
+from pymongo import ASCENDING, IndexModel
 from pydantic import BaseModel
 
 
@@ -10,16 +11,37 @@ class Question(Document):
     subitems: Optional[Dict[str, List[Dict[str, Any]]]] = None
     visit_type: Optional[str] = None  # SOC, ROC, etc.
     category: Optional[str] = None  # Patient_Tracking, etc.
+    definition_hash: Optional[str] = None  # Set by the migration runner to detect schema changes
     
     class Settings:
         name = "questions"
         indexes = [
+            # A qid is only unique within its visit type and category
+            # (e.g. SOC reuses "Additional interventions inquiry" per section)
+            IndexModel(
+                [("visit_type", ASCENDING), ("category", ASCENDING), ("qid", ASCENDING)],
+                unique=True
+            ),
             "qid",
-            "visit_type",
             "category"
         ]
 
 
+class QuestionDescription(BaseModel):
+    """Projection of a question used to label answers"""
+    qid: str
+    description: str
+    category: Optional[str] = None
+
+
+class QuestionSearchResult(BaseModel):
+    """Question fields returned by catalog search"""
+    qid: str
+    description: str
+    visit_type: Optional[str] = None
+    category: Optional[str] = None
+
+
 class QuestionResponse(BaseModel):
     qid: str
     description: str
@@ -0,0 +1,24 @@
+from typing import List
+from pydantic import BaseModel
+
+
+class ReconciledItem(BaseModel):
+    """An H&P entry and the form entry it was matched to"""
+    key: str  # normalized name used for matching
+    hp: str
+    form: str
+    match: str  # "exact" (same normalized name or code) or "fuzzy"
+
+
+class ReconciledList(BaseModel):
+    matched: List[ReconciledItem]
+    hp_only: List[str]
+    form_only: List[str]
+
+
+class Reconciliation(BaseModel):
+    """H&P vs form medications and diagnoses"""
+    form_id: int
+    patient_id: int
+    medications: ReconciledList
+    diagnoses: ReconciledList
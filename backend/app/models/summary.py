@@ -0,0 +1,80 @@
+from typing import Optional, Union
+from datetime import date, datetime
+from enum import Enum
+from beanie import Document
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pydantic import BaseModel, field_validator
+from app.models.form import FormType
+
+
+class Summary(Document):
+    """
+    Every summary generated, kept after Redis evicts or loses it.
+
+    Summaries of the same form revision for the same user type are built from
+    the same prompt, so the newest one is served to any user of that type
+    whose Redis entry is missing.
+    """
+    form_id: int
+    patient_id: int
+    revision: str  # summary_revision(): form, patient, prompt template and catalog versions
+    user_type: str
+    username: str  # Who it was generated for
+    summary: str
+    prompt_hash: str  # SHA-256 of the prompt sent to Claude
+    model: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+    compute_seconds: float = 0.0
+    created_at: datetime
+    
+    class Settings:
+        name = "summaries"
+        indexes = [
+            # Read-through lookups (newest first), and a form's summary history
+            IndexModel([
+                ("form_id", ASCENDING),
+                ("revision", ASCENDING),
+                ("user_type", ASCENDING),
+                ("created_at", DESCENDING)
+            ])
+        ]
+
+
+class SummaryResponse(BaseModel):
+    summary: str
+    user_type: str
+    form_id: int
+
+
+class FormSummaryItem(BaseModel):
+    """A form in a patient's visit list with its cached summary, if any"""
+    form_id: int
+    form_type: FormType
+    form_date: Union[date, datetime]
+    summary: Optional[SummaryResponse] = None
+    
+    @field_validator('form_date', mode='before')
+    @classmethod
+    def validate_form_date(cls, v):
+        if isinstance(v, datetime):
+            return v.date()
+        return v
+
+
+class SummaryJobStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class SummaryJobResponse(BaseModel):
+    job_id: str
+    form_id: int
+    status: SummaryJobStatus
+    status_url: str
+    result: Optional[SummaryResponse] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
@@ -1,6 +1,7 @@
 from enum import Enum
 from typing import Optional
 from beanie import Document
+from pymongo import ASCENDING, IndexModel
 from pydantic import BaseModel
 
 
@@ -18,8 +19,8 @@ class User(Document):
     class Settings:
         name = "users"
         indexes = [
-            "username",
-            "user_id"
+            IndexModel([("username", ASCENDING)], unique=True),
+            IndexModel([("user_id", ASCENDING)], unique=True)
         ]
 
 
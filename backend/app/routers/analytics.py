@@ -0,0 +1,61 @@
+import asyncio
+from datetime import date
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app.models.user import User
+from app.models.form import FormType
+from app.models.analytics import AnswerDistribution, PatientTrend, QuestionCompletion
+from app.routers.auth import get_current_user
+from app.logger import get_logger
+
+logger = get_logger("analytics_router")
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+
+def _store():
+    # Imported here so NumPy isn't loaded until analytics are first used
+    from services.analytics import get_answer_store
+    store = get_answer_store()
+    if store is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Analytics store has not been materialized yet (run scripts/materialize_answers.py)"
+        )
+    return store
+
+
+@router.get("/completion", response_model=List[QuestionCompletion])
+async def get_completion(
+    form_type: Optional[FormType] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    qid: Optional[List[str]] = Query(None, description="Limit to these questions"),
+    current_user: User = Depends(get_current_user)
+):
+    """Completion rate per question over forms in a date range, least complete first"""
+    # Aggregates run off the event loop; NumPy releases the GIL for most of the work
+    return await asyncio.to_thread(_store().completion, form_type.value if form_type else None, start, end, qid)
+
+
+@router.get("/distribution", response_model=AnswerDistribution)
+async def get_distribution(
+    qid: str,
+    form_type: Optional[FormType] = None,
+    limit: int = Query(20, ge=1, le=200),
+    current_user: User = Depends(get_current_user)
+):
+    """Most common answers to a question, per form type"""
+    by_form_type = await asyncio.to_thread(_store().distribution, qid, form_type.value if form_type else None, limit)
+    return AnswerDistribution(qid=qid, by_form_type=by_form_type)
+
+
+@router.get("/patients/{patient_id}/trend", response_model=PatientTrend)
+async def get_patient_trend(
+    patient_id: int,
+    qid: str,
+    current_user: User = Depends(get_current_user)
+):
+    """A patient's answers to one question across their visits, oldest first"""
+    points = await asyncio.to_thread(_store().trend, patient_id, qid)
+    return PatientTrend(patient_id=patient_id, qid=qid, points=points)
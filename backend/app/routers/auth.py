@@ -40,6 +40,16 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     return user
 
 
+async def get_hp_reader(current_user: User = Depends(get_current_user)) -> User:
+    """Current user, provided they may read H&P content (quality administrators only)"""
+    if current_user.user_type.value != "quality_administrator":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="The H&P is only available to quality administrators"
+        )
+    return current_user
+
+
 @router.post("/login", response_model=Token)
 async def login(user_credentials: UserLogin):
     """Login endpoint to authenticate user and return JWT token"""
@@ -1,20 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response
 from typing import List, Optional
 from app.models.user import User
-from app.models.form import Form, FormResponse
+from app.models.form import (
+    BulkFormWriteResponse, Form, FormComparison, FormCreate, FormResponse, FormValidationResult,
+    FormWriteResult, FormWriteStatus
+)
 from app.models.patient import Patient
-from app.routers.auth import get_current_user
-from services.claude import get_claude_service
-from prompts.form import generate_summary_prompt
-from app.core.cache import get_cache_client
-from pydantic import BaseModel
+from app.routers.auth import get_current_user, get_hp_reader
+from services.summary import generate_form_summary, get_cached_summary, get_summary_revision, refresh_form_summary
+from services.summary_jobs import get_summary_jobs, job_response
+from services.form_diff import compare_forms
+from services.completeness import score_form
+from services.reconciliation import reconcile_form
+from services.hp_store import load_hp_text
+from services.decoder import get_form_decoder
+from services.validation import get_form_validator
+from services.form_writes import bulk_create_forms, create_form
+from services.claude import ClaudeAPIError, ClaudeUnavailableError
+from app.core.admission import AdmissionRejected, get_summary_admission
+from app.core.disconnect import ClientDisconnected, cancel_on_disconnect
+from app.models.summary import SummaryJobResponse, SummaryResponse
+from app.models.completeness import CompletenessReport
+from app.models.reconciliation import Reconciliation
 from app.logger import get_logger
 
 logger = get_logger("forms_router")
 
-# Test logging on module import
-logger.info("Forms router module loaded")
-
 router = APIRouter(prefix="/forms", tags=["forms"])
 
 
@@ -23,6 +35,7 @@ async def get_forms(
     patient_id: Optional[int] = None,
     form_type: Optional[str] = None,
     exclude_null: Optional[bool] = False,
+    decoded: Optional[bool] = Query(False, description="Render fields with question and answer labels from the catalog"),
     current_user: User = Depends(get_current_user)
 ):
     """Get forms with optional filtering by patient_id and form_type"""
@@ -34,8 +47,12 @@ async def get_forms(
     
     forms = await Form.find(query).to_list()
     
+    decoder = await get_form_decoder() if decoded else None
+    
     def filter_null_values(survey_data):
         """Filter out null values from survey data"""
+        if decoder:
+            return decoder.decode_survey(survey_data, exclude_null)
         if not exclude_null:
             return survey_data
         
@@ -60,18 +77,101 @@ async def get_forms(
     ]
 
 
-class SummaryResponse(BaseModel):
-    summary: str
-    user_type: str
-    form_id: int
+@router.post(
+    "/",
+    response_model=FormWriteResult,
+    status_code=201,
+    responses={422: {"model": FormWriteResult, "description": "Rejected by validation"}}
+)
+async def create_form_endpoint(
+    form: FormCreate,
+    strict: bool = Query(False, description="Treat unknown fields and orphaned subitems as errors"),
+    current_user: User = Depends(get_current_user)
+):
+    """Validate a form against the question catalog and save it under a new form_id"""
+    result = await create_form(form, strict)
+    if result.status == FormWriteStatus.INVALID:
+        return JSONResponse(status_code=422, content=result.model_dump(mode="json"))
+    if result.status == FormWriteStatus.FAILED:
+        raise HTTPException(status_code=500, detail=result.errors[0].message)
+    logger.info(f"Created form_id={result.form_id} for patient_id={form.patient_id}, user={current_user.username}")
+    return result
+
+
+@router.post("/bulk", response_model=BulkFormWriteResponse)
+async def bulk_create_forms_endpoint(
+    request: Request,
+    strict: bool = Query(False, description="Treat unknown fields and orphaned subitems as errors"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Create many forms from an NDJSON body (one FormCreate object per line)
+
+    The body is read as it streams in and written in batches; each record is
+    validated on its own and reported by line number, so invalid records
+    don't stop the rest.
+    """
+    result = await bulk_create_forms(request.stream(), strict)
+    logger.info(f"Bulk upload by {current_user.username}: {result.created} created, {result.invalid} invalid, {result.failed} failed")
+    return result
+
+
+@router.post("/validate", response_model=FormValidationResult)
+async def validate_form(
+    form: FormCreate,
+    strict: bool = Query(False, description="Treat unknown fields and orphaned subitems as errors"),
+    current_user: User = Depends(get_current_user)
+):
+    """Check a form's answers against the question catalog without saving it; reports every problem found"""
+    validator = await get_form_validator()
+    return validator.validate(form.survey_data, strict)
+
+
+# Registered before /{form_id} so "compare" isn't parsed as a form id
+@router.get("/compare", response_model=FormComparison)
+async def compare_form_answers(
+    left: int = Query(..., description="Earlier form, e.g. the SOC"),
+    right: int = Query(..., description="Later form, e.g. an RN, PTVIS or DC visit"),
+    current_user: User = Depends(get_current_user)
+):
+    """Diff the answers of two forms of the same patient: added, removed and changed questions"""
+    return await compare_forms(left, right)
+
+
+@router.get("/{form_id}/completeness", response_model=CompletenessReport)
+async def get_form_completeness(
+    form_id: int,
+    current_user: User = Depends(get_current_user)
+):
+    """Score a form's documentation completeness against the question catalog and list its gaps"""
+    form = await Form.find_one({"form_id": form_id})
+    if not form:
+        raise HTTPException(status_code=404, detail="Form not found")
+    return await score_form(form)
+
+
+@router.get("/{form_id}/reconciliation", response_model=Reconciliation)
+async def get_form_reconciliation(
+    form_id: int,
+    current_user: User = Depends(get_hp_reader)
+):
+    """Reconcile the form's medications and diagnoses with the patient's H&P (quality administrators only)"""
+    form = await Form.find_one({"form_id": form_id})
+    if not form:
+        raise HTTPException(status_code=404, detail="Form not found")
+    patient = await Patient.find_one({"patient_id": form.patient_id})
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return reconcile_form(form, patient, await load_hp_text(patient))
 
 
 @router.get("/{form_id}/summary", response_model=SummaryResponse)
 async def get_form_summary(
     form_id: int, 
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user)
 ):
-    """Get a cached visit summary"""
+    """Get a cached visit summary, refreshing it in the background once it goes stale"""
     
     logger.info(f"Getting cached summary for form_id={form_id}, user={current_user.username}")
     
@@ -82,15 +182,16 @@ async def get_form_summary(
             logger.error(f"Form not found: form_id={form_id}")
             raise HTTPException(status_code=404, detail="Form not found")
         
-        # Try to get cached summary
-        cache_client = await get_cache_client()
-        cached_summary = await cache_client.get_summary(
-            current_user.username, 
-            form.patient_id, 
-            form_id
-        )
+        # Try to get cached summary for the current form/patient/prompt revision,
+        # from Redis or else the summary archive
+        revision = await get_summary_revision(form)
+        cached_entry = await get_cached_summary(form, current_user, revision)
         
-        if cached_summary:
+        if cached_entry:
+            cached_summary, should_refresh = cached_entry
+            if should_refresh:
+                logger.info(f"Scheduling background refresh for form_id={form_id}")
+                background_tasks.add_task(refresh_form_summary, form, current_user)
             logger.info(f"Returning cached summary for form_id={form_id}")
             return SummaryResponse(**cached_summary)
         else:
@@ -105,12 +206,23 @@ async def get_form_summary(
         raise HTTPException(status_code=500, detail=f"Error retrieving summary: {str(e)}")
 
 
-@router.post("/{form_id}/summarize", response_model=SummaryResponse)
+@router.post(
+    "/{form_id}/summarize",
+    response_model=SummaryResponse,
+    responses={202: {"model": SummaryJobResponse, "description": "Summary job queued (async=true)"}}
+)
 async def summarize_form(
     form_id: int, 
+    request: Request,
+    run_async: bool = Query(False, alias="async", description="Queue a job and return 202 instead of waiting"),
     current_user: User = Depends(get_current_user)
 ):
-    """Generate a visit summary using Claude AI based on user type"""
+    """
+    Generate a visit summary using Claude AI based on user type
+
+    With async=true the summary is generated by a background job: the response
+    is 202 with the job, to be polled at GET /summary-jobs/{job_id}.
+    """
     
     logger.info(f"Starting summary generation for form_id={form_id}, user={current_user.username}, user_type={current_user.user_type.value}")
     
@@ -124,53 +236,55 @@ async def summarize_form(
         
         logger.info(f"Found form: form_id={form_id}, patient_id={form.patient_id}, form_type={form.form_type}")
         
-        # Get the patient
-        logger.debug(f"Fetching patient with patient_id={form.patient_id}")
-        patient = await Patient.find_one({"patient_id": form.patient_id})
-        if not patient:
-            logger.error(f"Patient not found: patient_id={form.patient_id}")
-            raise HTTPException(status_code=404, detail="Patient not found")
-        
-        logger.info(f"Found patient: patient_id={patient.patient_id}, name={patient.name}")
-        
-        # Generate the appropriate prompt based on user type
-        logger.debug(f"Generating prompt for user_type={current_user.user_type.value}")
-        prompt = generate_summary_prompt(form, patient, current_user.user_type)
-        logger.debug(f"Generated prompt length: {len(prompt)} characters")
+        if run_async:
+            job = job_response(await get_summary_jobs().submit(form, current_user))
+            return JSONResponse(
+                status_code=202,
+                content=job.model_dump(mode="json"),
+                headers={"Location": job.status_url}
+            )
         
-        # Get Claude service and generate summary
-        logger.debug("Getting Claude service")
-        claude_service = get_claude_service()
+        # Generate (or join an in-flight generation of) the summary and cache it,
+        # within the per-worker, per-user and cluster-wide concurrency limits.
+        # If the client leaves, the Claude call is cancelled unless someone
+        # else still needs it
+        async with get_summary_admission().admit(current_user.username):
+            summary_data = await cancel_on_disconnect(
+                request, generate_form_summary(form, current_user), "summarize"
+            )
         
-        # Set max tokens based on user type
-        max_tokens = 1500 if current_user.user_type.value == "quality_administrator" else 800
-        logger.info(f"Generating summary with max_tokens={max_tokens}")
-        
-        summary = await claude_service.generate_summary(prompt, max_tokens)
-        logger.info(f"Summary generated successfully, length: {len(summary)} characters")
-        
-        # Create response object
-        summary_response = SummaryResponse(
-            summary=summary,
-            user_type=current_user.user_type.value,
-            form_id=form_id
-        )
-        
-        # Cache the summary
-        logger.debug("Caching generated summary")
-        cache_client = await get_cache_client()
-        await cache_client.set_summary(
-            current_user.username,
-            form.patient_id,
-            form_id,
-            summary_response.dict()
-        )
-        
-        return summary_response
+        return SummaryResponse(**summary_data)
         
     except HTTPException:
         # Re-raise HTTP exceptions as-is
         raise
+    except ClientDisconnected:
+        # Nobody is listening; 499 (client closed request) is only for the logs
+        return Response(status_code=499)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, e.retry_after))}
+        )
+    except ClaudeUnavailableError as e:
+        # Circuit breaker is open - tell the client when to come back
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(int(e.retry_after) + 1)}
+        )
+    except ClaudeAPIError as e:
+        if not e.retryable:
+            logger.error(f"Claude API error in summarize_form: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Error generating summary: {str(e)}")
+        # Upstream still failing after retries
+        retry_after = int(e.retry_after or 30) + 1
+        raise HTTPException(
+            status_code=503,
+            detail="Summary service is temporarily overloaded, please retry",
+            headers={"Retry-After": str(retry_after)}
+        )
     except Exception as e:
         logger.error(f"Unexpected error in summarize_form: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error generating summary: {str(e)}")
@@ -180,6 +294,7 @@ async def summarize_form(
 async def get_form_by_id(
     form_id: int, 
     exclude_null: Optional[bool] = False,
+    decoded: Optional[bool] = Query(False, description="Render fields with question and answer labels from the catalog"),
     current_user: User = Depends(get_current_user)
 ):
     """Get a specific form by form_id"""
@@ -187,8 +302,12 @@ async def get_form_by_id(
     if not form:
         raise HTTPException(status_code=404, detail="Form not found")
     
+    decoder = await get_form_decoder() if decoded else None
+    
     def filter_null_values(survey_data):
         """Filter out null values from survey data"""
+        if decoder:
+            return decoder.decode_survey(survey_data, exclude_null)
         if not exclude_null:
             return survey_data
         
@@ -215,13 +334,18 @@ async def get_form_by_id(
 async def get_forms_by_patient(
     patient_id: int, 
     exclude_null: Optional[bool] = False,
+    decoded: Optional[bool] = Query(False, description="Render fields with question and answer labels from the catalog"),
     current_user: User = Depends(get_current_user)
 ):
     """Get all forms for a specific patient"""
     forms = await Form.find({"patient_id": patient_id}).to_list()
     
+    decoder = await get_form_decoder() if decoded else None
+    
     def filter_null_values(survey_data):
         """Filter out null values from survey data"""
+        if decoder:
+            return decoder.decode_survey(survey_data, exclude_null)
         if not exclude_null:
             return survey_data
         
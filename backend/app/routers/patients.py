@@ -1,17 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+import hashlib
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response
+from typing import List, Optional, Tuple
 from app.models.user import User
-from app.models.patient import Patient, PatientResponse
-from app.routers.auth import get_current_user
+from app.models.patient import Patient, PatientHP, PatientResponse, PatientRevision, PatientSearchResult
+from app.models.form import Form, FormHeader
+from app.models.summary import FormSummaryItem, SummaryResponse
+from app.routers.auth import get_current_user, get_hp_reader
+from services.catalog import current_catalog_version
+from services.summary import get_cached_summaries, summary_revision
+from services.search import search_patients
+from services.hp_store import load_hp
 
 router = APIRouter(prefix="/patients", tags=["patients"])
 
+HP_MEDIA_TYPE = "application/xml; charset=utf-8"
+
 
 @router.get("/", response_model=List[PatientResponse])
 async def get_patients(current_user: User = Depends(get_current_user)):
     """Get patients - returns different data based on user type"""
-    # Get all patients from database
-    patients = await Patient.find_all().to_list()
+    # Get all patients from database, without any inline H&P
+    patients = await Patient.find_all().project(PatientResponse).to_list()
     
     if current_user.user_type.value == "field_clinician":
         # Field clinicians get basic patient info (no XML data)
@@ -25,7 +35,8 @@ async def get_patients(current_user: User = Depends(get_current_user)):
                 address=p.address,
                 phone=p.phone,
                 email=p.email,
-                xml_data=None  # Don't include XML data for field clinicians
+                hp=None,  # Don't include the H&P for field clinicians
+                has_hp=False
             ) for p in patients
         ]
     elif current_user.user_type.value == "quality_administrator":
@@ -40,17 +51,28 @@ async def get_patients(current_user: User = Depends(get_current_user)):
                 address=p.address,
                 phone=p.phone,
                 email=p.email,
-                xml_data=p.xml_data  # Include XML data for quality administrators
+                hp=p.hp,  # Quality administrators fetch the XML from /patients/{id}/hp
+                has_hp=p.has_hp
             ) for p in patients
         ]
     else:
         raise HTTPException(status_code=400, detail="Invalid user type")
 
 
+@router.get("/search", response_model=List[PatientSearchResult])
+async def search(
+    q: str = Query(..., min_length=1, max_length=100, description="Name prefix(es), MRN prefix or phone digits"),
+    limit: int = Query(20, ge=1, le=50),
+    current_user: User = Depends(get_current_user)
+):
+    """Typeahead search over patients by name prefix, MRN prefix or phone number, in name order"""
+    return await search_patients(q, limit)
+
+
 @router.get("/{patient_id}", response_model=PatientResponse)
 async def get_patient(patient_id: int, current_user: User = Depends(get_current_user)):
     """Get a specific patient by ID"""
-    patient = await Patient.find_one({"patient_id": patient_id})
+    patient = await Patient.find_one({"patient_id": patient_id}).project(PatientResponse)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
     
@@ -65,7 +87,8 @@ async def get_patient(patient_id: int, current_user: User = Depends(get_current_
             address=patient.address,
             phone=patient.phone,
             email=patient.email,
-            xml_data=None  # Don't include XML data for field clinicians
+            hp=None,  # Don't include the H&P for field clinicians
+            has_hp=False
         )
     else:
         return PatientResponse(
@@ -77,5 +100,121 @@ async def get_patient(patient_id: int, current_user: User = Depends(get_current_
             address=patient.address,
             phone=patient.phone,
             email=patient.email,
-            xml_data=patient.xml_data  # Include XML data for quality administrators
-        ) 
\ No newline at end of file
+            hp=patient.hp,  # Quality administrators fetch the XML from /patients/{id}/hp
+            has_hp=patient.has_hp
+        ) 
+
+
+@router.get("/{patient_id}/summaries", response_model=List[FormSummaryItem])
+async def get_patient_summaries(patient_id: int, current_user: User = Depends(get_current_user)):
+    """Get a patient's forms (newest first) with the caller's cached summaries, in one cache round trip (and one archive query for misses)"""
+    patient = await Patient.find_one({"patient_id": patient_id}).project(PatientRevision)
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    
+    forms = await Form.find({"patient_id": patient_id}).sort(-Form.form_date).project(FormHeader).to_list()
+    
+    catalog_version = await current_catalog_version()
+    summaries = await get_cached_summaries(
+        current_user,
+        patient_id,
+        {f.form_id: summary_revision(f.revision, patient.revision, catalog_version) for f in forms}
+    )
+    
+    return [
+        FormSummaryItem(
+            form_id=f.form_id,
+            form_type=f.form_type,
+            form_date=f.form_date,
+            summary=SummaryResponse(**summaries[f.form_id]) if f.form_id in summaries else None
+        ) for f in forms
+    ]
+
+
+def _byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    (first, last) byte of a single "bytes=" range, clamped to the content;
+    None when the header isn't one range we serve (the whole body is sent)
+
+    Raises ValueError when the range can't be satisfied.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash or not (first or last) or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        if int(last) == 0 or size == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - int(last)), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("range starts past the end")
+    return start, end
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+
+@router.get("/{patient_id}/hp")
+async def get_patient_hp(
+    patient_id: int,
+    request: Request,
+    current_user: User = Depends(get_hp_reader)
+):
+    """
+    Get a patient's H&P XML (quality administrators only)
+
+    The ETag is the document's SHA-256, so If-None-Match revalidates without
+    a body; a single Range (with optional If-Range) returns 206 and part of it.
+    """
+    patient = await Patient.find_one({"patient_id": patient_id}).project(PatientHP)
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    
+    if patient.hp is not None:
+        etag = f'"{patient.hp.sha256}"'
+        if _not_modified(request, etag):
+            # Revalidated without reading the document
+            return Response(status_code=304, headers={"ETag": etag})
+        body = await load_hp(patient.hp)
+        if body is None:
+            raise HTTPException(status_code=404, detail="H&P document not found")
+    elif patient.xml_data:
+        # Not migrated to hp_documents yet
+        body = patient.xml_data.encode("utf-8")
+        etag = f'"{hashlib.sha256(body).hexdigest()}"'
+        if _not_modified(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+    else:
+        raise HTTPException(status_code=404, detail="No H&P on file for this patient")
+    
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        # Changes whenever the patient's H&P does, so clients revalidate rather than refetch
+        "Cache-Control": "private, no-cache"
+    }
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == etag):
+        try:
+            byte_range = _byte_range(range_header, len(body))
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{len(body)}"})
+        if byte_range is not None:
+            first, last = byte_range
+            return Response(
+                content=body[first:last + 1],
+                status_code=206,
+                media_type=HP_MEDIA_TYPE,
+                headers={**headers, "Content-Range": f"bytes {first}-{last}/{len(body)}"}
+            )
+    return Response(content=body, media_type=HP_MEDIA_TYPE, headers=headers)
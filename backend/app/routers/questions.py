@@ -1,12 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import List, Optional
 from app.models.user import User
-from app.models.question import Question, QuestionResponse
+from app.models.question import Question, QuestionResponse, QuestionSearchResult
 from app.routers.auth import get_current_user
+from services.search import search_questions
 
 router = APIRouter(prefix="/questions", tags=["questions"])
 
 
+@router.get("/search", response_model=List[QuestionSearchResult])
+async def search(
+    q: str = Query(..., min_length=1, max_length=200, description="Word prefixes of the description, or a qid prefix"),
+    visit_type: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user)
+):
+    """Search the question catalog by description words or qid"""
+    return await search_questions(q, visit_type, limit)
+
+
 @router.get("/{qid}", response_model=QuestionResponse)
 async def get_question_by_qid(qid: str, current_user: User = Depends(get_current_user)):
     """Get a specific question by qid"""
@@ -1,4 +1,8 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.core.cache import get_cache_client
+from app.core.database import ping_db
+from app.core.metrics import metrics
 
 router = APIRouter(tags=["status"])
 
@@ -6,4 +10,26 @@ router = APIRouter(tags=["status"])
 @router.get("/status")
 async def get_status():
     """Health check endpoint"""
-    return {"status": "healthy", "message": "Patient Dashboard API is running"} 
\ No newline at end of file
+    return {"status": "healthy", "message": "Patient Dashboard API is running"} 
+
+
+@router.get("/ready")
+async def get_readiness(request: Request):
+    """Readiness probe: 200 once this worker has started and can reach Mongo and Redis, else 503"""
+    cache_client = await get_cache_client()
+    checks = {
+        "started": bool(getattr(request.app.state, "ready", False)),
+        "mongodb": await ping_db(),
+        "redis": await cache_client.ping(),
+    }
+    ready = all(checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "checks": checks}
+    )
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics for this worker"""
+    return metrics.render()
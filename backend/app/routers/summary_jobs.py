@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app.models.user import User
+from app.models.summary import SummaryJobResponse
+from app.routers.auth import get_current_user
+from services.summary_jobs import get_summary_jobs, job_response
+from app.logger import get_logger
+
+logger = get_logger("summary_jobs_router")
+
+router = APIRouter(prefix="/summary-jobs", tags=["summary-jobs"])
+
+
+@router.get("/{job_id}", response_model=SummaryJobResponse)
+async def get_summary_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, description="Seconds to wait for the job to finish (long-poll)"),
+    current_user: User = Depends(get_current_user)
+):
+    """Get the status of a summary job, optionally waiting for it to finish"""
+    jobs = get_summary_jobs()
+    job = await jobs.wait(job_id, wait) if wait else await jobs.get(job_id)
+
+    # Jobs are only visible to the user who submitted them
+    if not job or job["username"] != current_user.username:
+        raise HTTPException(status_code=404, detail="Summary job not found")
+
+    return job_response(job)
@@ -0,0 +1,93 @@
+"""
+Production entry point: `python -m app.server`
+
+Runs the API under uvicorn with one worker process per available CPU (as
+limited by the container's cgroup quota), using uvloop and httptools when
+they're installed. Each worker runs the app's own startup, so it opens its
+own Mongo pool, Redis connection and Claude client. On SIGTERM workers stop
+accepting connections, finish in-flight requests (up to
+SERVER_GRACEFUL_TIMEOUT_SECONDS) and then run shutdown.
+"""
+import math
+import os
+import importlib.util
+from typing import Optional
+import uvicorn
+from app.logger import get_logger
+
+logger = get_logger("server")
+
+
+def _cgroup_cpu_limit() -> Optional[float]:
+    """CPUs allowed by the cgroup quota, or None if unlimited/unknown"""
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+
+    # cgroup v1
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def available_cpus() -> int:
+    """CPUs this process may use: the cgroup quota, else the CPU affinity set"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, math.ceil(limit))
+    return max(1, cpus)
+
+
+def worker_count() -> int:
+    """WEB_CONCURRENCY if set, otherwise one worker per available CPU"""
+    configured = os.getenv("WEB_CONCURRENCY")
+    if configured:
+        return max(1, int(configured))
+    return available_cpus()
+
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def main():
+    workers = worker_count()
+    loop = "uvloop" if _available("uvloop") else "asyncio"
+    http = "httptools" if _available("httptools") else "h11"
+    logger.info(f"Starting API with {workers} worker(s), loop={loop}, http={http}")
+
+    uvicorn.run(
+        "app.main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=workers,
+        loop=loop,
+        http=http,
+        proxy_headers=True,
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "*"),
+        timeout_keep_alive=int(os.getenv("SERVER_KEEPALIVE_SECONDS", "5")),
+        timeout_graceful_shutdown=int(os.getenv("SERVER_GRACEFUL_TIMEOUT_SECONDS", "30")),
+        access_log=os.getenv("SERVER_ACCESS_LOG", "true").lower() == "true",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,33 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from app.models.user import UserType
+from app.models.completeness import CompletenessReport
+from app.models.reconciliation import ReconciledList, Reconciliation
+from services.decoder import FormDecoder
 from app.models.form import Form
 from app.models.patient import Patient
 from app.logger import get_logger
 
 logger = get_logger("prompts")
 
+# Bump whenever prompt wording or form formatting changes; it is part of the
+# summary cache key, so cached summaries from older templates stop matching.
+PROMPT_TEMPLATE_VERSION = 4
 
-def format_form_data_for_prompt(form: Form, patient: Patient) -> str:
-    """Format form data into a readable string for the prompt"""
+# Gaps listed in the QA prompt; the rest are summarized as a count
+MAX_PROMPT_GAPS = 60
+
+
+# Form fields left out of the QA prompt's form data when the reconciliation covers them
+RECONCILED_FIELDS = {"medications_list", "discontinued_medications_list"}
+
+
+def format_form_data_for_prompt(form: Form, patient: Patient, exclude_fields: frozenset = frozenset(),
+                                decoder: Optional[FormDecoder] = None) -> str:
+    """
+    Format form data into a readable string for the prompt, skipping
+    `exclude_fields`. With a decoder, questions and answers are labelled
+    from the catalog instead of the stored descriptions and raw codes.
+    """
     
     # Start with patient information
     prompt_data = f"""
@@ -29,16 +48,22 @@ VISIT INFORMATION:
 FORM DATA:
 """
     
+    survey_data = form.survey_data
+    if decoder:
+        survey_data = decoder.decode_survey(survey_data, exclude_null=True)
+    
     # Add form data by category
-    for form_type, categories in form.survey_data.items():
+    for form_type, categories in survey_data.items():
         prompt_data += f"\n{form_type.upper()}:\n"
         
         for category, fields in categories.items():
             prompt_data += f"\n  {category}:\n"
             
             for field_name, field_data in fields.items():
-                question = field_data.get('question_description', field_name)
-                value = field_data.get('value')
+                if field_name in exclude_fields:
+                    continue
+                question = field_data.get('question_description') or field_name
+                value = field_data.get('answer') if decoder else field_data.get('value')
                 
                 if value is not None and value != '':
                     prompt_data += f"    - {question}: {value}\n"
@@ -46,10 +71,43 @@ FORM DATA:
     return prompt_data
 
 
-def generate_field_clinician_prompt(form: Form, patient: Patient) -> str:
+def format_completeness_for_prompt(report: Optional[CompletenessReport]) -> str:
+    """Format the computed completeness score and gaps for the QA prompt"""
+    if report is None:
+        return "Not available - estimate completeness from the form data.\n"
+    
+    lines = [f"- Score: {report.score:.1f}% ({report.answered} of {report.required} required questions answered)"]
+    if report.gaps:
+        lines.append("- Unanswered required questions:")
+        for gap in report.gaps[:MAX_PROMPT_GAPS]:
+            condition = f" (required because {gap.required_by})" if gap.required_by else ""
+            lines.append(f"    - [{gap.category}] {gap.description}{condition}")
+        if len(report.gaps) > MAX_PROMPT_GAPS:
+            lines.append(f"    - ... and {len(report.gaps) - MAX_PROMPT_GAPS} more")
+    return "\n".join(lines) + "\n"
+
+
+def format_reconciliation_table(title: str, reconciled: ReconciledList) -> str:
+    """Format one reconciled list as a compact markdown table"""
+    rows = [f"| {title} | H&P | Form | Status |", "|---|---|---|---|"]
+    rows += [f"| {item.key} | {item.hp} | {item.form} | matched ({item.match}) |" for item in reconciled.matched]
+    rows += [f"| | {text} | | H&P only |" for text in reconciled.hp_only]
+    rows += [f"| | | {text} | form only |" for text in reconciled.form_only]
+    return "\n".join(rows) + "\n"
+
+
+def format_reconciliation_for_prompt(reconciliation: Reconciliation) -> str:
+    """Format the computed H&P vs form reconciliation for the QA prompt"""
+    return (
+        "MEDICATIONS:\n" + format_reconciliation_table("Medication", reconciliation.medications)
+        + "\nDIAGNOSES:\n" + format_reconciliation_table("Diagnosis", reconciliation.diagnoses)
+    )
+
+
+def generate_field_clinician_prompt(form: Form, patient: Patient, decoder: Optional[FormDecoder] = None) -> str:
     """Generate prompt for Field Clinicians - quick, mobile-friendly summaries"""
     
-    form_data = format_form_data_for_prompt(form, patient)
+    form_data = format_form_data_for_prompt(form, patient, decoder=decoder)
     
     prompt = f"""You are a medical AI assistant helping field clinicians prepare for patient visits. 
 
@@ -89,37 +147,50 @@ Format the response as clean markdown with emojis, suitable for quick review bef
     return prompt
 
 
-def generate_quality_administrator_prompt(form: Form, patient: Patient) -> str:
+def generate_quality_administrator_prompt(form: Form, patient: Patient, completeness: Optional[CompletenessReport] = None,
+                                          reconciliation: Optional[Reconciliation] = None,
+                                          decoder: Optional[FormDecoder] = None,
+                                          hp_xml: Optional[str] = None) -> str:
     """Generate prompt for Quality Administrators - detailed documentation review"""
     
-    form_data = format_form_data_for_prompt(form, patient)
+    # With a computed reconciliation the medication lists are in its tables, not the raw form data
+    form_data = format_form_data_for_prompt(form, patient, RECONCILED_FIELDS if reconciliation else frozenset(), decoder)
+    completeness_data = format_completeness_for_prompt(completeness)
     
     # Extract H&P summary data for comparison
     h_and_p_data = ""
-    if patient.xml_data:
+    if hp_xml:
         # Extract key information from XML data for comparison
         import re
         
-        # Extract diagnoses
-        diagnoses_match = re.search(r'<diagnosis>(.*?)</diagnosis>', patient.xml_data, re.DOTALL | re.IGNORECASE)
-        if diagnoses_match:
-            h_and_p_data += f"\nH&P DIAGNOSES:\n{diagnoses_match.group(1).strip()}\n"
-        
-        # Extract medications
-        meds_match = re.search(r'<medications>(.*?)</medications>', patient.xml_data, re.DOTALL | re.IGNORECASE)
-        if meds_match:
-            h_and_p_data += f"\nH&P MEDICATIONS:\n{meds_match.group(1).strip()}\n"
+        if reconciliation is None:
+            # Extract diagnoses
+            diagnoses_match = re.search(r'<(diagnoses|diagnosis)>(.*?)</\1>', hp_xml, re.DOTALL | re.IGNORECASE)
+            if diagnoses_match:
+                h_and_p_data += f"\nH&P DIAGNOSES:\n{diagnoses_match.group(2).strip()}\n"
+            
+            # Extract medications
+            meds_match = re.search(r'<medications>(.*?)</medications>', hp_xml, re.DOTALL | re.IGNORECASE)
+            if meds_match:
+                h_and_p_data += f"\nH&P MEDICATIONS:\n{meds_match.group(1).strip()}\n"
         
         # Extract allergies
-        allergies_match = re.search(r'<allergies>(.*?)</allergies>', patient.xml_data, re.DOTALL | re.IGNORECASE)
+        allergies_match = re.search(r'<allergies>(.*?)</allergies>', hp_xml, re.DOTALL | re.IGNORECASE)
         if allergies_match:
             h_and_p_data += f"\nH&P ALLERGIES:\n{allergies_match.group(1).strip()}\n"
         
         # Extract vital signs
-        vitals_match = re.search(r'<vital_signs>(.*?)</vital_signs>', patient.xml_data, re.DOTALL | re.IGNORECASE)
+        vitals_match = re.search(r'<vital_signs>(.*?)</vital_signs>', hp_xml, re.DOTALL | re.IGNORECASE)
         if vitals_match:
             h_and_p_data += f"\nH&P VITAL SIGNS:\n{vitals_match.group(1).strip()}\n"
     
+    reconciliation_data = ""
+    if reconciliation is not None:
+        reconciliation_data = (
+            "\nH&P VS FORM RECONCILIATION (computed - matched by normalized drug name/diagnosis; "
+            "use as given, do not re-derive):\n" + format_reconciliation_for_prompt(reconciliation)
+        )
+    
     prompt = f"""You are a medical AI assistant helping quality administrators review documentation for insurance claims and compliance.
 
 Your task is to create a comprehensive, detailed analysis comparing the patient's H&P summary with their form responses to identify potential discrepancies, documentation gaps, and compliance issues. The analysis should be:
@@ -131,11 +202,14 @@ Your task is to create a comprehensive, detailed analysis comparing the patient'
 - Provide specific recommendations for improvement
 
 H&P SUMMARY DATA:
-{h_and_p_data}
+{h_and_p_data}{reconciliation_data}
 
 FORM RESPONSE DATA:
 {form_data}
 
+DOCUMENTATION COMPLETENESS (computed from the question catalog - use as given, do not recompute):
+{completeness_data}
+
 Please provide a structured analysis in MARKDOWN format with appropriate emojis for each section:
 
 # 📋 Documentation Compliance Review Report
@@ -165,8 +239,8 @@ Please provide a structured analysis in MARKDOWN format with appropriate emojis
 - Incomplete care coordination documentation
 
 ## 📊 Documentation Quality Score
-- Overall completeness score (0-100%)
-- Critical gaps identification
+- State the computed completeness score above
+- Which of the listed gaps are critical, and why
 - Documentation accuracy assessment
 
 ## 🔧 Specific Recommendations
@@ -185,18 +259,25 @@ Format the response as detailed markdown with emojis, suitable for quality assur
     return prompt
 
 
-def generate_summary_prompt(form: Form, patient: Patient, user_type: UserType) -> str:
-    """Generate appropriate prompt based on user type"""
+def generate_summary_prompt(form: Form, patient: Patient, user_type: UserType,
+                            completeness: Optional[CompletenessReport] = None,
+                            reconciliation: Optional[Reconciliation] = None,
+                            decoder: Optional[FormDecoder] = None, hp_xml: Optional[str] = None) -> str:
+    """
+    Generate appropriate prompt based on user type; the QA prompt includes the
+    completeness report, reconciliation and H&P sections. With a decoder, form
+    answers are labelled from the question catalog.
+    """
     
     logger.info(f"Generating prompt for user_type={user_type.value}, form_type={form.form_type}, patient={patient.name}")
     
     if user_type.value == "field_clinician":
         logger.debug("Using field clinician prompt")
-        return generate_field_clinician_prompt(form, patient)
+        return generate_field_clinician_prompt(form, patient, decoder)
     elif user_type.value == "quality_administrator":
         logger.debug("Using quality administrator prompt")
-        return generate_quality_administrator_prompt(form, patient)
+        return generate_quality_administrator_prompt(form, patient, completeness, reconciliation, decoder, hp_xml)
     else:
         # Default to field clinician prompt for unknown user types
         logger.warning(f"Unknown user_type={user_type.value}, defaulting to field clinician prompt")
-        return generate_field_clinician_prompt(form, patient) 
\ No newline at end of file
+        return generate_field_clinician_prompt(form, patient, decoder) 
\ No newline at end of file
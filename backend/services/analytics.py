@@ -0,0 +1,331 @@
+import json
+import os
+import shutil
+import time
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+from app.models.form import FormType
+from services.form_diff import is_answered, iter_form_fields
+from app.logger import get_logger
+
+logger = get_logger("analytics")
+
+STORE_DIR = os.getenv("ANALYTICS_STORE_DIR", "data/analytics")
+# How often a worker checks for a newer snapshot
+RELOAD_SECONDS = float(os.getenv("ANALYTICS_RELOAD_SECONDS", "10"))
+# Snapshots kept on disk; readers may still have the previous one mapped
+KEEP_SNAPSHOTS = 2
+
+FORM_TYPES = [t.value for t in FormType]
+BLANK = -1
+
+FORM_COLUMNS = {
+    "form_id": np.int64,
+    "patient_id": np.int64,
+    "form_type": np.int8,  # index into FORM_TYPES
+    "form_date": "datetime64[D]",
+    "revision": np.int64,
+}
+ANSWER_COLUMNS = {
+    "form_idx": np.int32,  # row in the forms table
+    "category": np.int32,  # code into the categories vocabulary
+    "qid": np.int32,  # code into the qids vocabulary
+    "value": np.int32,  # code into the values vocabulary, BLANK if unanswered
+    "numeric": np.float64,  # the answer as a number, NaN if it isn't one
+}
+VOCABULARIES = ("categories", "qids", "values")
+
+
+class Vocabulary:
+    """Dictionary encoding of strings to dense integer codes"""
+
+    def __init__(self, items: Optional[List[str]] = None):
+        self.items = list(items or [])
+        self.codes = {item: code for code, item in enumerate(self.items)}
+
+    def code(self, item: str) -> int:
+        code = self.codes.get(item)
+        if code is None:
+            code = self.codes[item] = len(self.items)
+            self.items.append(item)
+        return code
+
+    def find(self, item: str) -> Optional[int]:
+        return self.codes.get(item)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+def _to_day(value: Any) -> np.datetime64:
+    if isinstance(value, datetime):
+        value = value.date()
+    elif isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    return np.datetime64(value, "D")
+
+
+def _to_number(value: Any) -> float:
+    if isinstance(value, bool):
+        return float("nan")
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    return float("nan")
+
+
+class AnswerStore:
+    """
+    Columnar snapshot of every form's answers.
+
+    `forms` has one row per form and `answers` one row per (form, field),
+    with categories, qids and answer values dictionary-encoded, so
+    aggregates are bincounts and masks over flat arrays rather than walks
+    over survey_data. Snapshots are immutable directories of .npy files
+    published by atomically replacing the CURRENT pointer; readers memory-map
+    them and the materializer builds the next one incrementally by revision.
+    """
+
+    def __init__(self, forms: Dict[str, np.ndarray], answers: Dict[str, np.ndarray],
+                 vocabularies: Dict[str, Vocabulary], snapshot: Optional[str] = None):
+        self.forms = forms
+        self.answers = answers
+        self.vocabularies = vocabularies
+        self.snapshot = snapshot
+
+    @classmethod
+    def empty(cls) -> "AnswerStore":
+        return cls(
+            {name: np.empty(0, dtype=dtype) for name, dtype in FORM_COLUMNS.items()},
+            {name: np.empty(0, dtype=dtype) for name, dtype in ANSWER_COLUMNS.items()},
+            {name: Vocabulary() for name in VOCABULARIES}
+        )
+
+    @staticmethod
+    def current_snapshot(store_dir: str = STORE_DIR) -> Optional[str]:
+        try:
+            with open(os.path.join(store_dir, "CURRENT")) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def load(cls, store_dir: str = STORE_DIR) -> Optional["AnswerStore"]:
+        """Memory-map the current snapshot, or None if nothing has been materialized"""
+        snapshot = cls.current_snapshot(store_dir)
+        if snapshot is None:
+            return None
+        path = os.path.join(store_dir, snapshot)
+        forms = {name: np.load(os.path.join(path, f"forms.{name}.npy"), mmap_mode="r") for name in FORM_COLUMNS}
+        answers = {name: np.load(os.path.join(path, f"answers.{name}.npy"), mmap_mode="r") for name in ANSWER_COLUMNS}
+        with open(os.path.join(path, "vocabularies.json")) as f:
+            vocabularies = {name: Vocabulary(items) for name, items in json.load(f).items()}
+        return cls(forms, answers, vocabularies, snapshot)
+
+    def save(self, store_dir: str = STORE_DIR) -> str:
+        """Write a new snapshot, publish it and prune old ones; returns its name"""
+        snapshot = f"snapshot-{time.time_ns()}"
+        path = os.path.join(store_dir, snapshot)
+        os.makedirs(path)
+        for name, column in self.forms.items():
+            np.save(os.path.join(path, f"forms.{name}.npy"), column)
+        for name, column in self.answers.items():
+            np.save(os.path.join(path, f"answers.{name}.npy"), column)
+        with open(os.path.join(path, "vocabularies.json"), "w") as f:
+            json.dump({name: vocabulary.items for name, vocabulary in self.vocabularies.items()}, f)
+
+        pointer = os.path.join(store_dir, "CURRENT.tmp")
+        with open(pointer, "w") as f:
+            f.write(snapshot)
+        os.replace(pointer, os.path.join(store_dir, "CURRENT"))
+
+        snapshots = sorted(d for d in os.listdir(store_dir) if d.startswith("snapshot-"))
+        for old in snapshots[:-KEEP_SNAPSHOTS]:
+            shutil.rmtree(os.path.join(store_dir, old), ignore_errors=True)
+        self.snapshot = snapshot
+        return snapshot
+
+    def revisions(self) -> Dict[int, int]:
+        """Revision of every materialized form"""
+        return dict(zip(self.forms["form_id"].tolist(), self.forms["revision"].tolist()))
+
+    def __len__(self) -> int:
+        return len(self.answers["qid"])
+
+    # Aggregates
+
+    def _form_mask(self, form_type: Optional[str] = None, start: Optional[date] = None,
+                   end: Optional[date] = None, patient_id: Optional[int] = None) -> np.ndarray:
+        mask = np.ones(len(self.forms["form_id"]), dtype=bool)
+        if form_type is not None:
+            mask &= self.forms["form_type"] == FORM_TYPES.index(form_type)
+        if start is not None:
+            mask &= self.forms["form_date"] >= np.datetime64(start, "D")
+        if end is not None:
+            mask &= self.forms["form_date"] <= np.datetime64(end, "D")
+        if patient_id is not None:
+            mask &= self.forms["patient_id"] == patient_id
+        return mask
+
+    def _qid_codes(self, qids: Iterable[str]) -> np.ndarray:
+        codes = [self.vocabularies["qids"].find(qid) for qid in qids]
+        return np.array([code for code in codes if code is not None], dtype=np.int32)
+
+    def completion(self, form_type: Optional[str] = None, start: Optional[date] = None,
+                   end: Optional[date] = None, qids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """How often each question is answered on the matching forms, least complete first"""
+        rows = self._form_mask(form_type, start, end)[self.answers["form_idx"]]
+        if qids:
+            rows &= np.isin(self.answers["qid"], self._qid_codes(qids))
+
+        qid = self.answers["qid"][rows]
+        answered = (self.answers["value"][rows] != BLANK).astype(np.int64)
+        size = len(self.vocabularies["qids"])
+        totals = np.bincount(qid, minlength=size)
+        filled = np.bincount(qid, weights=answered, minlength=size).astype(np.int64)
+
+        present = np.nonzero(totals)[0]
+        rates = filled[present] / totals[present]
+        order = np.lexsort((present, rates))
+        return [
+            {
+                "qid": self.vocabularies["qids"].items[present[i]],
+                "total": int(totals[present[i]]),
+                "answered": int(filled[present[i]]),
+                "completion_rate": float(rates[i]),
+            }
+            for i in order
+        ]
+
+    def distribution(self, qid: str, form_type: Optional[str] = None, limit: int = 20) -> Dict[str, List[Dict[str, Any]]]:
+        """Most common answers to a question, per form type"""
+        code = self.vocabularies["qids"].find(qid)
+        if code is None:
+            return {}
+        rows = (self.answers["qid"] == code) & (self.answers["value"] != BLANK)
+        if form_type is not None:
+            rows &= self._form_mask(form_type)[self.answers["form_idx"]]
+
+        types = self.forms["form_type"][self.answers["form_idx"][rows]].astype(np.int64)
+        values = self.answers["value"][rows].astype(np.int64)
+        keys, counts = np.unique(types * len(self.vocabularies["values"]) + values, return_counts=True)
+
+        result: Dict[str, List[Dict[str, Any]]] = {}
+        for type_code in np.unique(types):
+            in_type = (keys // len(self.vocabularies["values"])) == type_code
+            type_keys, type_counts = keys[in_type], counts[in_type]
+            top = np.argsort(-type_counts, kind="stable")[:limit]
+            result[FORM_TYPES[type_code]] = [
+                {
+                    "value": json.loads(self.vocabularies["values"].items[type_keys[i] % len(self.vocabularies["values"])]),
+                    "count": int(type_counts[i]),
+                }
+                for i in top
+            ]
+        return result
+
+    def trend(self, patient_id: int, qid: str) -> List[Dict[str, Any]]:
+        """A patient's answers to a question over time"""
+        code = self.vocabularies["qids"].find(qid)
+        if code is None:
+            return []
+        rows = self._form_mask(patient_id=patient_id)[self.answers["form_idx"]] & (self.answers["qid"] == code)
+        form_idx = self.answers["form_idx"][rows]
+        values = self.answers["value"][rows]
+        numeric = self.answers["numeric"][rows]
+        order = np.lexsort((self.forms["form_id"][form_idx], self.forms["form_date"][form_idx]))
+        return [
+            {
+                "form_id": int(self.forms["form_id"][form_idx[i]]),
+                "form_type": FORM_TYPES[self.forms["form_type"][form_idx[i]]],
+                "form_date": self.forms["form_date"][form_idx[i]].item(),
+                "value": None if values[i] == BLANK else json.loads(self.vocabularies["values"].items[values[i]]),
+                "numeric": None if np.isnan(numeric[i]) else float(numeric[i]),
+            }
+            for i in order
+        ]
+
+
+class AnswerStoreBuilder:
+    """Builds the next snapshot from a previous one plus re-read forms"""
+
+    def __init__(self, base: AnswerStore, drop_form_ids: Iterable[int]):
+        self.vocabularies = {name: Vocabulary(v.items) for name, v in base.vocabularies.items()}
+
+        # Carry over every form (and its answers) that isn't being replaced
+        keep_forms = ~np.isin(base.forms["form_id"], np.fromiter(drop_form_ids, dtype=np.int64))
+        keep_answers = keep_forms[base.answers["form_idx"]]
+        new_index = np.cumsum(keep_forms, dtype=np.int64) - 1
+
+        self.forms = {name: [np.asarray(column)[keep_forms]] for name, column in base.forms.items()}
+        self.answers = {name: [np.asarray(column)[keep_answers]] for name, column in base.answers.items()}
+        self.answers["form_idx"][0] = new_index[self.answers["form_idx"][0]].astype(np.int32)
+        self.form_count = int(keep_forms.sum())
+
+        self._new_forms = {name: [] for name in FORM_COLUMNS}
+        self._new_answers = {name: [] for name in ANSWER_COLUMNS}
+
+    def add_form(self, doc: Dict[str, Any]):
+        """Add one raw form document"""
+        form_type = doc["form_type"]
+        form_idx = self.form_count
+        self.form_count += 1
+
+        self._new_forms["form_id"].append(doc["form_id"])
+        self._new_forms["patient_id"].append(doc["patient_id"])
+        self._new_forms["form_type"].append(FORM_TYPES.index(form_type))
+        self._new_forms["form_date"].append(_to_day(doc["form_date"]))
+        self._new_forms["revision"].append(doc.get("revision", 0))
+
+        # Later sections (the form's own type) override earlier ones
+        fields = {}
+        for category, qid, value, _ in iter_form_fields(doc.get("survey_data") or {}, form_type):
+            fields[(category, qid)] = value
+
+        for (category, qid), value in fields.items():
+            self._new_answers["form_idx"].append(form_idx)
+            self._new_answers["category"].append(self.vocabularies["categories"].code(category))
+            self._new_answers["qid"].append(self.vocabularies["qids"].code(qid))
+            if is_answered(value):
+                self._new_answers["value"].append(self.vocabularies["values"].code(json.dumps(value, sort_keys=True)))
+                self._new_answers["numeric"].append(_to_number(value))
+            else:
+                self._new_answers["value"].append(BLANK)
+                self._new_answers["numeric"].append(float("nan"))
+
+    def build(self) -> AnswerStore:
+        forms = {
+            name: np.concatenate(self.forms[name] + [np.array(self._new_forms[name], dtype=dtype)])
+            for name, dtype in FORM_COLUMNS.items()
+        }
+        answers = {
+            name: np.concatenate(self.answers[name] + [np.array(self._new_answers[name], dtype=dtype)])
+            for name, dtype in ANSWER_COLUMNS.items()
+        }
+        return AnswerStore(forms, answers, self.vocabularies)
+
+
+# Snapshot loaded by this worker
+answer_store: Optional[AnswerStore] = None
+_checked_at = 0.0
+
+
+def get_answer_store() -> Optional[AnswerStore]:
+    """The current snapshot, reloaded when the materializer publishes a new one"""
+    global answer_store, _checked_at
+    now = time.monotonic()
+    if answer_store is None or now - _checked_at >= RELOAD_SECONDS:
+        _checked_at = now
+        snapshot = AnswerStore.current_snapshot()
+        if snapshot is not None and (answer_store is None or answer_store.snapshot != snapshot):
+            try:
+                answer_store = AnswerStore.load()
+                logger.info(f"Loaded analytics snapshot {snapshot} ({len(answer_store)} answers)")
+            except Exception as e:
+                logger.error(f"Error loading analytics snapshot {snapshot}: {str(e)}")
+    return answer_store
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import os
+import re
+import time
+from typing import Any, Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+from app.models.question import Question
+from app.logger import get_logger
+
+logger = get_logger("catalog")
+
+# How often compiled catalogs check the questions migration version
+CHECK_SECONDS = float(os.getenv("QUESTION_CATALOG_CHECK_SECONDS", "60"))
+
+# Casting keys that name the kind of value a field holds rather than an answer option
+VALUE_TYPES = {"text", "number", "date"}
+# Q-code options are stored as "(Q5001) Care provided in ..."
+OPTION_CODE = re.compile(r"^\(([A-Z][0-9A-Z]{3,6})\)\s*")
+
+QUESTION_PROJECTION = {"_id": 0, "qid": 1, "description": 1, "casting": 1, "subitems": 1, "visit_type": 1, "category": 1}
+
+
+def options_by_field(casting: Dict[str, Optional[str]]) -> Dict[str, List[str]]:
+    """
+    A question's answer options grouped by the form field they're recorded in.
+
+    A field with several options is shared (a radio) and holds the chosen
+    option's name; a field with one option is set (True, or free text) when
+    that option applies, or holds a value when the option is a VALUE_TYPE.
+    Options without a field of their own are left out.
+    """
+    grouped: Dict[str, List[str]] = {}
+    for option, field in casting.items():
+        if field:
+            grouped.setdefault(field, []).append(option)
+    return grouped
+
+
+def option_choices(options: List[str]) -> Dict[str, str]:
+    """Values a shared field may hold - option names and their bare Q-codes - to the option"""
+    choices = {}
+    for option in options:
+        choices[option] = option
+        code = OPTION_CODE.match(option)
+        if code:
+            choices[code.group(1)] = option
+    return choices
+
+
+def load_schema_file(path: str) -> List[Dict[str, Any]]:
+    """Catalog questions straight from assets/question_schema.json (no database needed)"""
+    with open(path, "r", encoding="utf-8") as f:
+        schema = json.load(f)
+    return [
+        {**question, "visit_type": visit_type, "category": category}
+        for visit_type, categories in schema.items()
+        for category, definitions in categories.items()
+        for question in definitions
+    ]
+
+
+async def catalog_version() -> Optional[str]:
+    """Version recorded by the questions migration step"""
+    db = Question.get_motor_collection().database
+    applied = await db.migrations.find_one({"_id": "questions"}, {"version": 1})
+    return applied.get("version") if applied else None
+
+
+# The catalog as last read, shared by every compiled catalog on this worker
+_version: Optional[str] = None
+_version_checked_at = 0.0
+_questions: Optional[List[Dict[str, Any]]] = None
+_questions_version: Optional[str] = None
+_lock = asyncio.Lock()
+
+
+async def current_catalog() -> Tuple[Optional[str], List[Dict[str, Any]]]:
+    """
+    (version, questions): the version is re-read at most every CHECK_SECONDS
+    and the questions only when it changes, however many engines compile from them
+    """
+    global _version, _version_checked_at, _questions, _questions_version
+    async with _lock:
+        now = time.monotonic()
+        if _questions is None or now - _version_checked_at >= CHECK_SECONDS:
+            _version_checked_at = now
+            _version = await catalog_version()
+        if _questions is None or _questions_version != _version:
+            _questions = await Question.get_motor_collection().find({}, QUESTION_PROJECTION).to_list(length=None)
+            _questions_version = _version
+            logger.info(f"Loaded {len(_questions)} catalog questions (version {_version})")
+        return _version, _questions
+
+
+async def current_catalog_version() -> Optional[str]:
+    """Version the compiled catalogs are (re)built from; see current_catalog"""
+    version, _ = await current_catalog()
+    return version
+
+
+T = TypeVar("T")
+
+
+class CompiledCatalog(Generic[T]):
+    """
+    Something compiled from the question catalog, held per worker and
+    recompiled when the questions migration version changes.
+    """
+
+    def __init__(self, name: str, compile: Callable[[List[Dict[str, Any]], Optional[str]], T]):
+        self.name = name
+        self.compile = compile
+        self.value: Optional[T] = None
+        self.version: Optional[str] = None
+        self._lock = asyncio.Lock()
+
+    async def get(self) -> T:
+        version, questions = await current_catalog()
+        if self.value is not None and self.version == version:
+            return self.value
+        async with self._lock:
+            if self.value is None or self.version != version:
+                self.value = self.compile(questions, version)
+                self.version = version
+                logger.info(f"Compiled {self.name} for {len(questions)} questions (catalog version {version})")
+        return self.value
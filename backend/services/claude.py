@@ -1,52 +1,209 @@
+import asyncio
 import os
-import httpx
-from typing import Dict, Any, Optional
+import time
+from typing import TYPE_CHECKING, Dict, Any, NamedTuple, Optional
 from app.core.config import settings
+from app.core.metrics import metrics
 from app.logger import get_logger
+from services.resilience import CircuitBreaker, LatencyTracker, backoff_delay, parse_retry_after
+from services.rate_limiter import ClaudeRateLimiter, PRIORITY_INTERACTIVE
+
+if TYPE_CHECKING:
+    import httpx
 
 logger = get_logger("claude_service")
 
+# Rate limited, overloaded (529) and transient server errors are worth retrying
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504, 529}
+
+metrics.describe("claude_requests_total", "Claude summary calls by final outcome")
+metrics.describe("claude_retries_total", "Claude attempts retried, by upstream status")
+metrics.describe("claude_hedged_requests_total", "Hedged second requests sent to Claude")
+metrics.describe("claude_tokens_total", "Tokens billed by Claude, by kind (input/output)")
+metrics.describe("claude_cancelled_tokens_total", "Estimated output tokens not generated because a call was cancelled")
+metrics.describe("claude_wasted_tokens_total", "Estimated input tokens sent on calls that were then cancelled")
+
+
+class ClaudeAPIError(Exception):
+    """An unsuccessful Claude API attempt"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None,
+                 retry_after: Optional[float] = None, retryable: bool = False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.retryable = retryable
+
+
+class ClaudeUnavailableError(Exception):
+    """Raised without calling Claude while the circuit breaker is open"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Claude API is temporarily unavailable, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class ClaudeCompletion(NamedTuple):
+    """A summary and what it cost; model is None when Claude wasn't called (not configured)"""
+    text: str
+    model: Optional[str] = None
+    input_tokens: int = 0
+    output_tokens: int = 0
+
 
 class ClaudeService:
     """Service for interacting with Anthropic's Claude API"""
-    
+
     def __init__(self):
         self.api_key = os.getenv("ANTHROPIC_API_KEY")
         self.base_url = "https://api.anthropic.com/v1/messages"
         self.model = "claude-3-5-sonnet-20241022"  # Using Claude 3.5 Sonnet
-        
+
+        # Timeouts: per attempt, and for the whole call including retries
+        self.attempt_timeout = float(os.getenv("CLAUDE_ATTEMPT_TIMEOUT_SECONDS", "45"))
+        self.total_timeout = float(os.getenv("CLAUDE_TOTAL_TIMEOUT_SECONDS", "90"))
+        # Retries with capped exponential backoff (Retry-After wins when present)
+        self.max_retries = int(os.getenv("CLAUDE_MAX_RETRIES", "3"))
+        self.backoff_base = float(os.getenv("CLAUDE_BACKOFF_BASE_SECONDS", "1.0"))
+        self.backoff_cap = float(os.getenv("CLAUDE_BACKOFF_CAP_SECONDS", "20"))
+        # Hedging: send a second request when the first is slower than the pXX latency
+        self.hedge_enabled = os.getenv("CLAUDE_HEDGE_ENABLED", "false").lower() == "true"
+        self.hedge_percentile = float(os.getenv("CLAUDE_HEDGE_PERCENTILE", "95"))
+
+        self.breaker = CircuitBreaker(
+            "claude",
+            failure_threshold=int(os.getenv("CLAUDE_BREAKER_FAILURES", "5")),
+            reset_timeout=float(os.getenv("CLAUDE_BREAKER_RESET_SECONDS", "30"))
+        )
+        self.latencies = LatencyTracker()
+        # Shared (Redis) pacing against the organization's rate limits
+        self.rate_limiter = ClaudeRateLimiter()
+        self._client: Optional["httpx.AsyncClient"] = None
+
         if not self.api_key:
             logger.warning("ANTHROPIC_API_KEY not found. Claude AI features will be disabled.")
             self.api_key = None
         else:
             logger.info(f"Claude AI service initialized successfully with API key: {self.api_key[:20]}...")
-    
-    async def generate_summary(self, prompt: str, max_tokens: int = 1000) -> str:
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        """Shared HTTP client so connections are reused across calls"""
+        if self._client is None:
+            # Imported here so loading the app (and every router that imports
+            # this module for its exceptions) doesn't pay for httpx
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                timeout=self.attempt_timeout,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+            )
+        return self._client
+
+    async def close(self):
+        """Close the shared HTTP client"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _send(self, headers: Dict[str, str], payload: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        """Make a single API attempt"""
+        import httpx
+        started = time.monotonic()
+        try:
+            response = await self._get_client().post(
+                self.base_url,
+                headers=headers,
+                json=payload,
+                timeout=timeout
+            )
+        except httpx.TimeoutException:
+            raise ClaudeAPIError(f"Claude API timed out after {timeout:.0f}s", retryable=True)
+        except httpx.TransportError as e:
+            raise ClaudeAPIError(f"Error calling Claude API: {str(e)}", retryable=True)
+
+        await self.rate_limiter.observe(response.headers)
+
+        if response.status_code >= 400:
+            raise ClaudeAPIError(
+                f"Claude API error: {response.status_code} - {response.text}",
+                status_code=response.status_code,
+                retry_after=parse_retry_after(response.headers),
+                retryable=response.status_code in RETRYABLE_STATUS_CODES
+            )
+
+        self.latencies.record(time.monotonic() - started)
+        return response.json()
+
+    async def _send_hedged(self, headers: Dict[str, str], payload: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        """Attempt, sending a second identical request if the first runs past the hedge delay"""
+        hedge_delay = self.latencies.percentile(self.hedge_percentile) if self.hedge_enabled else None
+        if hedge_delay is None or hedge_delay >= timeout:
+            return await self._send(headers, payload, timeout)
+
+        primary = asyncio.create_task(self._send(headers, payload, timeout))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done:
+            return primary.result()
+
+        logger.info(f"Claude request slower than p{self.hedge_percentile:.0f} ({hedge_delay:.1f}s), sending hedge")
+        metrics.inc("claude_hedged_requests_total")
+        hedge = asyncio.create_task(self._send(headers, payload, max(1.0, timeout - hedge_delay)))
+
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The loser is cancelled so its connection is released
+            for task in pending:
+                task.cancel()
+
+    async def generate_summary(self, prompt: str, max_tokens: int = 1000, priority: str = PRIORITY_INTERACTIVE) -> str:
+        """Generate a summary using Claude API; see complete()"""
+        return (await self.complete(prompt, max_tokens, priority)).text
+
+    async def complete(self, prompt: str, max_tokens: int = 1000, priority: str = PRIORITY_INTERACTIVE) -> ClaudeCompletion:
         """
-        Generate a summary using Claude API
-        
+        Generate a summary using Claude API, with the model and token usage
+
+        Transient failures are retried with jittered backoff until the total
+        timeout; while the circuit breaker is open, calls fail immediately
+        with ClaudeUnavailableError. Each attempt first waits for shared
+        rate-limit budget; batch priority leaves headroom for interactive calls.
+
         Args:
             prompt: The prompt to send to Claude
             max_tokens: Maximum tokens for the response
-            
+            priority: PRIORITY_INTERACTIVE or PRIORITY_BATCH
+
         Returns:
-            Generated summary text
+            Generated summary text, model and token usage
         """
         if not self.api_key:
             logger.warning("Attempted to generate summary without API key")
-            return "Claude AI is not configured. Please set the ANTHROPIC_API_KEY environment variable to enable AI-powered summaries."
-        
+            return ClaudeCompletion("Claude AI is not configured. Please set the ANTHROPIC_API_KEY environment variable to enable AI-powered summaries.")
+
         # Check if API key looks valid (starts with sk-ant-)
         if not self.api_key.startswith("sk-ant-"):
             logger.warning("API key format appears invalid")
-            return "Invalid API key format. Please check your ANTHROPIC_API_KEY configuration."
-        
+            return ClaudeCompletion("Invalid API key format. Please check your ANTHROPIC_API_KEY configuration.")
+
         headers = {
             "Content-Type": "application/json",
             "x-api-key": self.api_key,
             "anthropic-version": "2023-06-01"
         }
-        
+
         payload = {
             "model": self.model,
             "max_tokens": max_tokens,
@@ -57,28 +214,73 @@ class ClaudeService:
                 }
             ]
         }
-        
-        try:
-            logger.info(f"Calling Claude API with model {self.model}, max_tokens={max_tokens}")
-            logger.debug(f"Using API key: {self.api_key[:20]}...")
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.post(
-                    self.base_url,
-                    headers=headers,
-                    json=payload
+
+        # Rough token estimate (~4 characters per token) for budget reservation
+        estimated_tokens = len(prompt) // 4 + max_tokens
+
+        deadline = time.monotonic() + self.total_timeout
+        attempt = 0
+        while True:
+            wait = await self.rate_limiter.acquire(estimated_tokens, priority)
+            if wait is not None:
+                metrics.inc("claude_requests_total", outcome="rate_limited")
+                raise ClaudeAPIError(
+                    "Claude rate limit budget exhausted",
+                    status_code=429,
+                    retry_after=wait,
+                    retryable=True
                 )
-                response.raise_for_status()
-                
-                result = response.json()
+
+            if not self.breaker.allow_request():
+                metrics.inc("claude_requests_total", outcome="rejected")
+                logger.warning("Claude circuit breaker open, failing fast")
+                raise ClaudeUnavailableError(self.breaker.retry_after())
+
+            timeout = max(1.0, min(self.attempt_timeout, deadline - time.monotonic()))
+            try:
+                logger.info(f"Calling Claude API with model {self.model}, max_tokens={max_tokens}, attempt={attempt + 1}")
+                result = await self._send_hedged(headers, payload, timeout)
+                self.breaker.record_success()
+                metrics.inc("claude_requests_total", outcome="success")
+                usage = result.get("usage") or {}
+                metrics.inc("claude_tokens_total", usage.get("input_tokens", 0), kind="input")
+                metrics.inc("claude_tokens_total", usage.get("output_tokens", 0), kind="output")
                 logger.info("Claude API call successful")
-                return result["content"][0]["text"]
-                
-        except httpx.HTTPStatusError as e:
-            logger.error(f"Claude API HTTP error: {e.response.status_code} - {e.response.text}")
-            raise Exception(f"Claude API error: {e.response.status_code} - {e.response.text}")
-        except Exception as e:
-            logger.error(f"Claude API error: {str(e)}")
-            raise Exception(f"Error calling Claude API: {str(e)}")
+                return ClaudeCompletion(
+                    result["content"][0]["text"],
+                    result.get("model") or self.model,
+                    usage.get("input_tokens", 0),
+                    usage.get("output_tokens", 0)
+                )
+
+            except asyncio.CancelledError:
+                # The prompt was already sent, so its input tokens are likely
+                # billed; the completion we no longer wait for is not
+                self.breaker.trial_in_flight = False
+                metrics.inc("claude_requests_total", outcome="cancelled")
+                metrics.inc("claude_wasted_tokens_total", len(prompt) // 4)
+                metrics.inc("claude_cancelled_tokens_total", max_tokens)
+                logger.info(f"Claude API call cancelled on attempt {attempt + 1}")
+                raise
+
+            except ClaudeAPIError as e:
+                # Only upstream degradation counts against the breaker; 429s and
+                # client errors mean the API itself is answering
+                if e.retryable and e.status_code != 429:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+
+                delay = e.retry_after if e.retry_after is not None else backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+                if not e.retryable or attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                    metrics.inc("claude_requests_total", outcome="failure")
+                    logger.error(f"Claude API call failed after {attempt + 1} attempt(s): {str(e)}")
+                    raise
+
+                metrics.inc("claude_retries_total", status=str(e.status_code or "network"))
+                logger.warning(f"Claude API attempt {attempt + 1} failed ({str(e)[:200]}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
 
 
 # Global instance
@@ -90,4 +292,12 @@ def get_claude_service() -> ClaudeService:
     global claude_service
     if claude_service is None:
         claude_service = ClaudeService()
-    return claude_service 
\ No newline at end of file
+    return claude_service
+
+
+async def close_claude_service():
+    """Close the Claude service's HTTP client"""
+    global claude_service
+    if claude_service:
+        await claude_service.close()
+        claude_service = None
@@ -0,0 +1,147 @@
+from typing import Any, Dict, List, Optional, Tuple
+from app.models.form import Form
+from app.models.completeness import CompletenessReport, DocumentationGap
+from services.catalog import CompiledCatalog, options_by_field
+from services.form_diff import is_answered, iter_form_fields
+
+
+class CompiledQuestion:
+    """
+    A catalog question reduced to what scoring needs.
+
+    `options` pairs each answer option with the form field it is recorded
+    in (None when the option has no field of its own); `children` holds the
+    subitems that become required once that option is selected.
+
+    An option with neither a field nor subitems (the "No" of
+    {"Yes": "cardioWnl", "No": None}) is recorded by leaving the other
+    fields unset, so it is `implied`: the question counts as answered with
+    that option whenever nothing else was chosen.
+    """
+
+    __slots__ = ("qid", "category", "description", "fields", "options", "children", "implied")
+
+    def __init__(self, qid: str, category: Optional[str], description: str,
+                 options: List[Tuple[str, Optional[str], bool]], children: Dict[str, List["CompiledQuestion"]]):
+        self.qid = qid
+        self.category = category
+        self.description = description
+        self.options = options
+        self.fields = tuple({field for _, field, _ in options if field})
+        self.children = children
+        self.implied = next((option for option, field, _ in options if field is None and not children.get(option)), None)
+
+    @classmethod
+    def compile(cls, definition: Dict[str, Any], category: Optional[str]) -> "CompiledQuestion":
+        casting = definition.get("casting") or {}
+        grouped = options_by_field(casting)
+        # A field shared by several options holds the chosen option's name (radio);
+        # a field of its own is set (True, or free text) when the option applies
+        options = [(option, field, len(grouped.get(field, ())) > 1) for option, field in casting.items()]
+        children = {
+            option: [cls.compile(sub, category) for sub in subitems]
+            for option, subitems in (definition.get("subitems") or {}).items()
+        }
+        return cls(definition["qid"], category, definition["description"], options, children)
+
+    def selected(self, values: Dict[str, Any]) -> List[str]:
+        """Options chosen on the form"""
+        chosen = []
+        for option, field, shared in self.options:
+            if field is None:
+                # No field of its own: chosen if any of its subitems were answered
+                if any(child.answered(values) for child in self.children.get(option, [])):
+                    chosen.append(option)
+                continue
+            value = values.get(field)
+            if shared:
+                if value == option:
+                    chosen.append(option)
+            elif is_answered(value) and value is not False:
+                chosen.append(option)
+        if not chosen and self.implied is not None:
+            chosen.append(self.implied)
+        return chosen
+
+    def answered(self, values: Dict[str, Any]) -> bool:
+        for field in self.fields:
+            value = values.get(field)
+            if is_answered(value) and value is not False:
+                return True
+        if any(child.answered(values) for children in self.children.values() for child in children):
+            return True
+        return self.implied is not None
+
+
+class CompletenessEngine:
+    """
+    Scores forms against the question catalog, per visit type.
+
+    Every top-level catalog question for the form's visit type is required;
+    subitems are required when the answer they hang off is selected. Each
+    visit type's questions are compiled once, so scoring a form is a single
+    walk of the compiled questions with dictionary lookups into its fields.
+    """
+
+    def __init__(self, catalog: Dict[str, List[CompiledQuestion]], version: Optional[str]):
+        self.catalog = catalog
+        self.version = version
+
+    @classmethod
+    def compile(cls, questions: List[Dict[str, Any]], version: Optional[str] = None) -> "CompletenessEngine":
+        catalog: Dict[str, List[CompiledQuestion]] = {}
+        for question in questions:
+            catalog.setdefault(question.get("visit_type"), []).append(
+                CompiledQuestion.compile(question, question.get("category"))
+            )
+        return cls(catalog, version)
+
+    def score(self, form_id: int, form_type: str, survey_data: Dict[str, Any]) -> CompletenessReport:
+        # Later sections (the form's own type) override earlier ones
+        values = {field: value for _, field, value, _ in iter_form_fields(survey_data, form_type)}
+
+        required = 0
+        answered = 0
+        gaps: List[DocumentationGap] = []
+        pending: List[Tuple[CompiledQuestion, Optional[str]]] = [(q, None) for q in self.catalog.get(form_type, [])]
+        while pending:
+            question, required_by = pending.pop()
+            required += 1
+            if question.answered(values):
+                answered += 1
+                for option in question.selected(values):
+                    condition = f"{question.description}: {option}"
+                    pending.extend((child, condition) for child in question.children.get(option, []))
+            else:
+                gaps.append(DocumentationGap(
+                    qid=question.qid,
+                    category=question.category,
+                    description=question.description,
+                    required_by=required_by
+                ))
+
+        gaps.reverse()
+        return CompletenessReport(
+            form_id=form_id,
+            form_type=form_type,
+            score=round(100.0 * answered / required, 1) if required else 100.0,
+            required=required,
+            answered=answered,
+            gaps=gaps
+        )
+
+
+# Compiled catalog for this worker
+completeness_engine = CompiledCatalog("completeness rules", CompletenessEngine.compile)
+
+
+async def get_completeness_engine() -> CompletenessEngine:
+    """The compiled catalog, recompiled when the questions migration version changes"""
+    return await completeness_engine.get()
+
+
+async def score_form(form: Form) -> CompletenessReport:
+    """Score a form's documentation completeness"""
+    engine = await get_completeness_engine()
+    form_type = form.form_type.value if hasattr(form.form_type, "value") else form.form_type
+    return engine.score(form.form_id, form_type, form.survey_data)
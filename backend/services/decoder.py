@@ -0,0 +1,154 @@
+from typing import Any, Dict, List, Optional, Tuple, Union
+from services.catalog import VALUE_TYPES, CompiledCatalog, option_choices, options_by_field
+
+
+EMPTY: Dict[str, Any] = {}
+
+
+class FieldLabel:
+    """
+    How to read one form field: the question it answers and what its values mean.
+
+    `option` is the answer a field of its own records (set when the option
+    applies); `choices` maps the values of a field shared by several options
+    (a radio) - the option names and their bare Q-codes - to answer labels.
+    """
+
+    __slots__ = ("qid", "question", "parent", "option", "choices")
+
+    def __init__(self, qid: str, question: str, parent: Optional[str], option: Optional[str],
+                 choices: Optional[Dict[str, str]]):
+        self.qid = qid
+        self.question = question
+        self.parent = parent
+        self.option = option
+        self.choices = choices
+
+    def answer(self, value: Any) -> Any:
+        """Human-readable answer for a field value; None if the option isn't selected"""
+        if self.choices is not None:
+            return self.choices.get(value, value) if isinstance(value, str) else value
+        if self.option is None:
+            return value
+        if value is True:
+            return self.option
+        if value is False or value is None or value == "":
+            return None
+        return f"{self.option}: {value}"
+
+
+# A table entry: one label, or several when a field code is reused
+Labels = Union[FieldLabel, List[FieldLabel]]
+
+
+class FormDecoder:
+    """
+    Maps form field codes and option codes to question and answer labels.
+
+    Compiled once from the question catalog (casting and nested subitems)
+    into one field -> label table per (visit type, category), so decoding a
+    field is a single dictionary lookup. Field codes are only unique within a
+    visit type and category; fields a form files under another category fall
+    back to the visit type's table. A code used by several questions in one
+    table maps to all of them and is resolved by the value.
+    """
+
+    def __init__(self, version: Optional[str] = None):
+        self.version = version
+        self.tables: Dict[Tuple[Optional[str], Optional[str]], Dict[str, Labels]] = {}
+        self.fallback: Dict[Optional[str], Dict[str, Labels]] = {}
+
+    @classmethod
+    def compile(cls, questions: List[Dict[str, Any]], version: Optional[str] = None) -> "FormDecoder":
+        decoder = cls(version)
+        for question in questions:
+            decoder._add(question, question.get("visit_type"), question.get("category"), None)
+        return decoder
+
+    @staticmethod
+    def _register(table: Dict[str, Labels], field: str, label: FieldLabel):
+        existing = table.get(field)
+        if existing is None:
+            table[field] = label
+        elif isinstance(existing, list):
+            existing.append(label)
+        else:
+            table[field] = [existing, label]
+
+    def _add(self, definition: Dict[str, Any], visit_type: Optional[str], category: Optional[str],
+             parent: Optional[str]):
+        for field, options in options_by_field(definition.get("casting") or {}).items():
+            if len(options) > 1:
+                label = FieldLabel(definition["qid"], definition["description"], parent, None, option_choices(options))
+            else:
+                option = None if options[0] in VALUE_TYPES else options[0]
+                label = FieldLabel(definition["qid"], definition["description"], parent, option, None)
+            self._register(self.tables.setdefault((visit_type, category), {}), field, label)
+            self._register(self.fallback.setdefault(visit_type, {}), field, label)
+
+        for option, subitems in (definition.get("subitems") or {}).items():
+            context = definition["description"] if option == "Yes" else f"{definition['description']}: {option}"
+            if parent:
+                context = f"{parent} > {context}"
+            for sub in subitems:
+                self._add(sub, visit_type, category, context)
+
+    @staticmethod
+    def _resolve(labels: Labels, value: Any) -> FieldLabel:
+        """The label a reused field code's value belongs to"""
+        if isinstance(value, str):
+            for label in labels:
+                if label.choices is not None and value in label.choices:
+                    return label
+        return labels[0]
+
+    def label(self, visit_type: str, category: str, field: str, value: Any = None) -> Optional[FieldLabel]:
+        """The catalog entry for a field"""
+        labels = self.tables.get((visit_type, category), EMPTY).get(field) or self.fallback.get(visit_type, EMPTY).get(field)
+        if labels.__class__ is list:
+            return self._resolve(labels, value)
+        return labels
+
+    def decode_survey(self, survey_data: Dict[str, Any], exclude_null: bool = False) -> Dict[str, Any]:
+        """
+        survey_data with each field rendered as {value, qid, question_description,
+        parent, answer}, where parent is the question and answer a subitem hangs
+        off; fields unknown to the catalog keep their stored description
+        """
+        decoded: Dict[str, Any] = {}
+        for visit_type, categories in survey_data.items():
+            decoded_categories = decoded[visit_type] = {}
+            fallback = self.fallback.get(visit_type, EMPTY)
+            for category, fields in categories.items():
+                decoded_fields = decoded_categories[category] = {}
+                table = self.tables.get((visit_type, category), EMPTY)
+                for field, field_data in fields.items():
+                    if field_data.__class__ is dict:
+                        value = field_data.get("value")
+                    else:
+                        value, field_data = field_data, EMPTY
+                    if exclude_null and (value is None or value == ""):
+                        continue
+                    label = table.get(field) or fallback.get(field)
+                    if label is None:
+                        decoded_fields[field] = {
+                            "value": value, "qid": None, "question_description": field_data.get("question_description"),
+                            "parent": None, "answer": value
+                        }
+                        continue
+                    if label.__class__ is list:
+                        label = self._resolve(label, value)
+                    decoded_fields[field] = {
+                        "value": value, "qid": label.qid, "question_description": label.question,
+                        "parent": label.parent, "answer": label.answer(value)
+                    }
+        return decoded
+
+
+# Compiled decoder for this worker
+form_decoder = CompiledCatalog("form decoder", FormDecoder.compile)
+
+
+async def get_form_decoder() -> FormDecoder:
+    """The compiled decoder, recompiled when the questions migration version changes"""
+    return await form_decoder.get()
@@ -0,0 +1,163 @@
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from fastapi import HTTPException
+from app.models.form import AnswerChange, Form, FormComparison, FormHeader
+from app.models.question import Question, QuestionDescription
+from app.core.cache import get_cache_client
+from app.logger import get_logger
+
+logger = get_logger("form_diff")
+
+# Bump when the diff output changes; it is part of the cache key
+DIFF_VERSION = 1
+DIFF_CACHE_SECONDS = int(os.getenv("FORM_DIFF_CACHE_SECONDS", "86400"))
+
+# (category, qid) -> (answer, question description)
+FlatAnswers = Dict[Tuple[str, str], Tuple[Any, Optional[str]]]
+
+
+def is_answered(value: Any) -> bool:
+    return value is not None and value != ''
+
+
+def iter_form_fields(survey_data: Dict[str, Any], form_type: str) -> Iterator[Tuple[str, str, Any, Optional[str]]]:
+    """
+    Walk survey_data (form_type -> category -> field) yielding
+    (category, qid, value, description) for every field, answered or not.
+
+    Sections for other form types come first, so when a form carries several
+    sections with the same question, the last one yielded is its own type's.
+    """
+    sections = sorted(survey_data.items(), key=lambda item: item[0] == form_type)
+    for _, categories in sections:
+        for category, fields in categories.items():
+            for qid, field_data in fields.items():
+                if isinstance(field_data, dict):
+                    yield category, qid, field_data.get('value'), field_data.get('question_description')
+                else:
+                    yield category, qid, field_data, None
+
+
+def flatten_answers(form: Form) -> FlatAnswers:
+    """
+    Flatten a form's answered questions, keyed by (category, qid).
+
+    The form_type level is dropped so a SOC can be compared with a later RN
+    or DC visit; if a form carries several sections with the same question,
+    the section for the form's own type wins.
+    """
+    own_type = form.form_type.value if hasattr(form.form_type, "value") else form.form_type
+    answers: FlatAnswers = {}
+    for category, qid, value, description in iter_form_fields(form.survey_data, own_type):
+        if is_answered(value):
+            answers[(category, qid)] = (value, description)
+        else:
+            answers.pop((category, qid), None)
+    return answers
+
+
+def diff_answers(left: FlatAnswers, right: FlatAnswers) -> Tuple[List[AnswerChange], List[AnswerChange], List[AnswerChange], int]:
+    """Added, removed and changed answers plus the unchanged count, in one pass over each side"""
+    added, changed = [], []
+    unchanged = 0
+    for key, (value, description) in right.items():
+        previous = left.get(key)
+        if previous is None:
+            added.append(AnswerChange(category=key[0], qid=key[1], description=description, right=value))
+        elif previous[0] != value:
+            changed.append(AnswerChange(
+                category=key[0], qid=key[1], description=description or previous[1],
+                left=previous[0], right=value
+            ))
+        else:
+            unchanged += 1
+
+    removed = [
+        AnswerChange(category=key[0], qid=key[1], description=description, left=value)
+        for key, (value, description) in left.items()
+        if key not in right
+    ]
+    return added, removed, changed, unchanged
+
+
+async def _fill_descriptions(changes: List[AnswerChange]):
+    """Label answers whose form data carries no description from the question catalog"""
+    missing = {change.qid for change in changes if not change.description}
+    if not missing:
+        return
+
+    by_category: Dict[Tuple[Optional[str], str], str] = {}
+    by_qid: Dict[str, str] = {}
+    questions = await Question.find({"qid": {"$in": list(missing)}}).project(QuestionDescription).to_list()
+    for question in questions:
+        by_category[(question.category, question.qid)] = question.description
+        by_qid.setdefault(question.qid, question.description)
+
+    for change in changes:
+        if not change.description:
+            change.description = by_category.get((change.category, change.qid)) or by_qid.get(change.qid)
+
+
+def _cache_key(left, right) -> str:
+    """Key a diff by both forms' ids and revisions (any objects with those fields)"""
+    return f"form-diff:v{DIFF_VERSION}:{left.form_id}.{left.revision}:{right.form_id}.{right.revision}"
+
+
+async def compare_forms(left_form_id: int, right_form_id: int) -> FormComparison:
+    """
+    Diff two forms of the same patient.
+
+    Results are cached by both forms' revisions, so a hit costs one
+    projected lookup and one Redis GET.
+    """
+    form_ids = [left_form_id, right_form_id]
+    headers = {
+        header.form_id: header
+        for header in await Form.find({"form_id": {"$in": form_ids}}).project(FormHeader).to_list()
+    }
+    for form_id in form_ids:
+        if form_id not in headers:
+            raise HTTPException(status_code=404, detail=f"Form {form_id} not found")
+    left_header, right_header = headers[left_form_id], headers[right_form_id]
+    if left_header.patient_id != right_header.patient_id:
+        raise HTTPException(status_code=400, detail="Forms belong to different patients")
+
+    cache_client = await get_cache_client()
+    cached = await cache_client.get_value(_cache_key(left_header, right_header))
+    if cached:
+        logger.info(f"Form diff cache hit for {left_form_id} -> {right_form_id}")
+        return FormComparison(**cached)
+
+    forms = {form.form_id: form for form in await Form.find({"form_id": {"$in": form_ids}}).to_list()}
+    if left_form_id not in forms or right_form_id not in forms:
+        raise HTTPException(status_code=404, detail="Form not found")
+    left, right = forms[left_form_id], forms[right_form_id]
+
+    added, removed, changed, unchanged = diff_answers(flatten_answers(left), flatten_answers(right))
+    await _fill_descriptions(added + removed + changed)
+
+    comparison = FormComparison(
+        patient_id=left.patient_id,
+        left_form_id=left.form_id,
+        right_form_id=right.form_id,
+        left_form_type=left.form_type,
+        right_form_type=right.form_type,
+        left_form_date=left.form_date,
+        right_form_date=right.form_date,
+        added=added,
+        removed=removed,
+        changed=changed,
+        unchanged=unchanged
+    )
+    logger.info(
+        f"Compared forms {left_form_id} -> {right_form_id}: "
+        f"{len(added)} added, {len(removed)} removed, {len(changed)} changed"
+    )
+
+    # Keyed by the revisions actually read, in case a form changed since the header lookup
+    await cache_client.set_value(
+        _cache_key(left, right),
+        comparison.model_dump(mode="json"),
+        DIFF_CACHE_SECONDS
+    )
+    return comparison
@@ -0,0 +1,266 @@
+import asyncio
+import json
+import os
+from datetime import datetime, time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError, PyMongoError
+from app.models.form import (
+    BulkFormWriteResponse, Form, FormCreate, FormValidationIssue, FormWriteResult, FormWriteStatus
+)
+from app.models.patient import Patient
+from app.core.counters import next_sequence, seed_sequence
+from app.core.metrics import metrics
+from services.decoder import FormDecoder, get_form_decoder
+from services.validation import FormValidator, get_form_validator
+from app.logger import get_logger
+
+logger = get_logger("form_writes")
+
+# Records validated, given IDs and written per round trip in a bulk upload
+BATCH_SIZE = int(os.getenv("FORM_BULK_BATCH_SIZE", "500"))
+# Longest NDJSON line accepted; longer records are rejected without being buffered
+MAX_RECORD_BYTES = int(os.getenv("FORM_BULK_MAX_RECORD_BYTES", str(4 * 1024 * 1024)))
+
+metrics.describe("forms_written_total", "Forms received over the API by outcome (created, invalid, failed)")
+
+# Form IDs are a counter sequence seeded above the existing forms once per worker
+_sequence_seeded = False
+_seed_lock = asyncio.Lock()
+
+# A record ready to insert: (index, document without form_id, warnings)
+Prepared = Tuple[int, Dict[str, Any], List[FormValidationIssue]]
+
+
+def _issues(error: ValidationError) -> List[FormValidationIssue]:
+    return [
+        FormValidationIssue(path=".".join(str(part) for part in e["loc"]) or "record", code=e["type"], message=e["msg"])
+        for e in error.errors()
+    ]
+
+
+def _invalid(index: int, path: str, code: str, message: str) -> FormWriteResult:
+    return FormWriteResult(index=index, status=FormWriteStatus.INVALID,
+                           errors=[FormValidationIssue(path=path, code=code, message=message)])
+
+
+def _stored_survey(survey_data: Dict[str, Any], decoder: FormDecoder) -> Dict[str, Any]:
+    """survey_data in the stored {"value", "question_description"} shape"""
+    stored: Dict[str, Any] = {}
+    for form_type, categories in survey_data.items():
+        stored_categories = stored[form_type] = {}
+        for category, fields in categories.items():
+            stored_fields = stored_categories[category] = {}
+            for field, value in fields.items():
+                if value.__class__ is dict and "value" in value:
+                    value = value["value"]
+                label = decoder.label(form_type, category, field, value)
+                stored_fields[field] = {"value": value, "question_description": label.question if label else None}
+    return stored
+
+
+def prepare_record(index: int, record: Any, validator: FormValidator, decoder: FormDecoder,
+                   strict: bool = False) -> Tuple[Optional[Prepared], Optional[FormWriteResult]]:
+    """
+    Parse and validate one record (NDJSON bytes, a dict or a FormCreate).
+
+    Returns the document to insert, or the result rejecting it. CPU-bound;
+    bulk uploads run it off the event loop.
+    """
+    if record is None:
+        return None, _invalid(index, "record", "record_too_large", f"record exceeds {MAX_RECORD_BYTES} bytes")
+    try:
+        if isinstance(record, (bytes, str)):
+            record = json.loads(record)
+        form = record if isinstance(record, FormCreate) else FormCreate.model_validate(record)
+    except json.JSONDecodeError as e:
+        return None, _invalid(index, "record", "invalid_json", str(e))
+    except ValidationError as e:
+        return None, FormWriteResult(index=index, status=FormWriteStatus.INVALID, errors=_issues(e))
+
+    result = validator.validate(form.survey_data, strict)
+    if not result.valid:
+        return None, FormWriteResult(index=index, status=FormWriteStatus.INVALID,
+                                     errors=result.errors, warnings=result.warnings)
+
+    form_date = form.form_date
+    if not isinstance(form_date, datetime):
+        form_date = datetime.combine(form_date, time())
+    document = {
+        "patient_id": form.patient_id,
+        "form_date": form_date,
+        "form_type": form.form_type.value,
+        "survey_data": _stored_survey(form.survey_data, decoder),
+        # Raw inserts skip Form.bump_revision
+        "revision": 1,
+    }
+    return (index, document, result.warnings), None
+
+
+async def _reserve_form_ids(db, count: int) -> int:
+    """First of `count` new form IDs, never reused across workers"""
+    global _sequence_seeded
+    if not _sequence_seeded:
+        async with _seed_lock:
+            if not _sequence_seeded:
+                await seed_sequence(db, "form_id", "forms", "form_id")
+                _sequence_seeded = True
+    return await next_sequence(db, "form_id", count)
+
+
+async def write_prepared(prepared: List[Prepared]) -> List[FormWriteResult]:
+    """
+    Insert validated records with one block of form IDs and one unordered
+    insert_many; records for unknown patients are rejected first
+    """
+    if not prepared:
+        return []
+    patient_ids = list({document["patient_id"] for _, document, _ in prepared})
+    known = {
+        doc["patient_id"] async for doc in Patient.get_motor_collection().find(
+            {"patient_id": {"$in": patient_ids}}, {"_id": 0, "patient_id": 1}
+        )
+    }
+
+    results: List[FormWriteResult] = []
+    accepted: List[Prepared] = []
+    for index, document, warnings in prepared:
+        if document["patient_id"] in known:
+            accepted.append((index, document, warnings))
+        else:
+            results.append(_invalid(index, "patient_id", "unknown_patient",
+                                    f"patient {document['patient_id']} does not exist"))
+    if not accepted:
+        return results
+
+    collection = Form.get_motor_collection()
+    first_id = await _reserve_form_ids(collection.database, len(accepted))
+    documents = []
+    for offset, (_, document, _) in enumerate(accepted):
+        document["form_id"] = first_id + offset
+        documents.append(document)
+
+    failed: Dict[int, str] = {}
+    try:
+        await collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            failed[error["index"]] = error.get("errmsg", "write failed")
+        logger.error(f"Bulk form insert: {len(failed)} of {len(documents)} writes failed")
+    except PyMongoError as e:
+        # e.g. the connection dropped: report the batch failed rather than lose every result
+        failed = {position: str(e) for position in range(len(documents))}
+        logger.error(f"Bulk form insert of {len(documents)} forms failed: {str(e)}")
+
+    for position, (index, document, warnings) in enumerate(accepted):
+        if position in failed:
+            results.append(FormWriteResult(
+                index=index, status=FormWriteStatus.FAILED,
+                errors=[FormValidationIssue(path="record", code="write_failed", message=failed[position])]
+            ))
+        else:
+            results.append(FormWriteResult(index=index, status=FormWriteStatus.CREATED,
+                                           form_id=document["form_id"], warnings=warnings))
+    return results
+
+
+def _count(results: List[FormWriteResult]):
+    for result in results:
+        metrics.inc("forms_written_total", status=result.status.value)
+
+
+async def create_form(form: FormCreate, strict: bool = False) -> FormWriteResult:
+    """Validate and insert one form"""
+    validator = await get_form_validator()
+    decoder = await get_form_decoder()
+    prepared, rejected = prepare_record(1, form, validator, decoder, strict)
+    results = [rejected] if rejected else await write_prepared([prepared])
+    _count(results)
+    return results[0]
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes],
+                      max_record_bytes: int = MAX_RECORD_BYTES) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+    """
+    (line number, record) for each non-blank line of a streamed NDJSON body,
+    as the chunks arrive; records longer than max_record_bytes come back as None
+    """
+    pending: List[bytes] = []  # the unterminated line so far, by chunk
+    pending_bytes = 0
+    line_number = 0
+    oversized = False
+    async for chunk in chunks:
+        if b"\n" not in chunk:
+            pending.append(chunk)
+            pending_bytes += len(chunk)
+        else:
+            lines = chunk.split(b"\n")
+            lines[0] = b"".join(pending) + lines[0]
+            pending = [lines.pop()]
+            pending_bytes = len(pending[0])
+            for line in lines:
+                line_number += 1
+                if oversized:
+                    # The end of an oversized record
+                    oversized = False
+                    yield line_number, None
+                elif line.strip():
+                    yield line_number, line if len(line) <= max_record_bytes else None
+        if pending_bytes > max_record_bytes:
+            pending, pending_bytes, oversized = [], 0, True
+    last = b"".join(pending)
+    if oversized:
+        yield line_number + 1, None
+    elif last.strip():
+        yield line_number + 1, last
+
+
+async def bulk_create_forms(chunks: AsyncIterator[bytes], strict: bool = False,
+                            batch_size: int = BATCH_SIZE) -> BulkFormWriteResponse:
+    """
+    Ingest a streamed NDJSON body of FormCreate records.
+
+    Records are read as they arrive and handled in batches of batch_size:
+    each batch is parsed and validated in a worker thread, then gets one
+    block of form IDs and one insert_many, so memory stays bounded by the
+    batch whatever the size of the upload. Every record gets a result,
+    indexed by its line number; a bad record never fails the others.
+    """
+    validator = await get_form_validator()
+    decoder = await get_form_decoder()
+    results: List[FormWriteResult] = []
+
+    def prepare(batch: List[Tuple[int, Optional[bytes]]]):
+        prepared, rejected = [], []
+        for index, record in batch:
+            ready, result = prepare_record(index, record, validator, decoder, strict)
+            if ready:
+                prepared.append(ready)
+            else:
+                rejected.append(result)
+        return prepared, rejected
+
+    async def flush(batch: List[Tuple[int, Optional[bytes]]]):
+        prepared, rejected = await asyncio.to_thread(prepare, batch)
+        written = await write_prepared(prepared)
+        results.extend(sorted(rejected + written, key=lambda r: r.index))
+
+    batch: List[Tuple[int, Optional[bytes]]] = []
+    async for line in iter_ndjson(chunks):
+        batch.append(line)
+        if len(batch) >= batch_size:
+            await flush(batch)
+            batch = []
+    if batch:
+        await flush(batch)
+
+    _count(results)
+    counts = {status: 0 for status in FormWriteStatus}
+    for result in results:
+        counts[result.status] += 1
+    return BulkFormWriteResponse(
+        created=counts[FormWriteStatus.CREATED],
+        invalid=counts[FormWriteStatus.INVALID],
+        failed=counts[FormWriteStatus.FAILED],
+        results=results
+    )
@@ -0,0 +1,116 @@
+import hashlib
+import os
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from pymongo import UpdateOne
+from app.models.patient import HPDocument, HPReference
+from app.core.metrics import metrics
+from app.logger import get_logger
+
+logger = get_logger("hp_store")
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+# H&P XML is mostly repeated markup; a high level costs little since it's written once
+ZSTD_LEVEL = int(os.getenv("HP_ZSTD_LEVEL", "12"))
+# Decompressed H&Ps kept per worker; content-addressed, so entries never go stale
+CACHE_ENTRIES = int(os.getenv("HP_CACHE_ENTRIES", "64"))
+
+metrics.describe("hp_reads_total", "H&P documents read, by source (cache, store or inline legacy field)")
+
+_cache: "OrderedDict[str, bytes]" = OrderedDict()
+
+
+def compress_hp(raw: bytes) -> Tuple[str, bytes]:
+    """(codec, compressed bytes)"""
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return "zlib", zlib.compress(raw, 9)
+
+
+def decompress_hp(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("H&P stored with zstd but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    raise ValueError(f"Unknown H&P codec {codec!r}")
+
+
+def encode_hp(xml: str) -> Dict[str, Any]:
+    """The hp_documents document for an H&P; CPU-bound, so bulk writers run it off the event loop"""
+    raw = xml.encode("utf-8")
+    codec, data = compress_hp(raw)
+    return {
+        "_id": hashlib.sha256(raw).hexdigest(),
+        "codec": codec,
+        "data": data,
+        "size": len(raw),
+        "compressed_size": len(data),
+        "created_at": datetime.utcnow(),
+    }
+
+
+def hp_reference(document: Dict[str, Any]) -> Dict[str, Any]:
+    """What a patient stores in `hp` for an encoded H&P"""
+    return {"sha256": document["_id"], "size": document["size"], "compressed_size": document["compressed_size"]}
+
+
+def hp_upsert(document: Dict[str, Any]) -> UpdateOne:
+    """Bulk operation storing an encoded H&P; a no-op when the same content is already stored"""
+    fields = {key: value for key, value in document.items() if key != "_id"}
+    return UpdateOne({"_id": document["_id"]}, {"$setOnInsert": fields}, upsert=True)
+
+
+def offload_hp(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Move a parsed patient's xml_data out of the record: the record gets an
+    `hp` reference instead, and the encoded document to store is returned
+    """
+    xml = record.pop("xml_data", None)
+    if not xml:
+        return None
+    document = encode_hp(xml)
+    record["hp"] = hp_reference(document)
+    return document
+
+
+def _remember(sha256: str, raw: bytes):
+    _cache[sha256] = raw
+    _cache.move_to_end(sha256)
+    while len(_cache) > CACHE_ENTRIES:
+        _cache.popitem(last=False)
+
+
+async def load_hp(reference: HPReference) -> Optional[bytes]:
+    """The raw XML of a stored H&P, or None if its document is missing"""
+    raw = _cache.get(reference.sha256)
+    if raw is not None:
+        _cache.move_to_end(reference.sha256)
+        metrics.inc("hp_reads_total", source="cache")
+        return raw
+    document = await HPDocument.get_motor_collection().find_one({"_id": reference.sha256})
+    if document is None:
+        logger.error(f"H&P document {reference.sha256} is missing")
+        return None
+    raw = decompress_hp(document["codec"], document["data"])
+    _remember(reference.sha256, raw)
+    metrics.inc("hp_reads_total", source="store")
+    return raw
+
+
+async def load_hp_text(patient: Any) -> Optional[str]:
+    """A patient's H&P XML, from hp_documents or a not yet migrated inline xml_data"""
+    if getattr(patient, "hp", None) is not None:
+        raw = await load_hp(patient.hp)
+        return raw.decode("utf-8") if raw is not None else None
+    if getattr(patient, "xml_data", None):
+        metrics.inc("hp_reads_total", source="inline")
+        return patient.xml_data
+    return None
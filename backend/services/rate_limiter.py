@@ -0,0 +1,154 @@
+import asyncio
+import os
+import random
+import time
+from datetime import datetime
+from typing import Mapping, Optional
+from app.core.cache import get_cache_client
+from app.core.metrics import metrics
+from app.logger import get_logger
+
+logger = get_logger("rate_limiter")
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BATCH = "batch"
+
+metrics.describe("claude_rate_limit_waiting", "Claude calls waiting for rate-limit budget, by priority")
+metrics.describe("claude_rate_limit_waits_total", "Times a Claude call was paced by the rate limiter")
+metrics.describe("claude_rate_limit_remaining", "Last observed Anthropic rate-limit budget")
+
+# Atomically check the shared budget and reserve one request plus an estimated
+# token count. Batch callers must leave `reserve` (a fraction of the limit) for
+# interactive traffic. Returns the seconds to wait as a string (0 = go ahead).
+ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local tokens = tonumber(ARGV[2])
+local reserve = tonumber(ARGV[3])
+local s = redis.call('HMGET', KEYS[1], 'requests_remaining', 'requests_limit', 'requests_reset',
+                     'tokens_remaining', 'tokens_limit', 'tokens_reset')
+local rr, rl, rreset = tonumber(s[1]), tonumber(s[2]), tonumber(s[3])
+local tr, tl, treset = tonumber(s[4]), tonumber(s[5]), tonumber(s[6])
+local requests_active = rr and rreset and now < rreset
+local tokens_active = tr and treset and now < treset
+local wait = 0
+if requests_active and rr - 1 < (rl or 0) * reserve then
+    wait = rreset - now
+end
+if tokens_active and tr - tokens < (tl or 0) * reserve then
+    wait = math.max(wait, treset - now)
+end
+if wait > 0 then
+    return tostring(wait)
+end
+if requests_active then
+    redis.call('HINCRBY', KEYS[1], 'requests_remaining', -1)
+end
+if tokens_active then
+    redis.call('HINCRBY', KEYS[1], 'tokens_remaining', -tokens)
+end
+return '0'
+"""
+
+
+def _parse_reset(value: Optional[str]) -> Optional[float]:
+    """Anthropic reports reset times as RFC 3339 timestamps"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+class ClaudeRateLimiter:
+    """
+    Paces outbound Claude calls against the organization-wide limits.
+
+    Every response's anthropic-ratelimit-* headers are written to a Redis hash
+    shared by all replicas; before each call a Lua script reserves budget from
+    it, or tells the caller how long to wait for the window to reset. If Redis
+    is unavailable calls are not paced.
+    """
+
+    def __init__(self):
+        self.key = os.getenv("CLAUDE_RATE_LIMIT_KEY", "claude:ratelimit")
+        # Fraction of the limit that batch traffic may not consume
+        self.batch_reserve = float(os.getenv("CLAUDE_RATE_LIMIT_BATCH_RESERVE", "0.2"))
+        # Longest a call waits for budget before giving up
+        self.max_wait = {
+            PRIORITY_INTERACTIVE: float(os.getenv("CLAUDE_RATE_LIMIT_MAX_WAIT_SECONDS", "20")),
+            PRIORITY_BATCH: float(os.getenv("CLAUDE_RATE_LIMIT_BATCH_MAX_WAIT_SECONDS", "300")),
+        }
+        self.waiting = {PRIORITY_INTERACTIVE: 0, PRIORITY_BATCH: 0}
+        self._script = None
+
+    async def _redis(self):
+        cache_client = await get_cache_client()
+        if cache_client.client is not None and self._script is None:
+            self._script = cache_client.client.register_script(ACQUIRE_SCRIPT)
+        return cache_client.client
+
+    async def acquire(self, estimated_tokens: int, priority: str = PRIORITY_INTERACTIVE) -> Optional[float]:
+        """
+        Wait until the shared budget allows a call.
+
+        Returns None once budget is reserved, or the remaining wait in seconds
+        if it would exceed the priority's max wait (the caller should back off).
+        """
+        client = await self._redis()
+        if client is None:
+            return None
+
+        reserve = self.batch_reserve if priority == PRIORITY_BATCH else 0.0
+        deadline = time.monotonic() + self.max_wait.get(priority, self.max_wait[PRIORITY_INTERACTIVE])
+        while True:
+            try:
+                wait = float(await self._script(keys=[self.key], args=[time.time(), estimated_tokens, reserve]))
+            except Exception as e:
+                logger.error(f"Rate limiter unavailable, not pacing: {str(e)}")
+                return None
+
+            if wait <= 0:
+                return None
+            if time.monotonic() + wait > deadline:
+                return wait
+
+            metrics.inc("claude_rate_limit_waits_total", priority=priority)
+            logger.info(f"Rate limit budget low, {priority} call waiting {wait:.1f}s")
+            self.waiting[priority] += 1
+            metrics.set("claude_rate_limit_waiting", self.waiting[priority], priority=priority)
+            try:
+                # Jitter so waiting replicas don't all fire at the reset instant
+                await asyncio.sleep(wait + random.uniform(0, 0.5))
+            finally:
+                self.waiting[priority] -= 1
+                metrics.set("claude_rate_limit_waiting", self.waiting[priority], priority=priority)
+
+    async def observe(self, headers: Mapping[str, str]):
+        """Record the budget Anthropic reported on a response"""
+        fields = {}
+        for kind in ("requests", "tokens"):
+            limit = headers.get(f"anthropic-ratelimit-{kind}-limit")
+            remaining = headers.get(f"anthropic-ratelimit-{kind}-remaining")
+            reset = _parse_reset(headers.get(f"anthropic-ratelimit-{kind}-reset"))
+            if remaining is None or reset is None:
+                continue
+            fields[f"{kind}_remaining"] = int(remaining)
+            fields[f"{kind}_reset"] = reset
+            if limit is not None:
+                fields[f"{kind}_limit"] = int(limit)
+            metrics.set("claude_rate_limit_remaining", int(remaining), kind=kind)
+
+        if not fields:
+            return
+
+        client = await self._redis()
+        if client is None:
+            return
+        try:
+            async with client.pipeline(transaction=True) as pipe:
+                pipe.hset(self.key, mapping=fields)
+                pipe.expire(self.key, 300)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error recording rate limit headers: {str(e)}")
@@ -0,0 +1,209 @@
+import re
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Set, Tuple
+from app.models.form import Form
+from app.models.patient import Patient
+from app.models.reconciliation import ReconciledItem, ReconciledList, Reconciliation
+from services.form_diff import is_answered, iter_form_fields
+
+# Fuzzy matches must be at least this similar (difflib ratio)
+FUZZY_THRESHOLD = 0.85
+
+SECTION_PATTERNS = {
+    tag: re.compile(rf"<{tag}>(.*?)</{tag}>", re.DOTALL | re.IGNORECASE)
+    for tag in ("medications", "diagnoses", "diagnosis")
+}
+LIST_ITEM = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*(.+?)\s*$", re.MULTILINE)
+PARENTHESES = re.compile(r"\(([^)]*)\)")
+ICD10_CODE = re.compile(r"\b([A-TV-Z][0-9][0-9AB](?:\.[0-9A-TV-Z]{1,4})?)\b")
+STRENGTH = re.compile(r"\d[\d.,/-]*\s*(?:mg|mcg|g|ml|units?|iu|meq|%)?(?:/\s*(?:ml|actuation|hr))?\b", re.IGNORECASE)
+DATE = re.compile(r"\d{1,2}/\d{1,2}/\d{2,4}")
+WORD = re.compile(r"[a-z][a-z0-9-]*")
+
+# Dose forms, routes, frequencies and salts that don't identify the drug
+DRUG_NOISE = {
+    "oral", "tablet", "tablets", "tab", "capsule", "capsules", "cap", "packet", "suspension", "solution",
+    "injection", "inhaler", "patch", "cream", "ointment", "extended", "release", "er", "xr", "sr", "dr",
+    "delayed", "chewable", "mg", "mcg", "ml", "unit", "units", "daily", "bid", "tid", "qid", "prn", "twice",
+    "once", "morning", "evening", "bedtime", "held", "hold", "discontinued", "puffs", "puff", "every",
+    "hours", "day", "hydrochloride", "hcl", "besylate", "tartrate", "succinate", "mesylate", "sulfate",
+    "bisulfate", "carbonate", "with", "for", "dapt", "dual", "antiplatelet", "therapy", "inhalation",
+    "nebulization", "liquid", "external",
+}
+# Brand names and abbreviations seen in H&Ps, mapped to the generic name forms use
+DRUG_ALIASES = {
+    "asa": "aspirin", "plavix": "clopidogrel", "jardiance": "empagliflozin", "aldactone": "spironolactone",
+    "adcirca": "tadalafil", "soaanz": "torsemide", "protonix": "pantoprazole", "lipitor": "atorvastatin",
+    "coumadin": "warfarin", "cozaar": "losartan", "prilosec": "omeprazole", "lasix": "furosemide",
+    "norco": "hydrocodone", "tylenol": "acetaminophen", "eliquis": "apixaban", "xarelto": "rivaroxaban",
+    "lopressor": "metoprolol", "toprol": "metoprolol", "entresto": "sacubitril", "farxiga": "dapagliflozin",
+    "cholecalciferol": "vitamin d",
+}
+DIAGNOSIS_ALIASES = {
+    "htn": "hypertension", "cad": "coronary artery disease", "mi": "myocardial infarction",
+    "dm": "diabetes mellitus", "chf": "congestive heart failure", "hf": "heart failure",
+    "copd": "chronic obstructive pulmonary disease", "afib": "atrial fibrillation", "dvt": "deep vein thrombosis",
+    "aki": "acute kidney injury", "ckd": "chronic kidney disease", "osa": "obstructive sleep apnea",
+    "uti": "urinary tract infection", "r": "right", "l": "left", "s/p": "status post",
+}
+DIAGNOSIS_NOISE = {"with", "and", "of", "the", "due", "to", "acute", "chronic", "primary", "secondary", "status", "post"}
+
+# Form fields holding medication lists and free-text diagnoses
+MEDICATION_FIELDS = ("medications_list", "discontinued_medications_list")
+DIAGNOSIS_FIELD = re.compile(r"diag.*text|diagnos", re.IGNORECASE)
+
+
+def _section_items(xml_data: str, *tags: str) -> List[str]:
+    """List items of the first matching H&P section, skipping its heading"""
+    for tag in tags:
+        match = SECTION_PATTERNS[tag].search(xml_data or "")
+        if match:
+            return [item for item in LIST_ITEM.findall(match.group(1)) if item]
+    return []
+
+
+def drug_keys(name: str) -> Set[str]:
+    """Normalized ingredient names in a medication entry (combinations give several)"""
+    text = name.lower()
+    brands = PARENTHESES.findall(text)
+    text = PARENTHESES.sub(" ", text)
+    keys = set()
+    for part in [text] + brands:
+        part = STRENGTH.sub(" ", DATE.sub(" ", part))
+        for ingredient in re.split(r"[/+,]| and | with ", part):
+            words = [w for w in WORD.findall(ingredient) if w not in DRUG_NOISE]
+            if not words:
+                continue
+            if words[0] == "vitamin" and len(words) > 1:
+                # "Vitamin D3" -> "vitamin d"
+                keys.add(f"vitamin {words[1][0]}")
+            else:
+                keys.add(DRUG_ALIASES.get(words[0], words[0]))
+    return keys
+
+
+def diagnosis_key(text: str) -> Tuple[str, Set[str]]:
+    """Normalized diagnosis text and any ICD-10 codes in it"""
+    codes = set(ICD10_CODE.findall(text))
+    cleaned = DATE.sub(" ", ICD10_CODE.sub(" ", PARENTHESES.sub(lambda m: " " if DATE.search(m.group(1)) or ICD10_CODE.search(m.group(1)) else f" {m.group(1)} ", text)))
+    words = []
+    for word in re.findall(r"[a-z0-9/]+", cleaned.lower()):
+        expanded = DIAGNOSIS_ALIASES.get(word, word)
+        words.extend(w for w in expanded.split() if w not in DIAGNOSIS_NOISE)
+    return " ".join(words), codes
+
+
+def _similar(a: str, b: str) -> bool:
+    if not a or not b:
+        return False
+    a_words, b_words = set(a.split()), set(b.split())
+    # "lumbar spondylosis" vs "lumbar spondylosis exacerbation"
+    if a_words <= b_words or b_words <= a_words:
+        return True
+    return SequenceMatcher(None, a, b).ratio() >= FUZZY_THRESHOLD
+
+
+def reconcile(hp_items: List[Tuple[str, Set[str]]], form_items: List[Tuple[str, Set[str]]]) -> ReconciledList:
+    """
+    Match entries by shared normalized keys (hash lookups), then fuzzy-match
+    what's left. Each entry is (original text, its normalized keys).
+    """
+    index: Dict[str, List[int]] = {}
+    for i, (_, keys) in enumerate(form_items):
+        for key in keys:
+            index.setdefault(key, []).append(i)
+
+    matched: List[ReconciledItem] = []
+    used_form: Set[int] = set()
+    unmatched_hp: List[int] = []
+    for i, (text, keys) in enumerate(hp_items):
+        # A combination ("ASA/Plavix") may be charted as one form entry per ingredient
+        hits, covered = [], set()
+        for key in sorted(keys):
+            if key in covered:
+                continue
+            hit = next((j for j in index.get(key, []) if j not in used_form), None)
+            if hit is not None:
+                used_form.add(hit)
+                covered |= form_items[hit][1]
+                hits.append((key, hit))
+        if not hits:
+            unmatched_hp.append(i)
+        for key, hit in hits:
+            matched.append(ReconciledItem(key=key, hp=text, form=form_items[hit][0], match="exact"))
+
+    hp_only = []
+    for i in unmatched_hp:
+        text, keys = hp_items[i]
+        hit = next((
+            j for j, (_, form_keys) in enumerate(form_items)
+            if j not in used_form and any(_similar(a, b) for a in keys for b in form_keys)
+        ), None)
+        if hit is None:
+            hp_only.append(text)
+            continue
+        used_form.add(hit)
+        matched.append(ReconciledItem(key=sorted(keys)[0], hp=text, form=form_items[hit][0], match="fuzzy"))
+
+    form_only = [text for j, (text, _) in enumerate(form_items) if j not in used_form]
+    return ReconciledList(matched=matched, hp_only=hp_only, form_only=form_only)
+
+
+def _form_values(survey_data: Dict[str, Any], form_type: str) -> Dict[str, Any]:
+    return {field: value for _, field, value, _ in iter_form_fields(survey_data, form_type)}
+
+
+def form_medications(values: Dict[str, Any]) -> List[str]:
+    medications = []
+    for field in MEDICATION_FIELDS:
+        entries = values.get(field)
+        if not isinstance(entries, list):
+            continue
+        for entry in entries:
+            name = entry.get("Medication") if isinstance(entry, dict) else entry
+            if not name:
+                continue
+            if field == "discontinued_medications_list" or (isinstance(entry, dict) and entry.get("newDiscontinueDate")):
+                name = f"{name} (discontinued)"
+            medications.append(name)
+    return medications
+
+
+def form_diagnoses(values: Dict[str, Any]) -> List[str]:
+    diagnoses = []
+    for field, value in values.items():
+        if DIAGNOSIS_FIELD.search(field) and isinstance(value, str) and is_answered(value):
+            diagnoses.extend(part.strip() for part in re.split(r"[,;\n]", value) if part.strip())
+    return diagnoses
+
+
+def _diagnosis_item(text: str) -> Tuple[str, Set[str]]:
+    normalized, codes = diagnosis_key(text)
+    return text, ({normalized} if normalized else set()) | codes
+
+
+def reconcile_survey(form_id: int, form_type: str, survey_data: Dict[str, Any], patient_id: int,
+                     xml_data: Optional[str]) -> Reconciliation:
+    """Reconcile the H&P's medications and diagnoses with a form's"""
+    values = _form_values(survey_data, form_type)
+    medications = reconcile(
+        [(text, drug_keys(text)) for text in _section_items(xml_data, "medications")],
+        [(text, drug_keys(text)) for text in form_medications(values)]
+    )
+    diagnoses = reconcile(
+        [_diagnosis_item(text) for text in _section_items(xml_data, "diagnoses", "diagnosis")],
+        [_diagnosis_item(text) for text in form_diagnoses(values)]
+    )
+    return Reconciliation(
+        form_id=form_id,
+        patient_id=patient_id,
+        medications=medications,
+        diagnoses=diagnoses
+    )
+
+
+def reconcile_form(form: Form, patient: Patient, hp_xml: Optional[str]) -> Reconciliation:
+    """Reconcile a form with its patient's H&P (see services/hp_store.load_hp_text)"""
+    form_type = form.form_type.value if hasattr(form.form_type, "value") else form.form_type
+    return reconcile_survey(form.form_id, form_type, form.survey_data, patient.patient_id, hp_xml)
+
@@ -0,0 +1,286 @@
+import asyncio
+import heapq
+import os
+import re
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from app.models.patient import Patient, PatientSearchResult
+from app.models.question import QuestionSearchResult
+from app.core.metrics import metrics
+from services.catalog import CompiledCatalog
+from app.logger import get_logger
+
+logger = get_logger("search")
+
+# How often the patient index checks Mongo for changed patients
+REFRESH_SECONDS = float(os.getenv("SEARCH_REFRESH_SECONDS", "5"))
+
+PATIENT_PROJECTION = {"_id": 0, "patient_id": 1, "name": 1, "dob": 1, "mrn": 1, "phone": 1, "revision": 1}
+TOKEN = re.compile(r"[a-z0-9]+")
+NON_DIGIT = re.compile(r"\D")
+# MRNs are stored as 64-bit integers
+MAX_MRN = (1 << 63) - 1
+
+metrics.describe("search_requests_total", "Typeahead searches by index and source (memory or mongo fallback)")
+metrics.describe("search_index_documents", "Documents in this worker's in-memory search index")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return TOKEN.findall((text or "").lower())
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class PrefixIndex:
+    """
+    Token -> document lookups by prefix.
+
+    Every (token, document) pair is kept in one sorted list, so a prefix
+    query is two bisections and a slice, whatever the number of documents.
+    """
+
+    def __init__(self, documents: Dict[Any, Iterable[str]]):
+        pairs = sorted({(token, doc_id) for doc_id, tokens in documents.items() for token in tokens})
+        self.tokens = [token for token, _ in pairs]
+        self.ids = [doc_id for _, doc_id in pairs]
+
+    def prefix(self, prefix: str) -> Set[Any]:
+        start = bisect_left(self.tokens, prefix)
+        end = bisect_left(self.tokens, prefix + "\uffff", start)
+        return set(self.ids[start:end])
+
+    def all_prefixes(self, prefixes: List[str]) -> Set[Any]:
+        """Documents with a token starting with each of the prefixes"""
+        matches: Optional[Set[Any]] = None
+        for prefix in sorted(prefixes, key=len, reverse=True):
+            found = self.prefix(prefix)
+            matches = found if matches is None else matches & found
+            if not matches:
+                break
+        return matches or set()
+
+
+class TrigramIndex:
+    """Substring lookups: candidates share every trigram of the query, then are checked"""
+
+    def __init__(self, documents: Dict[Any, str]):
+        self.values = documents
+        self.grams: Dict[str, Set[Any]] = {}
+        for doc_id, value in documents.items():
+            for gram in trigrams(value):
+                self.grams.setdefault(gram, set()).add(doc_id)
+
+    def contains(self, text: str) -> Set[Any]:
+        if len(text) < 3:
+            return set()
+        candidates = None
+        for gram in trigrams(text):
+            found = self.grams.get(gram, set())
+            candidates = found if candidates is None else candidates & found
+            if not candidates:
+                return set()
+        return {doc_id for doc_id in candidates if text in self.values[doc_id]}
+
+
+class PatientSearchIndex:
+    """
+    In-memory typeahead over patients: name-token prefixes, MRN prefixes and
+    phone-number substrings (digits only, so formatting doesn't matter).
+    """
+
+    def __init__(self, records: Dict[int, Dict[str, Any]]):
+        self.records = records
+        self.names = PrefixIndex({pid: tokenize(r.get("name")) for pid, r in records.items()})
+        self.mrns = PrefixIndex({pid: [str(r.get("mrn", ""))] for pid, r in records.items()})
+        self.phones = TrigramIndex({pid: NON_DIGIT.sub("", r.get("phone") or "") for pid, r in records.items()})
+        # Results come back in name order without sorting each result set
+        ordered = sorted(records, key=lambda pid: ((records[pid].get("name") or "").lower(), pid))
+        self.rank = {pid: position for position, pid in enumerate(ordered)}
+
+    def revisions(self) -> Dict[int, int]:
+        return {pid: record.get("revision", 0) for pid, record in self.records.items()}
+
+    def search(self, query: str, limit: int = 20) -> List[PatientSearchResult]:
+        if re.search(r"[a-zA-Z]", query):
+            matches = self.names.all_prefixes(tokenize(query))
+        else:
+            # Only digits and separators: an MRN prefix or part of a phone number
+            digits = NON_DIGIT.sub("", query)
+            matches = (self.mrns.prefix(digits) | self.phones.contains(digits)) if digits else set()
+        best = heapq.nsmallest(limit, matches, key=self.rank.__getitem__)
+        return [PatientSearchResult(**self.records[pid]) for pid in best]
+
+
+class QuestionSearchIndex:
+    """In-memory search over the question catalog's descriptions and qids"""
+
+    def __init__(self, questions: List[Dict[str, Any]], version: Optional[str] = None):
+        self.version = version
+        self.questions = questions
+        self.index = PrefixIndex({
+            i: tokenize(q.get("description")) + tokenize(q.get("qid")) for i, q in enumerate(questions)
+        })
+
+    def search(self, query: str, visit_type: Optional[str] = None, limit: int = 20) -> List[QuestionSearchResult]:
+        matches = self.index.all_prefixes(tokenize(query))
+        if visit_type:
+            matches = {i for i in matches if self.questions[i].get("visit_type") == visit_type}
+        # Shorter descriptions are the more specific matches
+        best = heapq.nsmallest(limit, matches, key=lambda i: (len(self.questions[i]["description"]), i))
+        return [QuestionSearchResult(**self.questions[i]) for i in best]
+
+
+def _build_question_index(questions: List[Dict[str, Any]], version: Optional[str]) -> QuestionSearchIndex:
+    metrics.set("search_index_documents", len(questions), index="questions")
+    return QuestionSearchIndex(questions, version)
+
+
+# Indexes for this worker
+patient_index: Optional[PatientSearchIndex] = None
+question_index = CompiledCatalog("question search index", _build_question_index)
+_refresh_task: Optional[asyncio.Task] = None
+_refreshed_at = 0.0
+_fingerprint_seen: Optional[Tuple[int, int, Any]] = None
+
+
+async def _fingerprint(collection) -> Tuple[int, int, Any]:
+    """
+    (patient count, sum of revisions, newest _id).
+
+    Edits are only seen through `revision`, so every write that changes a
+    patient's name, MRN or phone must bump it: Beanie saves and the bulk
+    ingest do, raw updates elsewhere must too. Inserts and deletes change
+    the count, and the newest _id catches a delete followed by an insert.
+    """
+    result = await collection.aggregate([
+        {"$group": {"_id": None, "count": {"$sum": 1}, "revisions": {"$sum": "$revision"}, "newest": {"$max": "$_id"}}}
+    ]).to_list(length=1)
+    return (result[0]["count"], result[0]["revisions"], result[0]["newest"]) if result else (0, 0, None)
+
+
+async def _patients_changed(collection, index: Optional[PatientSearchIndex]) -> Tuple[List[int], Set[int]]:
+    """Patients whose revision differs from the index's, and patients deleted since"""
+    known = index.revisions() if index else {}
+    current = {}
+    async for doc in collection.find({}, {"_id": 0, "patient_id": 1, "revision": 1}):
+        current[doc["patient_id"]] = doc.get("revision", 0)
+    changed = [pid for pid, revision in current.items() if known.get(pid) != revision]
+    return changed, set(known) - set(current)
+
+
+async def refresh_patient_index():
+    """Re-read patients whose revision changed and swap in a rebuilt index"""
+    global patient_index, _refreshed_at, _fingerprint_seen
+    _refreshed_at = time.monotonic()
+    collection = Patient.get_motor_collection()
+    # One server-side aggregate per poll; the per-patient scan only runs when something changed
+    fingerprint = await _fingerprint(collection)
+    if patient_index is not None and fingerprint == _fingerprint_seen:
+        return
+    changed, removed = await _patients_changed(collection, patient_index)
+    if patient_index is not None and not changed and not removed:
+        _fingerprint_seen = fingerprint
+        return
+
+    records = dict(patient_index.records) if patient_index else {}
+    for pid in removed:
+        records.pop(pid, None)
+    for start in range(0, len(changed), 1000):
+        async for doc in collection.find({"patient_id": {"$in": changed[start:start + 1000]}}, PATIENT_PROJECTION):
+            records[doc["patient_id"]] = doc
+
+    # Building sorts every name token; keep it off the event loop
+    patient_index = await asyncio.to_thread(PatientSearchIndex, records)
+    _fingerprint_seen = fingerprint
+    metrics.set("search_index_documents", len(records), index="patients")
+    logger.info(f"Patient search index updated: {len(changed)} changed, {len(removed)} removed, {len(records)} total")
+
+
+async def _refresh_in_background():
+    try:
+        await refresh_patient_index()
+    except Exception as e:
+        logger.error(f"Patient search index refresh failed: {str(e)}")
+
+
+def _schedule_refresh():
+    """Start a background refresh if the index is missing or due a revision check"""
+    global _refresh_task
+    if _refresh_task is not None and not _refresh_task.done():
+        return
+    if patient_index is None or time.monotonic() - _refreshed_at >= REFRESH_SECONDS:
+        _refresh_task = asyncio.create_task(_refresh_in_background())
+
+
+def mrn_prefix_ranges(digits: str) -> List[Dict[str, Any]]:
+    """
+    MRN conditions matching the integers whose decimal form starts with digits:
+    one index range per possible length ("123" is 123, 1230-1239, 12300-12399, ...)
+    """
+    if digits.startswith("0"):
+        return [{"mrn": 0}] if digits == "0" else []
+    ranges = []
+    first = int(digits)
+    while first <= MAX_MRN:
+        last = first + 10 ** (len(str(first)) - len(digits))
+        ranges.append({"mrn": {"$gte": first, "$lt": last} if last <= MAX_MRN else {"$gte": first}})
+        first *= 10
+    return ranges
+
+
+async def _search_patients_in_mongo(query: str, limit: int) -> List[PatientSearchResult]:
+    """
+    Fallback while the in-memory index is being built.
+
+    Matches like the index does: names by word prefix ("chr" finds "Connie
+    Chrisman") through anchored regexes on the indexed `name_tokens`, MRNs by
+    prefix through ranges on the `mrn` index, and phone numbers by digits.
+    Results come in name order.
+    """
+    collection = Patient.get_motor_collection()
+    if re.search(r"[a-zA-Z]", query):
+        words = [{"name_tokens": {"$regex": f"^{re.escape(token)}"}} for token in tokenize(query)]
+        cursor = collection.find({"$and": words}, PATIENT_PROJECTION)
+    else:
+        digits = NON_DIGIT.sub("", query)
+        if not digits:
+            return []
+        # Match the digits however the phone number is punctuated
+        phone_pattern = r"\D*".join(digits[:18])
+        cursor = collection.find(
+            {"$or": mrn_prefix_ranges(digits) + [{"phone": {"$regex": phone_pattern}}]},
+            PATIENT_PROJECTION
+        )
+    docs = await cursor.sort("name", 1).limit(limit).to_list(length=limit)
+    return [PatientSearchResult(**doc) for doc in docs]
+
+
+async def search_patients(query: str, limit: int = 20) -> List[PatientSearchResult]:
+    """
+    Typeahead over patients, served from this worker's in-memory index.
+
+    The index is refreshed in the background (a projected scan of patient
+    revisions every SEARCH_REFRESH_SECONDS), so searches never wait on Mongo
+    once it's built; until then they match names through the `name` index.
+    """
+    _schedule_refresh()
+    if patient_index is None:
+        metrics.inc("search_requests_total", index="patients", source="mongo")
+        return await _search_patients_in_mongo(query, limit)
+    metrics.inc("search_requests_total", index="patients", source="memory")
+    return patient_index.search(query, limit)
+
+
+async def get_question_index() -> QuestionSearchIndex:
+    """The question search index, rebuilt when the questions migration version changes"""
+    return await question_index.get()
+
+
+async def search_questions(query: str, visit_type: Optional[str] = None, limit: int = 20) -> List[QuestionSearchResult]:
+    """Search question descriptions and qids by word prefix"""
+    index = await get_question_index()
+    metrics.inc("search_requests_total", index="questions", source="memory")
+    return index.search(query, visit_type, limit)
@@ -0,0 +1,341 @@
+import asyncio
+import hashlib
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from app.models.user import User
+from app.models.form import Form
+from app.models.patient import Patient, PatientRevision
+from app.models.summary import Summary
+from app.core.cache import get_cache_client
+from app.core.metrics import metrics
+from prompts.form import generate_summary_prompt, PROMPT_TEMPLATE_VERSION
+from services.claude import get_claude_service
+from services.catalog import current_catalog_version
+from services.completeness import score_form
+from services.reconciliation import reconcile_form
+from services.hp_store import load_hp_text
+from services.decoder import get_form_decoder
+from services.rate_limiter import PRIORITY_BATCH, PRIORITY_INTERACTIVE
+from app.logger import get_logger
+
+logger = get_logger("summary_service")
+
+metrics.describe("summary_cancellations_total", "Summary generations cancelled because every waiter left")
+metrics.describe("summary_orphaned_total", "Summary generations finished for the cache after every waiter left")
+metrics.describe("summary_cache_reads_total", "Summary lookups by where they were served from (redis, archive or miss)")
+
+# A generation that has run at least this long is finished for the cache even
+# if every waiter leaves: most of its cost is already spent
+FILL_CACHE_AFTER_SECONDS = float(os.getenv("SUMMARY_FILL_CACHE_AFTER_SECONDS", "15"))
+
+
+class _Flight:
+    """A generation in flight and the number of callers waiting on it"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.started = time.monotonic()
+        self.waiters = 0
+
+
+# Generations in flight on this worker, keyed by cache identity
+_inflight: Dict[str, _Flight] = {}
+
+
+def _start_flight(key: str, coro) -> _Flight:
+    flight = _Flight(asyncio.create_task(coro))
+    _inflight[key] = flight
+    flight.task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return flight
+
+
+async def _wait_for_flight(flight: _Flight, form_id: int):
+    """
+    Wait on a shared generation.
+
+    If this caller is cancelled (its client disconnected) and nobody else is
+    waiting, the generation - and with it the outbound Claude request - is
+    cancelled too, unless it has run long enough that finishing it to fill
+    the cache is the better deal.
+    """
+    flight.waiters += 1
+    try:
+        return await asyncio.shield(flight.task)
+    except asyncio.CancelledError:
+        if flight.waiters == 1 and not flight.task.done():
+            if time.monotonic() - flight.started < FILL_CACHE_AFTER_SECONDS:
+                logger.info(f"Last waiter left, cancelling summary generation for form_id={form_id}")
+                metrics.inc("summary_cancellations_total")
+                flight.task.cancel()
+            else:
+                logger.info(f"Last waiter left, finishing summary generation for form_id={form_id} for the cache")
+                metrics.inc("summary_orphaned_total")
+        raise
+    finally:
+        flight.waiters -= 1
+
+
+def _max_tokens(user: User) -> int:
+    """Quality administrators get the long QA report"""
+    return 1500 if user.user_type.value == "quality_administrator" else 800
+
+
+def summary_revision(form_revision: int, patient_revision: int, catalog_version: Optional[str]) -> str:
+    """
+    Everything a summary depends on besides the user: form, patient, prompt
+    and question catalog versions (the catalog labels answers and drives the
+    QA completeness and reconciliation sections)
+    """
+    return f"f{form_revision}.p{patient_revision}.t{PROMPT_TEMPLATE_VERSION}.c{catalog_version or 0}"
+
+
+async def get_summary_revision(form: Form) -> str:
+    """Look up the patient revision (without loading the patient) and build the revision"""
+    patient = await Patient.find_one({"patient_id": form.patient_id}).project(PatientRevision)
+    if not patient:
+        logger.error(f"Patient not found: patient_id={form.patient_id}")
+        raise HTTPException(status_code=404, detail="Patient not found")
+    return summary_revision(form.revision, patient.revision, await current_catalog_version())
+
+
+async def _get_patient(form: Form) -> Patient:
+    logger.debug(f"Fetching patient with patient_id={form.patient_id}")
+    patient = await Patient.find_one({"patient_id": form.patient_id})
+    if not patient:
+        logger.error(f"Patient not found: patient_id={form.patient_id}")
+        raise HTTPException(status_code=404, detail="Patient not found")
+
+    logger.info(f"Found patient: patient_id={patient.patient_id}, name={patient.name}")
+    return patient
+
+
+async def _generate_and_cache(form: Form, patient: Patient, user: User, revision: str,
+                              priority: str = PRIORITY_INTERACTIVE) -> dict:
+    """Build the prompt, call Claude and cache the result"""
+    # Generate the appropriate prompt based on user type
+    logger.debug(f"Generating prompt for user_type={user.user_type.value}")
+    # The QA review gets the completeness score and H&P reconciliation computed
+    # locally instead of asking Claude for them
+    completeness = None
+    reconciliation = None
+    hp_xml = None
+    if user.user_type.value == "quality_administrator":
+        try:
+            completeness = await score_form(form)
+        except Exception as e:
+            logger.error(f"Completeness scoring failed for form_id={form.form_id}, prompting without it: {str(e)}")
+        # Only this review reads the H&P, so only it pays for fetching it
+        try:
+            hp_xml = await load_hp_text(patient)
+        except Exception as e:
+            logger.error(f"H&P unavailable for patient_id={patient.patient_id}, prompting without it: {str(e)}")
+        try:
+            reconciliation = reconcile_form(form, patient, hp_xml)
+        except Exception as e:
+            logger.error(f"Reconciliation failed for form_id={form.form_id}, prompting with raw H&P sections: {str(e)}")
+    # Answers are labelled from the catalog rather than the stored descriptions
+    decoder = None
+    try:
+        decoder = await get_form_decoder()
+    except Exception as e:
+        logger.error(f"Form decoder unavailable for form_id={form.form_id}, prompting with stored descriptions: {str(e)}")
+    prompt = generate_summary_prompt(form, patient, user.user_type, completeness, reconciliation, decoder, hp_xml)
+    logger.debug(f"Generated prompt length: {len(prompt)} characters")
+
+    max_tokens = _max_tokens(user)
+    logger.info(f"Generating summary with max_tokens={max_tokens}")
+
+    started = time.monotonic()
+    completion = await get_claude_service().complete(prompt, max_tokens, priority)
+    compute_seconds = time.monotonic() - started
+    logger.info(f"Summary generated successfully in {compute_seconds:.1f}s, length: {len(completion.text)} characters")
+
+    summary_data = {
+        "summary": completion.text,
+        "user_type": user.user_type.value,
+        "form_id": form.form_id
+    }
+
+    # Archive it first: Redis entries expire, the archive is what a flush falls back to
+    if completion.model is not None:
+        try:
+            await Summary(
+                form_id=form.form_id,
+                patient_id=form.patient_id,
+                revision=revision,
+                user_type=user.user_type.value,
+                username=user.username,
+                summary=completion.text,
+                prompt_hash=hashlib.sha256(prompt.encode("utf-8")).hexdigest(),
+                model=completion.model,
+                input_tokens=completion.input_tokens,
+                output_tokens=completion.output_tokens,
+                compute_seconds=compute_seconds,
+                created_at=datetime.utcnow()
+            ).insert()
+        except Exception as e:
+            logger.error(f"Archiving summary for form_id={form.form_id} failed, cached in Redis only: {str(e)}")
+
+    # Cache the summary
+    logger.debug("Caching generated summary")
+    cache_client = await get_cache_client()
+    await cache_client.set_summary(
+        user.username,
+        form.patient_id,
+        form.form_id,
+        summary_data,
+        revision=revision,
+        compute_seconds=compute_seconds
+    )
+
+    return summary_data
+
+
+def _archived_response(archived: Summary) -> dict:
+    return {"summary": archived.summary, "user_type": archived.user_type, "form_id": archived.form_id}
+
+
+async def get_cached_summary(form: Form, user: User, revision: str) -> Optional[Tuple[dict, bool]]:
+    """
+    A summary without calling Claude: Redis, then the Mongo archive
+
+    Returns the summary and whether it is due for a background refresh, or
+    None on a miss. Archive hits are written back to Redis, so after a flush
+    each summary costs one indexed Mongo read instead of a Claude call.
+    """
+    cache_client = await get_cache_client()
+    entry = await cache_client.get_summary_entry(user.username, form.patient_id, form.form_id, revision)
+    if entry:
+        metrics.inc("summary_cache_reads_total", source="redis")
+        return entry
+
+    try:
+        archived = await Summary.find(
+            {"form_id": form.form_id, "revision": revision, "user_type": user.user_type.value}
+        ).sort("-created_at").first_or_none()
+    except Exception as e:
+        logger.error(f"Summary archive lookup failed for form_id={form.form_id}: {str(e)}")
+        archived = None
+    if archived is None:
+        metrics.inc("summary_cache_reads_total", source="miss")
+        return None
+
+    summary_data = _archived_response(archived)
+    await cache_client.set_summary(
+        user.username, form.patient_id, form.form_id, summary_data,
+        revision=revision, compute_seconds=archived.compute_seconds
+    )
+    metrics.inc("summary_cache_reads_total", source="archive")
+    logger.info(f"Served summary for form_id={form.form_id} from the archive and backfilled Redis")
+    return summary_data, False
+
+
+async def get_cached_summaries(user: User, patient_id: int, form_revisions: Dict[int, str]) -> Dict[int, dict]:
+    """Many forms' summaries: one Redis MGET, then one archive query for the misses"""
+    cache_client = await get_cache_client()
+    summaries = await cache_client.get_summaries(user.username, patient_id, form_revisions)
+    metrics.inc("summary_cache_reads_total", len(summaries), source="redis")
+    missing = {form_id: revision for form_id, revision in form_revisions.items() if form_id not in summaries}
+    if not missing:
+        return summaries
+
+    try:
+        archived: List[Summary] = await Summary.find({
+            "form_id": {"$in": list(missing)},
+            "revision": {"$in": list(set(missing.values()))},
+            "user_type": user.user_type.value
+        }).sort("-created_at").to_list()
+    except Exception as e:
+        logger.error(f"Summary archive lookup failed for patient_id={patient_id}: {str(e)}")
+        archived = []
+
+    backfills = []
+    for record in archived:
+        # Newest first, so the first match per form wins
+        if missing.get(record.form_id) == record.revision and record.form_id not in summaries:
+            summaries[record.form_id] = _archived_response(record)
+            backfills.append(cache_client.set_summary(
+                user.username, patient_id, record.form_id, summaries[record.form_id],
+                revision=record.revision, compute_seconds=record.compute_seconds
+            ))
+    if backfills:
+        await asyncio.gather(*backfills)
+    metrics.inc("summary_cache_reads_total", len(backfills), source="archive")
+    metrics.inc("summary_cache_reads_total", len(missing) - len(backfills), source="miss")
+    return summaries
+
+
+async def _generate_once(form: Form, patient: Patient, user: User, revision: str) -> dict:
+    """Generate under the cluster-wide refresh lock, or reuse another worker's result"""
+    cache_client = await get_cache_client()
+    cache_args = (user.username, form.patient_id, form.form_id, revision)
+    token = await cache_client.acquire_refresh_lock(*cache_args)
+    if token is None:
+        logger.info(f"Summary for form_id={form.form_id} is being generated elsewhere, waiting")
+        if await cache_client.wait_for_refresh(*cache_args):
+            cached = await get_cached_summary(form, user, cache_args[3])
+            if cached:
+                return cached[0]
+        # The other worker failed or timed out - generate it ourselves, taking
+        # the lock if it's free; a lock still held elsewhere is left alone
+        token = await cache_client.acquire_refresh_lock(*cache_args)
+
+    try:
+        return await _generate_and_cache(form, patient, user, revision)
+    finally:
+        await cache_client.release_refresh_lock(*cache_args, token=token)
+
+
+async def generate_form_summary(form: Form, user: User) -> dict:
+    """
+    Generate and cache a summary for a form.
+
+    Concurrent requests for the same summary share one Claude call: callers on
+    this worker join the in-flight task, and other workers wait on the Redis
+    refresh lock and pick up the cached result. Cancelling the caller only
+    cancels the call when no one else is waiting on it.
+    """
+    patient = await _get_patient(form)
+    revision = summary_revision(form.revision, patient.revision, await current_catalog_version())
+    key = f"{user.username}:{form.form_id}:{revision}"
+    flight = _inflight.get(key)
+    if flight is None:
+        flight = _start_flight(key, _generate_once(form, patient, user, revision))
+    else:
+        logger.info(f"Joining in-flight summary generation for form_id={form.form_id}")
+
+    return await _wait_for_flight(flight, form.form_id)
+
+
+async def refresh_form_summary(form: Form, user: User):
+    """Background refresh of a stale summary; at most one refresh runs per key"""
+    try:
+        patient = await _get_patient(form)
+        revision = summary_revision(form.revision, patient.revision, await current_catalog_version())
+    except Exception as e:
+        logger.error(f"Background summary refresh failed for form_id={form.form_id}: {str(e)}")
+        return
+
+    key = f"{user.username}:{form.form_id}:{revision}"
+    if key in _inflight:
+        return
+
+    cache_client = await get_cache_client()
+    cache_args = (user.username, form.patient_id, form.form_id, revision)
+    token = await cache_client.acquire_refresh_lock(*cache_args)
+    if token is None:
+        logger.debug(f"Refresh for form_id={form.form_id} already running elsewhere")
+        return
+
+    logger.info(f"Refreshing stale summary for form_id={form.form_id}, user={user.username}")
+    try:
+        # Nobody is waiting on a refresh, so it yields rate-limit budget to interactive calls
+        flight = _start_flight(key, _generate_and_cache(form, patient, user, revision, PRIORITY_BATCH))
+        await _wait_for_flight(flight, form.form_id)
+    except Exception as e:
+        logger.error(f"Background summary refresh failed for form_id={form.form_id}: {str(e)}")
+    finally:
+        await cache_client.release_refresh_lock(*cache_args, token=token)
@@ -0,0 +1,307 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from app.models.user import User
+from app.models.form import Form
+from app.models.summary import SummaryJobResponse, SummaryJobStatus
+from app.core.admission import AdmissionRejected, get_summary_admission
+from app.core.cache import get_cache_client
+from app.core.metrics import metrics
+from services.summary import generate_form_summary, get_summary_revision
+from app.logger import get_logger
+
+logger = get_logger("summary_jobs")
+
+TERMINAL_STATUSES = {SummaryJobStatus.SUCCEEDED.value, SummaryJobStatus.FAILED.value}
+
+metrics.describe("summary_jobs_total", "Summary jobs by final status")
+metrics.describe("summary_jobs_queued", "Summary jobs waiting for an executor slot on this worker")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def job_response(job: dict) -> SummaryJobResponse:
+    """API view of a job record"""
+    return SummaryJobResponse(
+        job_id=job["job_id"],
+        form_id=job["form_id"],
+        status=job["status"],
+        status_url=f"/summary-jobs/{job['job_id']}",
+        result=job.get("result"),
+        error=job.get("error"),
+        created_at=job["created_at"],
+        updated_at=job.get("updated_at") or job["created_at"]
+    )
+
+
+class SummaryJobManager:
+    """
+    Runs summary generations as background jobs that clients poll.
+
+    Job records live in Redis (in memory on this worker if Redis is down) so
+    any worker can answer a poll. The work itself runs on this worker's
+    executor - a bounded queue drained by a fixed number of tasks - and is not
+    tied to the HTTP request, so a dropped connection doesn't waste the call.
+    Submitting the same summary again while its job is live returns that job
+    instead of starting another one. Each user may have at most
+    `per_user_limit` jobs queued or running on a worker, and jobs generate
+    within the same admission limits as synchronous summarize requests.
+    """
+
+    def __init__(self):
+        self.workers = int(os.getenv("SUMMARY_JOB_WORKERS", "4"))
+        self.queue_limit = int(os.getenv("SUMMARY_JOB_QUEUE_SIZE", "100"))
+        # Jobs one user may have queued or running on this worker
+        self.per_user_limit = int(os.getenv("SUMMARY_JOB_MAX_PER_USER", "10"))
+        # How long finished job records are kept for polling
+        self.ttl_seconds = int(os.getenv("SUMMARY_JOB_TTL_SECONDS", "3600"))
+        # How long a resubmission is folded into an existing job
+        self.dedupe_seconds = int(os.getenv("SUMMARY_JOB_DEDUPE_SECONDS", "300"))
+        # Longest a long-poll request may hold the connection
+        self.max_wait = float(os.getenv("SUMMARY_JOB_MAX_WAIT_SECONDS", "25"))
+
+        self.queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._local: Dict[str, dict] = {}
+        self._done_events: Dict[str, asyncio.Event] = {}
+        self._per_user: Dict[str, int] = {}
+
+    def _job_key(self, job_id: str) -> str:
+        return f"summary-job:{job_id}"
+
+    def _dedupe_key(self, username: str, form_id: int, revision: str) -> str:
+        return f"summary-job-key:{username}:{form_id}:{revision}"
+
+    def _start(self):
+        """Start the executor on first use, inside the running event loop"""
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=self.queue_limit)
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+            logger.info(f"Summary job executor started with {self.workers} workers")
+
+    async def close(self, drain_timeout: float = 0):
+        """
+        Stop the executor, first giving queued and running jobs up to
+        `drain_timeout` seconds to finish; jobs cut off are left for their
+        records to expire
+        """
+        if self.queue is not None and drain_timeout > 0:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"{self.queue.qsize()} summary job(s) still queued at shutdown, abandoning")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.queue = None
+
+    async def _save(self, job: dict):
+        job["updated_at"] = _now()
+        cache_client = await get_cache_client()
+        if cache_client.client is not None:
+            try:
+                await cache_client.client.setex(self._job_key(job["job_id"]), self.ttl_seconds, json.dumps(job))
+                self._local.pop(job["job_id"], None)
+                return
+            except Exception as e:
+                logger.error(f"Error saving summary job {job['job_id']}: {str(e)}")
+        self._local[job["job_id"]] = job
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        """Load a job record"""
+        if job_id in self._local:
+            return self._local[job_id]
+        cache_client = await get_cache_client()
+        if cache_client.client is None:
+            return None
+        try:
+            raw = await cache_client.client.get(self._job_key(job_id))
+        except Exception as e:
+            logger.error(f"Error loading summary job {job_id}: {str(e)}")
+            return None
+        return json.loads(raw) if raw else None
+
+    async def _discard(self, job_id: str):
+        """Drop a job record that was never queued"""
+        if self._local.pop(job_id, None) is not None:
+            return
+        cache_client = await get_cache_client()
+        if cache_client.client is None:
+            return
+        try:
+            await cache_client.client.delete(self._job_key(job_id))
+        except Exception as e:
+            logger.error(f"Error discarding summary job {job_id}: {str(e)}")
+
+    async def _reject(self, dedupe_key: str, job_id: str, reason: str, error: AdmissionRejected):
+        """Undo a submission that can't be queued"""
+        await self._release(dedupe_key, job_id)
+        await self._discard(job_id)
+        metrics.inc("admission_rejected_total", endpoint="summary_jobs", reason=reason)
+        raise error
+
+    async def _claim(self, dedupe_key: str, job_id: str) -> Optional[str]:
+        """Register job_id for the summary, or return the live job already registered"""
+        cache_client = await get_cache_client()
+        if cache_client.client is None:
+            return None
+        try:
+            if await cache_client.client.set(dedupe_key, job_id, nx=True, ex=self.dedupe_seconds):
+                return None
+            existing = await cache_client.client.get(dedupe_key)
+        except Exception as e:
+            logger.error(f"Error deduplicating summary job: {str(e)}")
+            return None
+        return existing.decode() if isinstance(existing, bytes) else existing
+
+    async def submit(self, form: Form, user: User) -> dict:
+        """Queue a summary job for the form, or return the equivalent live job"""
+        self._start()
+        revision = await get_summary_revision(form)
+        dedupe_key = self._dedupe_key(user.username, form.form_id, revision)
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "form_id": form.form_id,
+            "username": user.username,
+            "status": SummaryJobStatus.PENDING.value,
+            "result": None,
+            "error": None,
+            "created_at": _now(),
+        }
+        # Saved before the dedupe key points at it, so a concurrent resubmit
+        # that finds the key always finds the job too
+        await self._save(job)
+
+        existing_id = await self._claim(dedupe_key, job_id)
+        if existing_id:
+            existing = await self.get(existing_id)
+            if existing and existing["status"] != SummaryJobStatus.FAILED.value:
+                await self._discard(job_id)
+                logger.info(f"Reusing summary job {existing_id} for form_id={form.form_id}")
+                return existing
+            # The earlier job failed or expired - take over the key
+            cache_client = await get_cache_client()
+            try:
+                await cache_client.client.set(dedupe_key, job_id, ex=self.dedupe_seconds)
+            except Exception as e:
+                logger.error(f"Error deduplicating summary job: {str(e)}")
+
+        if self.queue.full():
+            await self._reject(dedupe_key, job_id, "queue_full", AdmissionRejected("job_queue_full", 10))
+        if self._per_user.get(user.username, 0) >= self.per_user_limit:
+            await self._reject(dedupe_key, job_id, "per_user", AdmissionRejected("per_user", 5))
+
+        self._per_user[user.username] = self._per_user.get(user.username, 0) + 1
+        self._done_events[job_id] = asyncio.Event()
+        self.queue.put_nowait((job, form, user, dedupe_key))
+        metrics.set("summary_jobs_queued", self.queue.qsize())
+        logger.info(f"Queued summary job {job_id} for form_id={form.form_id}, user={user.username}")
+        return job
+
+    async def _release(self, dedupe_key: str, job_id: str):
+        """Drop the dedupe key if it still points at job_id"""
+        cache_client = await get_cache_client()
+        if cache_client.client is None:
+            return
+        try:
+            current = await cache_client.client.get(dedupe_key)
+            if current in (job_id, job_id.encode()):
+                await cache_client.client.delete(dedupe_key)
+        except Exception as e:
+            logger.error(f"Error releasing summary job key: {str(e)}")
+
+    async def _worker(self):
+        while True:
+            job, form, user, dedupe_key = await self.queue.get()
+            metrics.set("summary_jobs_queued", self.queue.qsize())
+            try:
+                await self._run(job, form, user, dedupe_key)
+            except Exception as e:
+                logger.error(f"Summary job worker error: {str(e)}", exc_info=True)
+            finally:
+                self._per_user[user.username] -= 1
+                if not self._per_user[user.username]:
+                    del self._per_user[user.username]
+                self.queue.task_done()
+
+    async def _generate(self, form: Form, user: User) -> dict:
+        """
+        Generate within the summarize admission limits (per user, per worker
+        and cluster-wide), waiting out rejections rather than failing the job
+        """
+        while True:
+            try:
+                async with get_summary_admission().admit(user.username):
+                    return await generate_form_summary(form, user)
+            except AdmissionRejected as e:
+                await asyncio.sleep(max(1, e.retry_after))
+
+    async def _run(self, job: dict, form: Form, user: User, dedupe_key: str):
+        job["status"] = SummaryJobStatus.RUNNING.value
+        await self._save(job)
+        try:
+            job["result"] = await self._generate(form, user)
+            job["status"] = SummaryJobStatus.SUCCEEDED.value
+        except Exception as e:
+            logger.error(f"Summary job {job['job_id']} failed: {str(e)}")
+            job["status"] = SummaryJobStatus.FAILED.value
+            job["error"] = getattr(e, "detail", None) or str(e)
+            # Let the client resubmit straight away
+            await self._release(dedupe_key, job["job_id"])
+        metrics.inc("summary_jobs_total", status=job["status"])
+        await self._save(job)
+
+        event = self._done_events.pop(job["job_id"], None)
+        if event:
+            event.set()
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[dict]:
+        """
+        Long-poll: return the job once it finishes or `timeout` seconds pass.
+
+        Jobs running on this worker wake the caller immediately; jobs on other
+        workers are re-read from Redis every half second.
+        """
+        deadline = time.monotonic() + min(max(timeout, 0.0), self.max_wait)
+        while True:
+            job = await self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in TERMINAL_STATUSES or remaining <= 0:
+                return job
+
+            event = self._done_events.get(job_id)
+            if event is not None:
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(min(0.5, remaining))
+
+
+# Global instance
+summary_jobs = None
+
+
+def get_summary_jobs() -> SummaryJobManager:
+    """Get or create the summary job manager"""
+    global summary_jobs
+    if summary_jobs is None:
+        summary_jobs = SummaryJobManager()
+    return summary_jobs
+
+
+async def close_summary_jobs():
+    """Stop the summary job executor after draining it"""
+    global summary_jobs
+    if summary_jobs:
+        await summary_jobs.close(float(os.getenv("SUMMARY_JOB_DRAIN_SECONDS", "20")))
+        summary_jobs = None
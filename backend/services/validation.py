@@ -0,0 +1,181 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple, Union
+from app.models.form import FormType, FormValidationIssue, FormValidationResult
+from services.catalog import VALUE_TYPES, CompiledCatalog, load_schema_file, option_choices, options_by_field
+
+NUMBER = re.compile(r"^\s*-?\d+(\.\d+)?\s*$")
+DATE = re.compile(r"^(\d{1,2}/\d{1,2}/\d{4}|\d{4}-\d{2}-\d{2}(T[\d:.]+)?)$")
+
+
+class FieldRule:
+    """
+    What a field may hold.
+
+    `kind` is "choice" (a field shared by several options, holding one of
+    `choices`), "flag" (a field of its own for one option: True/False, or
+    free text for that option) or one of VALUE_TYPES. `requires` is the
+    (field, option, shared) a subitem hangs off, when that option is recorded
+    in a field; answering the subitem without it is an orphan.
+    """
+
+    __slots__ = ("qid", "kind", "choices", "requires")
+
+    def __init__(self, qid: str, kind: str, choices: Optional[frozenset] = None,
+                 requires: Optional[Tuple[str, str, bool]] = None):
+        self.qid = qid
+        self.kind = kind
+        self.choices = choices
+        self.requires = requires
+
+    def check(self, value: Any) -> Optional[Tuple[str, str]]:
+        """(code, message) if an answered value is not allowed"""
+        kind = self.kind
+        cls = value.__class__
+        if kind == "choice":
+            if cls is str and value in self.choices:
+                return None
+            return "invalid_option", f"{value!r} is not an option of {self.qid}"
+        if kind == "flag":
+            if cls is bool or cls is str:
+                return None
+            return "invalid_type", f"expected true/false or text for {self.qid}, got {cls.__name__}"
+        if kind == "number":
+            if (cls is int or cls is float) or (cls is str and NUMBER.match(value)):
+                return None
+            return "invalid_type", f"expected a number for {self.qid}, got {value!r}"
+        if kind == "date":
+            if cls is str and DATE.match(value):
+                return None
+            return "invalid_type", f"expected a date (MM/DD/YYYY) for {self.qid}, got {value!r}"
+        # text
+        if cls is str or cls is int or cls is float:
+            return None
+        return "invalid_type", f"expected text for {self.qid}, got {cls.__name__}"
+
+
+# A table entry: one rule, or several when a field code is reused within a visit type
+Rules = Union[FieldRule, List[FieldRule]]
+
+
+class FormValidator:
+    """
+    Validates form answers against the question catalog.
+
+    Compiled once into a field -> rule table per visit type, so checking a
+    form is one pass over its fields with a dictionary lookup each, plus a
+    second pass over answered subitems to check the answer they depend on
+    was given. Every problem is collected rather than stopping at the first.
+
+    Values a field can't hold are errors. Unknown fields and orphaned
+    subitems are warnings unless `strict`: real forms carry fields with no
+    catalog question (OASIS dates, medication lists) and keep follow-up
+    answers after the answer they hang off changes.
+    """
+
+    def __init__(self, version: Optional[str] = None):
+        self.version = version
+        self.tables: Dict[Optional[str], Dict[str, Rules]] = {}
+
+    @classmethod
+    def compile(cls, questions: List[Dict[str, Any]], version: Optional[str] = None) -> "FormValidator":
+        validator = cls(version)
+        for question in questions:
+            validator._add(question, validator.tables.setdefault(question.get("visit_type"), {}), None)
+        return validator
+
+    @classmethod
+    def from_schema_file(cls, path: str) -> "FormValidator":
+        """Compile straight from assets/question_schema.json (no database needed)"""
+        return cls.compile(load_schema_file(path))
+
+    def _add(self, definition: Dict[str, Any], table: Dict[str, Rules], requires: Optional[Tuple[str, str, bool]]):
+        casting = definition.get("casting") or {}
+        grouped = options_by_field(casting)
+        for field, options in grouped.items():
+            if len(options) > 1:
+                rule = FieldRule(definition["qid"], "choice", frozenset(option_choices(options)), requires)
+            else:
+                rule = FieldRule(definition["qid"], options[0] if options[0] in VALUE_TYPES else "flag", None, requires)
+            existing = table.get(field)
+            if existing is None:
+                table[field] = rule
+            elif isinstance(existing, list):
+                existing.append(rule)
+            else:
+                table[field] = [existing, rule]
+
+        for option, subitems in (definition.get("subitems") or {}).items():
+            field = casting.get(option)
+            # Options without a field of their own can't be checked; their subitems are the answer
+            condition = (field, option, len(grouped.get(field, ())) > 1) if field else None
+            for sub in subitems:
+                self._add(sub, table, condition)
+
+    def validate(self, survey_data: Dict[str, Any], strict: bool = False) -> FormValidationResult:
+        """Check every field of every section; stored {"value": ...} wrappers are accepted"""
+        errors: List[FormValidationIssue] = []
+        warnings: List[FormValidationIssue] = errors if strict else []
+
+        for section, categories in survey_data.items():
+            if section not in FormType.__members__:
+                errors.append(FormValidationIssue(path=section, code="unknown_form_type",
+                                                  message=f"unknown form type section {section!r}"))
+                continue
+            if not isinstance(categories, dict):
+                errors.append(FormValidationIssue(path=section, code="invalid_type",
+                                                  message=f"{section} must map categories to fields"))
+                continue
+            table = self.tables.get(section, {})
+            values: Dict[str, Any] = {}
+            dependent: List[Tuple[str, FieldRule]] = []
+
+            for category, fields in categories.items():
+                if fields.__class__ is not dict:
+                    errors.append(FormValidationIssue(path=f"{section}.{category}", code="invalid_type",
+                                                      message=f"category {category!r} must be an object of fields"))
+                    continue
+                for field, value in fields.items():
+                    if value.__class__ is dict and "value" in value:
+                        value = value["value"]
+                    values[field] = value
+                    rules = table.get(field)
+                    if rules is None:
+                        warnings.append(FormValidationIssue(path=f"{section}.{category}.{field}", code="unknown_field",
+                                                            message=f"{field} is not in the {section} question catalog"))
+                        continue
+                    if value is None or value == "" or value is False:
+                        continue
+                    if rules.__class__ is list:
+                        # A reused code is valid if any question using it accepts the value
+                        problems = [rule.check(value) for rule in rules]
+                        problem = None if None in problems else problems[0]
+                        rule = next((r for r, p in zip(rules, problems) if p is None), rules[0])
+                    else:
+                        rule = rules
+                        problem = rule.check(value)
+                    if problem:
+                        errors.append(FormValidationIssue(path=f"{section}.{category}.{field}",
+                                                          code=problem[0], message=problem[1]))
+                    elif rule.requires is not None:
+                        dependent.append((f"{section}.{category}.{field}", rule))
+
+            for path, rule in dependent:
+                parent_field, option, shared = rule.requires
+                parent = values.get(parent_field)
+                selected = parent == option if shared else (parent is not None and parent != "" and parent is not False)
+                if not selected:
+                    warnings.append(FormValidationIssue(
+                        path=path, code="orphan_subitem",
+                        message=f"{rule.qid} is answered but {parent_field} is not {option!r}"
+                    ))
+
+        return FormValidationResult(valid=not errors, errors=errors, warnings=[] if strict else warnings)
+
+
+# Compiled validators for this worker
+form_validator = CompiledCatalog("form validators", FormValidator.compile)
+
+
+async def get_form_validator() -> FormValidator:
+    """The compiled validators, recompiled when the questions migration version changes"""
+    return await form_validator.get()
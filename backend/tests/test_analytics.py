@@ -0,0 +1,56 @@
+from datetime import date, datetime
+from services.analytics import AnswerStore, AnswerStoreBuilder
+
+
+def _doc(form_id, patient_id, form_type, day, revision, answers):
+    return {
+        "form_id": form_id, "patient_id": patient_id, "form_type": form_type,
+        "form_date": datetime(2025, 1, day), "revision": revision,
+        "survey_data": {form_type: {"Assessment": {
+            qid: {"value": value, "question_description": qid} for qid, value in answers.items()
+        }}}
+    }
+
+
+def _build(base, docs, drop=()):
+    builder = AnswerStoreBuilder(base, {doc["form_id"] for doc in docs} | set(drop))
+    for doc in docs:
+        builder.add_form(doc)
+    return builder.build()
+
+
+def test_aggregates_over_saved_snapshot(tmp_path):
+    """Completion, distribution and trend read back from a memory-mapped snapshot"""
+    store = _build(AnswerStore.empty(), [
+        _doc(1, 10, "SOC", 1, 1, {"M1800": "1", "pain": 4}),
+        _doc(2, 10, "RN", 5, 1, {"M1800": "", "pain": 2}),
+        _doc(3, 11, "SOC", 3, 1, {"M1800": "1", "pain": None}),
+    ])
+    store.save(str(tmp_path))
+    store = AnswerStore.load(str(tmp_path))
+
+    completion = {row["qid"]: row for row in store.completion(form_type="SOC")}
+    assert completion["M1800"]["completion_rate"] == 1.0
+    assert completion["pain"]["answered"] == 1 and completion["pain"]["total"] == 2
+    assert store.completion()[0]["completion_rate"] < 1.0
+
+    assert store.distribution("M1800") == {"SOC": [{"value": "1", "count": 2}]}
+
+    trend = store.trend(10, "pain")
+    assert [(p["form_id"], p["numeric"]) for p in trend] == [(1, 4.0), (2, 2.0)]
+    assert trend[0]["form_date"] == date(2025, 1, 1)
+
+
+def test_incremental_update_replaces_changed_forms(tmp_path):
+    """Re-reading a changed form replaces its rows; dropped forms disappear"""
+    store = _build(AnswerStore.empty(), [
+        _doc(1, 10, "SOC", 1, 1, {"M1800": ""}),
+        _doc(2, 10, "RN", 2, 1, {"M1800": "2"}),
+        _doc(3, 12, "DC", 3, 1, {"M1800": "3"}),
+    ])
+    store.save(str(tmp_path))
+
+    updated = _build(AnswerStore.load(str(tmp_path)), [_doc(1, 10, "SOC", 1, 2, {"M1800": "1"})], drop={3})
+    assert updated.revisions() == {2: 1, 1: 2}
+    assert len(updated) == 2
+    assert [p["value"] for p in updated.trend(10, "M1800")] == ["1", "2"]
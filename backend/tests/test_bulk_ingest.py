@@ -0,0 +1,145 @@
+import asyncio
+import json
+import os
+import sys
+from types import SimpleNamespace
+from pymongo.errors import BulkWriteError
+
+# /app/scripts in the container, the repo root's scripts/ in a checkout
+SCRIPTS = next(
+    path for path in (
+        os.path.join(os.path.dirname(__file__), "..", "scripts"),
+        os.path.join(os.path.dirname(__file__), "..", "..", "scripts"),
+    ) if os.path.isdir(path)
+)
+sys.path.insert(0, os.path.abspath(SCRIPTS))
+
+import ingest_forms  # noqa: E402
+from bulk_ingest import BulkWriter, Progress  # noqa: E402
+
+
+def evaluate(expression, document):
+    """The aggregation expressions revision_upsert uses"""
+    if isinstance(expression, str):
+        return document.get(expression[1:]) if expression.startswith("$") else expression
+    if not isinstance(expression, dict):
+        return expression
+    (operator, args), = expression.items()
+    if operator == "$literal":
+        return args
+    values = [evaluate(arg, document) for arg in args]
+    if operator == "$ifNull":
+        return values[0] if values[0] is not None else values[1]
+    if operator == "$eq":
+        return values[0] == values[1]
+    if operator == "$cond":
+        return values[1] if values[0] else values[2]
+    if operator == "$add":
+        return sum(values)
+    raise NotImplementedError(operator)
+
+
+class FakeForms:
+    """Applies pipeline upserts the way Mongo does"""
+
+    def __init__(self):
+        self.documents = []
+
+    async def bulk_write(self, operations, ordered=True):
+        upserted = modified = 0
+        for operation in operations:
+            query = operation._filter
+            current = next((d for d in self.documents if all(d.get(k) == v for k, v in query.items())), None)
+            document = dict(current) if current is not None else dict(query)
+            for stage in operation._doc:
+                if "$set" in stage:
+                    document.update({key: evaluate(value, document) for key, value in stage["$set"].items()})
+                else:
+                    for key in stage["$unset"]:
+                        document.pop(key, None)
+            if current is None:
+                self.documents.append(document)
+                upserted += 1
+            elif document != current:
+                current.clear()
+                current.update(document)
+                modified += 1
+        return SimpleNamespace(upserted_count=upserted, modified_count=modified)
+
+
+class FakeClient:
+    def __init__(self, forms):
+        self.db = SimpleNamespace(forms=forms)
+
+    def __getitem__(self, name):
+        return self.db
+
+    def close(self):
+        pass
+
+
+def test_reingesting_unchanged_files_keeps_revisions(tmp_path, monkeypatch):
+    forms = FakeForms()
+    monkeypatch.setattr(ingest_forms, "AsyncIOMotorClient", lambda url: FakeClient(forms))
+
+    async def load_questions_cache_async(db):
+        return {"cVS_pulse": "Pulse"}
+
+    monkeypatch.setattr(ingest_forms, "load_questions_cache_async", load_questions_cache_async)
+    path = tmp_path / "visit.json"
+
+    def ingest(pulse):
+        path.write_text(json.dumps({"patient_id": 1, "form_date": "2025-06-03",
+                                    "survey_data": {"SOC": {"Vitals": {"cVS_pulse": pulse, "note": "$5 copay"}}}}))
+        return asyncio.run(ingest_forms.ingest_forms([str(tmp_path)], {}, None, 10, 1, validate=False))
+
+    first = ingest(72)
+    assert (first.upserted, len(forms.documents)) == (1, 1)
+    form = forms.documents[0]
+    assert form["revision"] == 1 and form["content_hash"]
+    assert form["survey_data"]["SOC"]["Vitals"]["note"] == {"value": "$5 copay", "question_description": None}
+
+    again = ingest(72)
+    assert (again.upserted, again.modified) == (0, 0)
+    assert form["revision"] == 1
+
+    changed = ingest(80)
+    assert changed.modified == 1
+    assert form["revision"] == 2
+    assert form["survey_data"]["SOC"]["Vitals"]["cVS_pulse"]["value"] == 80
+
+
+def test_same_named_files_in_different_directories_get_their_own_forms(tmp_path, monkeypatch):
+    forms = FakeForms()
+    monkeypatch.setattr(ingest_forms, "AsyncIOMotorClient", lambda url: FakeClient(forms))
+
+    async def load_questions_cache_async(db):
+        return {}
+
+    monkeypatch.setattr(ingest_forms, "load_questions_cache_async", load_questions_cache_async)
+    for visit in ("2025-06", "2025-07"):
+        (tmp_path / visit).mkdir()
+        (tmp_path / visit / "visit.json").write_text(json.dumps(
+            {"patient_id": 1, "form_date": f"{visit}-03", "survey_data": {"SOC": {"Vitals": {"cVS_pulse": 72}}}}
+        ))
+
+    asyncio.run(ingest_forms.ingest_forms([str(tmp_path)], {}, None, 10, 1, validate=False))
+    asyncio.run(ingest_forms.ingest_forms([str(tmp_path / "*" / "visit.json")], {}, None, 10, 1, validate=False))
+    assert len(forms.documents) == 2
+    assert all(form["revision"] == 1 for form in forms.documents)
+
+
+def test_write_errors_from_different_batches_are_all_kept():
+    class FailingCollection:
+        async def bulk_write(self, batch, ordered=True):
+            raise BulkWriteError({"writeErrors": [{"index": 0, "errmsg": f"duplicate {batch[0]}"}]})
+
+    async def scenario():
+        progress = Progress("forms")
+        writer = BulkWriter(FailingCollection(), progress, batch_size=2, writers=2)
+        for operation in range(4):
+            await writer.add(operation)
+        await writer.close()
+        return progress.errors
+
+    assert asyncio.run(scenario()) == {"batch 1 op 0": "duplicate 0", "batch 2 op 0": "duplicate 2"}
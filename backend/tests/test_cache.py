@@ -0,0 +1,92 @@
+import asyncio
+import time
+from app.core.cache import RedisCache
+from app.core.codecs import CacheSerializer, MAGIC
+
+
+def test_fresh_entry_is_not_refreshed():
+    """A summary well inside its soft TTL is served without a refresh"""
+    cache = RedisCache()
+    entry = {"created_at": time.time(), "soft_ttl": 3600, "compute_seconds": 5.0}
+    assert not cache._should_refresh(entry)
+
+
+def test_expired_entry_is_refreshed():
+    """A summary past its soft TTL always triggers a refresh"""
+    cache = RedisCache()
+    entry = {"created_at": time.time() - 7200, "soft_ttl": 3600, "compute_seconds": 5.0}
+    assert cache._should_refresh(entry)
+
+
+def test_jittered_ttl_stays_within_bounds():
+    """TTL jitter never drifts outside the configured fraction"""
+    cache = RedisCache()
+    cache.ttl_jitter = 0.1
+    for _ in range(100):
+        assert 54 * 60 <= cache._jittered_seconds(60) <= 66 * 60
+
+
+def test_serializer_round_trips_and_reads_plain_json():
+    """Large values are compressed, small ones stay JSON, and both decode"""
+    serializer = CacheSerializer("msgpack+zstd", min_bytes=100)
+    large = {"summary": "# Report\n" + "lorem ipsum " * 500, "form_id": 1}
+    small = {"summary": "ok", "form_id": 2}
+
+    encoded = serializer.encode(large)
+    assert encoded.startswith(MAGIC)
+    assert len(encoded) < len(large["summary"]) / 3
+    assert serializer.decode(encoded) == large
+    assert serializer.decode(serializer.encode(small)) == small
+    assert serializer.decode(b'{"summary": "legacy", "form_id": 3}')["summary"] == "legacy"
+
+
+def test_serializer_packs_large_values_once(monkeypatch):
+    large = {"summary": "lorem ipsum " * 500, "form_id": 1}
+    for name in ("msgpack+zstd", "json+zlib"):
+        serializer = CacheSerializer(name, min_bytes=100)
+        codec = serializer.codec
+        packs = []
+        pack = codec.pack
+        monkeypatch.setattr(codec, "pack", lambda value: packs.append(value) or pack(value))
+
+        assert serializer.decode(serializer.encode(large)) == large
+        assert len(packs) == 1, name
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def register_script(self, source):
+        async def release(keys, args):
+            if self.data.get(keys[0]) == args[0]:
+                del self.data[keys[0]]
+                return 1
+            return 0
+        return release
+
+
+def test_refresh_lock_is_only_released_by_its_holder():
+    """A worker whose lock expired can't release the lock another worker took since"""
+    cache = RedisCache()
+    cache.client = FakeRedis()
+    args = ("bob", 3, 1, "f1.p1.t4")
+
+    async def scenario():
+        first = await cache.acquire_refresh_lock(*args)
+        assert first and await cache.acquire_refresh_lock(*args) is None
+        cache.client.data.clear()  # first's lock expires
+        second = await cache.acquire_refresh_lock(*args)
+        await cache.release_refresh_lock(*args, token=first)
+        held = await cache.acquire_refresh_lock(*args)
+        await cache.release_refresh_lock(*args, token=second)
+        return held, await cache.acquire_refresh_lock(*args)
+
+    held, after = asyncio.run(scenario())
+    assert held is None and after
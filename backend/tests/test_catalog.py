@@ -0,0 +1,48 @@
+import asyncio
+from services import catalog
+from services.catalog import CompiledCatalog, option_choices, options_by_field
+
+
+class FakeQuestions:
+    def __init__(self):
+        self.reads = 0
+
+    def find(self, query, projection):
+        self.reads += 1
+        return self
+
+    async def to_list(self, length=None):
+        return [{"qid": "q1", "description": "Pain", "casting": {"Yes": "pain_yes", "No": None}}]
+
+
+def test_options_are_grouped_by_field_with_bare_q_codes():
+    casting = {"(Q5001) Home": "selectedQCode", "(Q5002) Facility": "selectedQCode", "Other": "other", "None": None}
+    assert options_by_field(casting) == {"selectedQCode": ["(Q5001) Home", "(Q5002) Facility"], "other": ["Other"]}
+    assert option_choices(["(Q5001) Home", "Other"]) == {"(Q5001) Home": "(Q5001) Home", "Q5001": "(Q5001) Home",
+                                                        "Other": "Other"}
+
+
+def test_engines_share_one_read_and_recompile_on_new_versions(monkeypatch):
+    questions = FakeQuestions()
+    version = {"value": "v1"}
+
+    async def catalog_version():
+        return version["value"]
+
+    monkeypatch.setattr(catalog, "catalog_version", catalog_version)
+    monkeypatch.setattr(catalog.Question, "get_motor_collection", classmethod(lambda cls: questions))
+    monkeypatch.setattr(catalog, "_questions", None)
+    monkeypatch.setattr(catalog, "CHECK_SECONDS", 0)
+    compiled = []
+    first = CompiledCatalog("first", lambda qs, v: compiled.append(("first", v)) or v)
+    second = CompiledCatalog("second", lambda qs, v: compiled.append(("second", v)) or v)
+
+    async def scenario():
+        results = [await first.get(), await second.get(), await first.get()]
+        version["value"] = "v2"
+        results.append(await second.get())
+        return results
+
+    assert asyncio.run(scenario()) == ["v1", "v1", "v1", "v2"]
+    assert compiled == [("first", "v1"), ("second", "v1"), ("second", "v2")]
+    assert questions.reads == 2
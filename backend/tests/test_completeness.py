@@ -0,0 +1,62 @@
+from services.completeness import CompletenessEngine
+
+CATALOG = [
+    {
+        "qid": "q_ssn", "description": "Social Security Status", "visit_type": "SOC", "category": "Admin",
+        "casting": {"Yes": None, "No": "M0064_SSN_UK"},
+        "subitems": {"Yes": [{"qid": "q_ssn_num", "description": "Social Security Number", "casting": {"text": "M0064_SSN"}}]}
+    },
+    {
+        "qid": "q_pain", "description": "Pain present", "visit_type": "SOC", "category": "Vitals",
+        "casting": {"Yes": "pain_yes", "No": "pain_no"},
+        "subitems": {"Yes": [{"qid": "q_pain_score", "description": "Pain score", "casting": {"number": "pain_score"}}]}
+    },
+    {
+        "qid": "q_eating", "description": "Eating", "visit_type": "SOC", "category": "Function",
+        "casting": {"01": "GG_A1", "02": "GG_A1", "88": "GG_A1"}
+    },
+    {
+        "qid": "q_cardio", "description": "Cardiovascular status", "visit_type": "SOC", "category": "Cardio",
+        "casting": {"Yes": "cardioWnl", "No": None},
+        "subitems": {"Yes": [{"qid": "q_cardio_note", "description": "Cardiovascular note", "casting": {"text": "cardio_note"}}]}
+    },
+    {"qid": "q_rn", "description": "RN only", "visit_type": "RN", "category": "Visit", "casting": {"text": "rn_note"}},
+]
+
+
+def _score(fields):
+    engine = CompletenessEngine.compile(CATALOG)
+    survey_data = {"SOC": {"All": {code: {"value": value} for code, value in fields.items()}}}
+    return engine.score(1, "SOC", survey_data)
+
+
+def test_selected_answer_makes_subitems_required():
+    """Choosing 'Yes' for pain requires the pain score"""
+    report = _score({"M0064_SSN_UK": True, "pain_yes": True, "GG_A1": "02"})
+    assert (report.required, report.answered) == (5, 4)
+    assert [(g.qid, g.required_by) for g in report.gaps] == [("q_pain_score", "Pain present: Yes")]
+    assert report.score == 80.0
+
+
+def test_unanswered_questions_are_gaps_without_conditions():
+    """Unselected branches add nothing; other visit types' questions are ignored"""
+    report = _score({"pain_no": True, "pain_score": ""})
+    assert report.required == 4
+    assert {g.qid for g in report.gaps} == {"q_ssn", "q_eating"}
+    assert all(g.required_by is None for g in report.gaps)
+
+
+def test_option_without_field_is_inferred_from_its_subitems():
+    """An SSN entered means 'Yes' was chosen even though 'Yes' has no field"""
+    report = _score({"M0064_SSN": "123-45-6789", "pain_no": True, "GG_A1": "88"})
+    assert report.gaps == []
+    assert report.score == 100.0
+
+
+def test_leaf_option_without_field_is_a_plain_no():
+    """'No' to {"Yes": field, "No": None} is recorded by leaving the field unset"""
+    report = _score({"M0064_SSN_UK": True, "pain_no": True, "GG_A1": "01"})
+    assert report.gaps == []
+
+    report = _score({"M0064_SSN_UK": True, "pain_no": True, "GG_A1": "01", "cardioWnl": True})
+    assert [(g.qid, g.required_by) for g in report.gaps] == [("q_cardio_note", "Cardiovascular status: Yes")]
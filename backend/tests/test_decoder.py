@@ -0,0 +1,94 @@
+import json
+import os
+import time
+import pytest
+from services.catalog import load_schema_file
+from services.decoder import FormDecoder
+
+# /app/assets in the container, the repo root's assets/ in a checkout
+ASSETS = next(
+    path for path in (
+        os.path.join(os.path.dirname(__file__), "..", "assets"),
+        os.path.join(os.path.dirname(__file__), "..", "..", "assets"),
+    ) if os.path.isdir(path)
+)
+
+CATALOG = [
+    {"qid": "r_location", "description": "Location of care provided", "visit_type": "SOC", "category": "Tracking",
+     "casting": {"(Q5001) Care provided in home": "selectedQCode", "(Q5002) Care provided in facility": "selectedQCode"}},
+    {"qid": "c_payer", "description": "Current payment sources", "visit_type": "SOC", "category": "Tracking",
+     "casting": {"Medicare": "M0150_CPAY_MCARE", "Private insurance": "M0150_CPAY_PRIV_INS"}},
+    {"qid": "r_pulse", "description": "Pulse type measured", "visit_type": "SOC", "category": "Vitals",
+     "casting": {"Apical": None, "Radial": None},
+     "subitems": {"Apical": [{"qid": "n_apical", "description": "Apical pulse rate", "casting": {"number": "cVS_pulseapical"}}]}},
+    {"qid": "r_source", "description": "Pain source", "visit_type": "SOC", "category": "Vitals",
+     "casting": {"Reported": "Source", "Observed": "Source"}},
+    {"qid": "r_o2_source", "description": "Oxygen source", "visit_type": "SOC", "category": "Vitals",
+     "casting": {"Concentrator": "Source", "Tank": "Source"}},
+]
+
+
+def test_decode_survey():
+    decoder = FormDecoder.compile(CATALOG)
+    decoded = decoder.decode_survey({"SOC": {
+        "Tracking": {
+            "selectedQCode": {"value": "Q5002"},
+            "M0150_CPAY_MCARE": {"value": True},
+            "M0150_CPAY_PRIV_INS": {"value": False},
+            "legacy_field": {"value": "x", "question_description": "Stored description"},
+        },
+        "Vitals": {
+            "cVS_pulseapical": 72,
+            "Source": {"value": "Tank"},
+            "Empty": {"value": None},
+        },
+    }}, exclude_null=True)
+
+    tracking, vitals = decoded["SOC"]["Tracking"], decoded["SOC"]["Vitals"]
+    assert tracking["selectedQCode"]["answer"] == "(Q5002) Care provided in facility"
+    assert tracking["selectedQCode"]["question_description"] == "Location of care provided"
+    assert tracking["M0150_CPAY_MCARE"]["answer"] == "Medicare"
+    assert tracking["M0150_CPAY_PRIV_INS"]["answer"] is None
+    assert tracking["legacy_field"] == {
+        "value": "x", "qid": None, "question_description": "Stored description", "parent": None, "answer": "x"
+    }
+    assert vitals["cVS_pulseapical"]["qid"] == "n_apical"
+    assert vitals["cVS_pulseapical"]["parent"] == "Pulse type measured: Apical"
+    assert vitals["cVS_pulseapical"]["answer"] == 72
+    # A field code reused by two questions resolves to the one whose options contain the value
+    assert vitals["Source"]["qid"] == "r_o2_source"
+    assert "Empty" not in vitals
+
+
+def _christopher_soc():
+    decoder = FormDecoder.compile(load_schema_file(os.path.join(ASSETS, "question_schema.json")))
+    with open(os.path.join(ASSETS, "form_response_example_christopher.json"), encoding="utf-8") as f:
+        form = json.load(f)
+    survey_data = {"SOC": {
+        category: {field: {"value": value} for field, value in fields.items()}
+        for category, fields in form["SOC"].items()
+    }}
+    return decoder, survey_data
+
+
+def test_full_form_is_labelled():
+    """Almost every field of a real SOC form maps to a catalog question"""
+    decoder, survey_data = _christopher_soc()
+    decoded = decoder.decode_survey(survey_data)
+    labelled = sum(1 for fields in decoded["SOC"].values() for field in fields.values() if field["qid"])
+    assert labelled > 0.9 * sum(len(fields) for fields in survey_data["SOC"].values())
+
+
+@pytest.mark.skipif("DECODE_BUDGET_SECONDS" not in os.environ, reason="benchmark; set DECODE_BUDGET_SECONDS to run")
+def test_decode_budget():
+    """A full SOC form decodes within the per-form budget"""
+    budget = float(os.environ["DECODE_BUDGET_SECONDS"])
+    decoder, survey_data = _christopher_soc()
+    best = min(_timed(decoder, survey_data) for _ in range(20))
+    assert best < budget
+
+
+def _timed(decoder, survey_data):
+    started = time.perf_counter()
+    decoder.decode_survey(survey_data)
+    return time.perf_counter() - started
@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+from app.models.form import FormType
+from services.form_diff import diff_answers, flatten_answers
+
+
+def _form(form_type, survey_data):
+    return SimpleNamespace(form_type=form_type, survey_data=survey_data)
+
+
+def test_diff_across_form_types():
+    """Answers are matched by category and qid, whatever the form type"""
+    soc = _form(FormType.SOC, {"SOC": {"Vitals": {
+        "bp": {"value": "120/80", "question_description": "Blood pressure"},
+        "pulse": {"value": 70, "question_description": "Pulse"},
+        "o2": {"value": "", "question_description": "Oxygen"},
+        "pain": {"value": 3, "question_description": "Pain"},
+    }}})
+    rn = _form(FormType.RN, {"RN": {"Vitals": {
+        "bp": {"value": "140/90", "question_description": "Blood pressure"},
+        "pulse": {"value": 70, "question_description": "Pulse"},
+        "o2": {"value": "94%", "question_description": "Oxygen"},
+        "pain": {"value": None, "question_description": "Pain"},
+    }}})
+
+    added, removed, changed, unchanged = diff_answers(flatten_answers(soc), flatten_answers(rn))
+    assert [(c.qid, c.right) for c in added] == [("o2", "94%")]
+    assert [(c.qid, c.left) for c in removed] == [("pain", 3)]
+    assert [(c.qid, c.left, c.right, c.description) for c in changed] == [("bp", "120/80", "140/90", "Blood pressure")]
+    assert unchanged == 1
+
+
+def test_own_section_wins_when_sections_overlap():
+    """A form carrying several sections uses its own type's answer"""
+    form = _form(FormType.PTVIS, {
+        "PTVIS": {"PT": {"rom": {"value": "full"}}},
+        "PTEVAL": {"PT": {"rom": {"value": "limited"}}},
+    })
+    assert flatten_answers(form)[("PT", "rom")][0] == "full"
@@ -0,0 +1,131 @@
+import asyncio
+import json
+from services import form_writes
+from services.decoder import FormDecoder
+from services.validation import FormValidator
+
+CATALOG = [
+    {"qid": "n_pulse", "description": "Pulse", "visit_type": "SOC", "category": "Vitals", "casting": {"number": "cVS_pulse"}},
+    {"qid": "r_location", "description": "Location of care", "visit_type": "SOC", "category": "Tracking",
+     "casting": {"(Q5001) Care provided in home": "selectedQCode", "(Q5002) Care provided in facility": "selectedQCode"}},
+]
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield doc
+
+
+class FakePatients:
+    def __init__(self, patient_ids):
+        self.patient_ids = patient_ids
+
+    def find(self, query, projection):
+        return FakeCursor([{"patient_id": pid} for pid in query["patient_id"]["$in"] if pid in self.patient_ids])
+
+
+class FakeForms:
+    database = None
+
+    def __init__(self):
+        self.batches = []
+
+    async def insert_many(self, documents, ordered=True):
+        assert not ordered
+        self.batches.append(documents)
+
+
+async def chunked(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def install(monkeypatch, forms: FakeForms):
+    counter = {"value": 100}
+
+    async def next_sequence(db, name, count=1):
+        counter["value"] += count
+        return counter["value"] - count + 1
+
+    async def seed_sequence(db, name, collection, field):
+        pass
+
+    async def validator():
+        return FormValidator.compile(CATALOG)
+
+    async def decoder():
+        return FormDecoder.compile(CATALOG)
+
+    monkeypatch.setattr(form_writes, "next_sequence", next_sequence)
+    monkeypatch.setattr(form_writes, "seed_sequence", seed_sequence)
+    monkeypatch.setattr(form_writes, "get_form_validator", validator)
+    monkeypatch.setattr(form_writes, "get_form_decoder", decoder)
+    monkeypatch.setattr(form_writes.Patient, "get_motor_collection", classmethod(lambda cls: FakePatients({1, 2})))
+    monkeypatch.setattr(form_writes.Form, "get_motor_collection", classmethod(lambda cls: forms))
+
+
+def test_ndjson_lines_span_chunks_and_oversized_records_are_flagged():
+    body = b'{"a": 1}\n\n{"b": 2}\r\n' + b"x" * 50 + b'\n{"c": 3}'
+
+    async def collect(size):
+        return [line async for line in form_writes.iter_ndjson(chunked(body, size), max_record_bytes=20)]
+
+    for size in (1, 7, len(body)):
+        assert asyncio.run(collect(size)) == [(1, b'{"a": 1}'), (3, b'{"b": 2}\r'), (4, None), (5, b'{"c": 3}')]
+
+
+def test_bulk_upload_reports_every_record(monkeypatch):
+    forms = FakeForms()
+    install(monkeypatch, forms)
+    records = [
+        {"patient_id": 1, "form_date": "2025-06-03", "form_type": "SOC",
+         "survey_data": {"SOC": {"Vitals": {"cVS_pulse": 72}, "Tracking": {"selectedQCode": "Q5001"}}}},
+        {"patient_id": 2, "form_date": "2025-06-04", "form_type": "SOC",
+         "survey_data": {"SOC": {"Vitals": {"cVS_pulse": "fast"}}}},
+        {"patient_id": 3, "form_date": "2025-06-05", "form_type": "SOC", "survey_data": {"SOC": {}}},
+        {"patient_id": 2, "form_type": "SOC", "survey_data": {}},
+        {"patient_id": 2, "form_date": "2025-06-06", "form_type": "SOC",
+         "survey_data": {"SOC": {"Vitals": {"cVS_pulse": 80, "cVS_extra": "x"}}}},
+    ]
+    body = "\n".join(json.dumps(record) for record in records).encode() + b"\n{not json\n"
+
+    result = asyncio.run(form_writes.bulk_create_forms(chunked(body, 64), batch_size=3))
+
+    assert (result.created, result.invalid, result.failed) == (2, 4, 0)
+    assert [(r.index, r.status.value, r.form_id) for r in result.results] == [
+        (1, "created", 101), (2, "invalid", None), (3, "invalid", None),
+        (4, "invalid", None), (5, "created", 102), (6, "invalid", None),
+    ]
+    codes = {r.index: [e.code for e in r.errors] for r in result.results}
+    assert codes[2] == ["invalid_type"]
+    assert codes[3] == ["unknown_patient"]
+    assert codes[4] == ["missing"]
+    assert codes[6] == ["invalid_json"]
+    assert [w.code for w in result.results[4].warnings] == ["unknown_field"]
+
+    # One insert per batch with a contiguous block of IDs, stored with descriptions
+    assert [[d["form_id"] for d in batch] for batch in forms.batches] == [[101], [102]]
+    stored = forms.batches[0][0]
+    assert stored["revision"] == 1
+    assert stored["survey_data"]["SOC"]["Vitals"]["cVS_pulse"] == {"value": 72, "question_description": "Pulse"}
+
+
+def test_single_create_rejects_invalid_answers(monkeypatch):
+    forms = FakeForms()
+    install(monkeypatch, forms)
+    form = form_writes.FormCreate(patient_id=1, form_date="2025-06-03", form_type="SOC",
+                                  survey_data={"SOC": {"Tracking": {"selectedQCode": "Q5003"}}})
+
+    result = asyncio.run(form_writes.create_form(form))
+    assert result.status.value == "invalid" and forms.batches == []
+
+    form.survey_data["SOC"]["Tracking"]["selectedQCode"] = "Q5002"
+    result = asyncio.run(form_writes.create_form(form))
+    assert (result.status.value, result.form_id) == ("created", 101)
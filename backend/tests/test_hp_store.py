@@ -0,0 +1,120 @@
+import hashlib
+import os
+from types import SimpleNamespace
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.models.patient import HPReference, PatientResponse
+from app.routers import patients as patients_router
+from app.routers.auth import get_current_user
+from services.hp_store import decompress_hp, hp_upsert, offload_hp
+
+# /app/assets in the container, the repo root's assets/ in a checkout
+ASSETS = next(
+    path for path in (
+        os.path.join(os.path.dirname(__file__), "..", "assets"),
+        os.path.join(os.path.dirname(__file__), "..", "..", "assets"),
+    ) if os.path.isdir(path)
+)
+
+with open(os.path.join(ASSETS, "hp_summary_example_christopher.xml"), encoding="utf-8") as f:
+    HP_XML = f.read()
+HP_BYTES = HP_XML.encode("utf-8")
+SHA256 = hashlib.sha256(HP_BYTES).hexdigest()
+
+
+def test_offload_moves_xml_into_a_compressed_document():
+    record = {"patient_id": 1, "name": "Test", "xml_data": HP_XML}
+    document = offload_hp(record)
+
+    assert "xml_data" not in record
+    assert record["hp"] == {"sha256": SHA256, "size": len(HP_BYTES), "compressed_size": document["compressed_size"]}
+    assert document["_id"] == SHA256
+    assert document["compressed_size"] < len(HP_BYTES) * 0.6
+    assert decompress_hp(document["codec"], document["data"]) == HP_BYTES
+
+    # Stored content-addressed and insert-only, so re-running is a no-op
+    operation = hp_upsert(document)
+    assert operation._filter == {"_id": SHA256}
+    assert "_id" not in operation._doc["$setOnInsert"]
+    assert offload_hp({"patient_id": 2, "xml_data": None}) is None
+
+
+class FakeQuery:
+    def __init__(self, patient):
+        self.patient = patient
+
+    def project(self, model):
+        return self
+
+    def __await__(self):
+        async def result():
+            return self.patient
+        return result().__await__()
+
+
+@pytest.fixture
+def hp_client(monkeypatch):
+    patients = {
+        1: SimpleNamespace(patient_id=1, hp=HPReference(sha256=SHA256, size=len(HP_BYTES), compressed_size=1), xml_data=None),
+        2: SimpleNamespace(patient_id=2, hp=None, xml_data=HP_XML),
+        3: SimpleNamespace(patient_id=3, hp=None, xml_data=None),
+    }
+    reads = []
+
+    async def load_hp(reference):
+        reads.append(reference.sha256)
+        return HP_BYTES
+
+    monkeypatch.setattr(patients_router.Patient, "find_one", lambda query: FakeQuery(patients.get(query["patient_id"])))
+    monkeypatch.setattr(patients_router, "load_hp", load_hp)
+
+    app = FastAPI()
+    app.include_router(patients_router.router)
+    user = SimpleNamespace(username="qa", user_type=SimpleNamespace(value="quality_administrator"))
+    app.dependency_overrides[get_current_user] = lambda: user
+    return TestClient(app), user, reads
+
+
+def test_hp_endpoint_serves_etag_and_ranges(hp_client):
+    client, user, reads = hp_client
+    etag = f'"{SHA256}"'
+
+    response = client.get("/patients/1/hp")
+    assert response.status_code == 200
+    assert response.content == HP_BYTES
+    assert response.headers["etag"] == etag and response.headers["accept-ranges"] == "bytes"
+
+    # Revalidation doesn't read the document
+    assert client.get("/patients/1/hp", headers={"If-None-Match": etag}).status_code == 304
+    assert reads == [SHA256]
+
+    partial = client.get("/patients/1/hp", headers={"Range": "bytes=0-99"})
+    assert partial.status_code == 206 and partial.content == HP_BYTES[:100]
+    assert partial.headers["content-range"] == f"bytes 0-99/{len(HP_BYTES)}"
+    assert client.get("/patients/1/hp", headers={"Range": "bytes=-10"}).content == HP_BYTES[-10:]
+    assert client.get("/patients/1/hp", headers={"Range": "bytes=100-"}).content == HP_BYTES[100:]
+
+    unsatisfiable = client.get("/patients/1/hp", headers={"Range": f"bytes={len(HP_BYTES)}-"})
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers["content-range"] == f"bytes */{len(HP_BYTES)}"
+    # A stale If-Range gets the whole, current document
+    stale = client.get("/patients/1/hp", headers={"Range": "bytes=0-9", "If-Range": '"old"'})
+    assert stale.status_code == 200 and stale.content == HP_BYTES
+    assert client.get("/patients/1/hp", headers={"Range": "bytes=0-1,5-6"}).status_code == 200
+
+    # Not yet migrated: served from the inline field with the same ETag
+    legacy = client.get("/patients/2/hp")
+    assert legacy.status_code == 200 and legacy.headers["etag"] == etag
+    assert client.get("/patients/3/hp").status_code == 404
+    assert client.get("/patients/4/hp").status_code == 404
+
+    user.user_type = SimpleNamespace(value="field_clinician")
+    assert client.get("/patients/1/hp").status_code == 403
+
+
+def test_patient_listings_flag_hp_without_loading_xml():
+    projection = PatientResponse.Settings.projection
+    assert "xml_data" not in projection
+    assert set(projection) == set(PatientResponse.model_fields)
+    assert "$xml_data" in str(projection["has_hp"])
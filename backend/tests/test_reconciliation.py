@@ -0,0 +1,109 @@
+from types import SimpleNamespace
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.models.user import UserType
+from app.routers import forms as forms_router
+from app.routers.auth import get_current_user
+from prompts.form import generate_summary_prompt
+from services.reconciliation import drug_keys, reconcile_survey
+
+HP_XML = """<hp_summary>
+<diagnoses>
+Active diagnoses:
+- Lumbar spondylosis with exacerbation (04/21/2025)
+- Right ankle sprain (04/21/2025)
+- Fall risk (Z91.81)
+- Hypertension
+</diagnoses>
+<medications>
+- ASA/Plavix DAPT
+- Tadalafil (ADCIRCA) 20mg: 2 tablets daily
+- Warfarin (discontinued 5/25/2025)
+</medications>
+</hp_summary>"""
+
+SURVEY = {"SOC": {"Medications": {
+    "medications_list": {"value": [
+        {"Medication": "Aspirin Oral Capsule 81 MG"},
+        {"Medication": "Clopidogrel Bisulfate Oral Tablet 75 MG"},
+        {"Medication": "Tadalfil Oral Tablet 20 MG"},
+        {"Medication": "Metformin Oral Tablet 500 MG"},
+    ]},
+}, "Diagnosis": {
+    "frm_MedDiagText": {"value": "Lumbar spondylosis, R ankle sprain; Z91.81 history of falling"},
+}}}
+
+
+def test_drug_names_normalize_to_ingredients():
+    assert drug_keys("Atorvastatin Calcium Oral Tablet 40 MG") == {"atorvastatin"}
+    assert drug_keys("Tadalafil (ADCIRCA) 20mg: 2 tablets daily") == {"tadalafil"}
+    assert drug_keys("HYDROcodone/acetaminophen (NORCO)") == {"hydrocodone", "acetaminophen"}
+    assert drug_keys("Vitamin D3: 1000 unit daily") == drug_keys("Cholecalciferol Oral Liquid 25 MCG/10ML")
+
+
+def test_reconcile_medications_and_diagnoses():
+    result = reconcile_survey(7, "SOC", SURVEY, 3, HP_XML)
+
+    meds = result.medications
+    assert {(m.key, m.match) for m in meds.matched} == {
+        ("aspirin", "exact"), ("clopidogrel", "exact"), ("tadalafil", "fuzzy")
+    }
+    assert meds.hp_only == ["Warfarin (discontinued 5/25/2025)"]
+    assert meds.form_only == ["Metformin Oral Tablet 500 MG"]
+
+    diagnoses = result.diagnoses
+    assert {(d.hp, d.form) for d in diagnoses.matched} == {
+        ("Lumbar spondylosis with exacerbation (04/21/2025)", "Lumbar spondylosis"),
+        ("Right ankle sprain (04/21/2025)", "R ankle sprain"),
+        ("Fall risk (Z91.81)", "Z91.81 history of falling"),
+    }
+    assert diagnoses.hp_only == ["Hypertension"]
+    assert diagnoses.form_only == []
+
+
+def test_qa_prompt_uses_reconciliation_table():
+    form = SimpleNamespace(form_id=7, patient_id=3, form_type="SOC", form_date="2025-05-01", survey_data=SURVEY)
+    patient = SimpleNamespace(patient_id=3, name="Test", dob=None, gender="F", mrn=1, address="", phone="",
+                              email="t@example.com")
+    reconciliation = reconcile_survey(7, "SOC", SURVEY, 3, HP_XML)
+
+    raw = generate_summary_prompt(form, patient, UserType.QUALITY_ADMINISTRATOR, hp_xml=HP_XML)
+    assert "H&P MEDICATIONS:" in raw and "H&P DIAGNOSES:" in raw
+
+    prompt = generate_summary_prompt(form, patient, UserType.QUALITY_ADMINISTRATOR, None, reconciliation, hp_xml=HP_XML)
+    assert "H&P MEDICATIONS:" not in prompt and "H&P DIAGNOSES:" not in prompt
+    assert "| Warfarin (discontinued 5/25/2025) | | H&P only |" in prompt
+    assert "Clopidogrel Bisulfate" in prompt.split("FORM RESPONSE DATA:")[0]
+    assert "Clopidogrel Bisulfate" not in prompt.split("FORM RESPONSE DATA:")[1]
+
+
+def test_reconciliation_endpoint_is_for_quality_administrators(monkeypatch):
+    form = SimpleNamespace(form_id=7, patient_id=3, form_type="SOC", survey_data=SURVEY)
+    patient = SimpleNamespace(patient_id=3, hp=None, xml_data=HP_XML)
+
+    async def find_form(query):
+        return form
+
+    async def find_patient(query):
+        return patient
+
+    async def load_hp_text(patient):
+        return patient.xml_data
+
+    monkeypatch.setattr(forms_router.Form, "find_one", find_form)
+    monkeypatch.setattr(forms_router.Patient, "find_one", find_patient)
+    monkeypatch.setattr(forms_router, "load_hp_text", load_hp_text)
+
+    app = FastAPI()
+    app.include_router(forms_router.router)
+    user = SimpleNamespace(username="qa", user_type=SimpleNamespace(value="quality_administrator"))
+    app.dependency_overrides[get_current_user] = lambda: user
+    client = TestClient(app)
+
+    response = client.get("/forms/7/reconciliation")
+    assert response.status_code == 200
+    assert response.json()["medications"]["hp_only"] == ["Warfarin (discontinued 5/25/2025)"]
+
+    # Field clinicians can't read the H&P, so they don't get it reconciled either
+    user.user_type = SimpleNamespace(value="field_clinician")
+    assert client.get("/forms/7/reconciliation").status_code == 403
@@ -0,0 +1,33 @@
+from services.resilience import CircuitBreaker, LatencyTracker, backoff_delay, parse_retry_after
+
+
+def test_breaker_opens_after_threshold_and_allows_one_trial():
+    """Consecutive failures open the breaker; after the timeout a single trial is allowed"""
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0.0)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_backoff_is_capped():
+    """Backoff never exceeds the cap, however many attempts"""
+    assert all(0 <= backoff_delay(attempt, 1.0, 5.0) <= 5.0 for attempt in range(20))
+
+
+def test_retry_after_and_percentile():
+    """Retry-After seconds are parsed and percentiles need enough samples"""
+    assert parse_retry_after({"retry-after": "7"}) == 7.0
+    assert parse_retry_after({}) is None
+
+    tracker = LatencyTracker(min_samples=10)
+    assert tracker.percentile(95) is None
+    for i in range(1, 101):
+        tracker.record(float(i))
+    assert tracker.percentile(95) == 95.0
@@ -0,0 +1,154 @@
+import asyncio
+import os
+import random
+import re
+import time
+from app.models.patient import name_tokens
+from services import search
+from services.search import PatientSearchIndex, QuestionSearchIndex
+
+PATIENTS = {
+    1: {"patient_id": 1, "name": "Christopher Nguyen", "mrn": 123456789, "phone": "(555) 201-3344", "revision": 1},
+    2: {"patient_id": 2, "name": "Connie Chrisman", "mrn": 987654321, "phone": "555.867.5309", "revision": 3},
+    3: {"patient_id": 3, "name": "Alice Christopherson", "mrn": 123999000, "phone": "Unknown", "revision": 1},
+}
+
+
+def test_patient_search_by_name_mrn_and_phone():
+    index = PatientSearchIndex(PATIENTS)
+
+    assert [p.patient_id for p in index.search("chris")] == [3, 1, 2]
+    assert [p.patient_id for p in index.search("Chris Ng")] == [1]
+    assert [p.patient_id for p in index.search("christopher", limit=1)] == [3]
+    assert [p.patient_id for p in index.search("1234")] == [1]
+    assert [p.patient_id for p in index.search("123")] == [3, 1]
+    assert [p.patient_id for p in index.search("867-53")] == [2]
+    assert index.search("zzz") == []
+    assert index.search("--") == []
+
+
+def test_question_search():
+    index = QuestionSearchIndex([
+        {"qid": "M1800", "description": "Grooming", "visit_type": "SOC", "category": "ADL"},
+        {"qid": "M1033", "description": "Risk for hospitalization", "visit_type": "SOC", "category": "Risk"},
+        {"qid": "frm_FallRisk", "description": "Fall risk assessment completed", "visit_type": "RN"},
+    ])
+    assert [q.qid for q in index.search("risk")] == ["M1033", "frm_FallRisk"]
+    assert [q.qid for q in index.search("fall ri")] == ["frm_FallRisk"]
+    assert [q.qid for q in index.search("risk", visit_type="SOC")] == ["M1033"]
+    assert [q.qid for q in index.search("m18")] == ["M1800"]
+
+
+def test_falls_back_to_mongo_until_index_is_built(monkeypatch):
+    calls = []
+
+    async def mongo(query, limit):
+        calls.append(query)
+        return []
+
+    async def refresh():
+        search.patient_index = PatientSearchIndex(PATIENTS)
+
+    async def scenario():
+        monkeypatch.setattr(search, "patient_index", None)
+        monkeypatch.setattr(search, "_refresh_task", None)
+        monkeypatch.setattr(search, "_search_patients_in_mongo", mongo)
+        monkeypatch.setattr(search, "refresh_patient_index", refresh)
+
+        assert await search.search_patients("conn") == []
+        assert calls == ["conn"]
+        await search._refresh_task
+        assert [p.patient_id for p in await search.search_patients("conn")] == [2]
+        assert calls == ["conn"]
+
+    asyncio.run(scenario())
+
+
+def matches_query(document, query):
+    """The query operators the Mongo fallback uses; array fields match on any element"""
+    if "$and" in query:
+        return all(matches_query(document, clause) for clause in query["$and"])
+    if "$or" in query:
+        return any(matches_query(document, clause) for clause in query["$or"])
+    (field, condition), = query.items()
+    values = document.get(field)
+    values = values if isinstance(values, list) else [values]
+    if not isinstance(condition, dict):
+        return condition in values
+    if "$regex" in condition:
+        return any(isinstance(v, str) and re.search(condition["$regex"], v) for v in values)
+    return any(
+        isinstance(v, int) and v >= condition["$gte"] and ("$lt" not in condition or v < condition["$lt"])
+        for v in values
+    )
+
+
+class FakePatients:
+    def find(self, query, projection):
+        self.query = query
+        return self
+
+    def sort(self, field, direction):
+        self.order = (field, direction)
+        return self
+
+    def limit(self, limit):
+        return self
+
+    async def to_list(self, length):
+        documents = [{**p, "name_tokens": name_tokens(p["name"])} for p in PATIENTS.values()]
+        return sorted((p for p in documents if matches_query(p, self.query)), key=lambda p: p["name"])
+
+
+def test_mongo_fallback_matches_name_prefixes(monkeypatch):
+    """Typeahead input like "chr" finds names before the index is built"""
+    patients = FakePatients()
+    monkeypatch.setattr(search.Patient, "get_motor_collection", classmethod(lambda cls: patients))
+
+    async def names(query):
+        return [p.patient_id for p in await search._search_patients_in_mongo(query, 20)]
+
+    assert asyncio.run(names("chr")) == [3, 1, 2]
+    assert asyncio.run(names("Chris ng")) == [1]
+    assert asyncio.run(names("hris")) == []
+    assert patients.order == ("name", 1)
+    # Anchored and case-sensitive on the lowercased tokens, so Mongo can bound the index scan
+    asyncio.run(names("Chris ng"))
+    assert patients.query == {"$and": [{"name_tokens": {"$regex": "^chris"}}, {"name_tokens": {"$regex": "^ng"}}]}
+
+
+def test_mongo_fallback_matches_mrn_prefixes_like_the_index(monkeypatch):
+    patients = FakePatients()
+    monkeypatch.setattr(search.Patient, "get_motor_collection", classmethod(lambda cls: patients))
+    index = PatientSearchIndex(PATIENTS)
+
+    async def ids(query):
+        return [p.patient_id for p in await search._search_patients_in_mongo(query, 20)]
+
+    for query in ("123", "1234", "123456789", "98765", "867-53", "12345678901"):
+        assert asyncio.run(ids(query)) == [p.patient_id for p in index.search(query)], query
+    assert asyncio.run(ids("123")) == [3, 1]
+    assert search.mrn_prefix_ranges("12")[:2] == [{"mrn": {"$gte": 12, "$lt": 13}}, {"mrn": {"$gte": 120, "$lt": 130}}]
+    assert search.mrn_prefix_ranges("012") == []
+
+
+def test_typeahead_budget():
+    """Prefix queries over tens of thousands of patients stay within the typeahead budget"""
+    budget = float(os.getenv("SEARCH_BUDGET_SECONDS", "0.02"))
+    rng = random.Random(7)
+    syllables = ["an", "be", "chri", "da", "el", "fo", "ga", "ha", "jo", "ka", "li", "ma", "no", "pe", "ro", "sa", "ta", "wi"]
+    records = {
+        pid: {
+            "patient_id": pid,
+            "name": f"{''.join(rng.choices(syllables, k=3)).title()} {''.join(rng.choices(syllables, k=3)).title()}",
+            "mrn": rng.randrange(10 ** 8, 10 ** 9),
+            "phone": f"({rng.randrange(200, 999)}) {rng.randrange(200, 999)}-{rng.randrange(1000, 9999)}",
+            "revision": 1,
+        } for pid in range(1, 50001)
+    }
+    index = PatientSearchIndex(records)
+
+    for query in ["a", "chri", "ma jo", "12", "555-1", "wi"]:
+        started = time.perf_counter()
+        index.search(query)
+        assert time.perf_counter() - started < budget, query
@@ -0,0 +1,21 @@
+import app.server as server
+
+
+def test_worker_count_uses_web_concurrency(monkeypatch):
+    """An explicit WEB_CONCURRENCY overrides CPU detection"""
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+    assert server.worker_count() == 3
+
+
+def test_workers_capped_by_cgroup_quota(monkeypatch):
+    """A fractional CPU quota rounds up, and never exceeds the CPUs present"""
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    monkeypatch.setattr(server.os, "sched_getaffinity", lambda pid: set(range(16)))
+    monkeypatch.setattr(server, "_cgroup_cpu_limit", lambda: 2.5)
+    assert server.worker_count() == 3
+
+    monkeypatch.setattr(server, "_cgroup_cpu_limit", lambda: 64.0)
+    assert server.worker_count() == 16
+
+    monkeypatch.setattr(server, "_cgroup_cpu_limit", lambda: None)
+    assert server.worker_count() == 16
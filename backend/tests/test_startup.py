@@ -0,0 +1,58 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import app.main as main
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budgets for a cold worker; override on slow CI runners
+IMPORT_BUDGET_SECONDS = float(os.getenv("STARTUP_IMPORT_BUDGET_SECONDS", "2.0"))
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "0.5"))
+
+IMPORT_PROBE = """
+import sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+import services.claude
+print(elapsed, 'httpx' in sys.modules, services.claude.claude_service is None)
+"""
+
+
+def test_app_import_within_budget():
+    """Importing the app in a fresh interpreter stays fast and builds no services"""
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stdout.split()
+    elapsed, httpx_loaded, claude_lazy = float(output[0]), output[1] == "True", output[2] == "True"
+
+    assert elapsed < IMPORT_BUDGET_SECONDS, f"app import took {elapsed:.2f}s (budget {IMPORT_BUDGET_SECONDS}s)"
+    assert not httpx_loaded
+    assert claude_lazy
+
+
+def test_startup_does_not_wait_for_prewarm(monkeypatch):
+    """Startup completes without waiting on the pre-warmed services"""
+    async def no_db():
+        return None
+
+    async def slow_prewarm():
+        await asyncio.sleep(5)
+
+    monkeypatch.setattr(main, "init_db", no_db)
+    monkeypatch.setattr(main, "prewarm_services", slow_prewarm)
+
+    async def scenario():
+        started = time.perf_counter()
+        await main.startup_event()
+        elapsed = time.perf_counter() - started
+        main.app.state.prewarm.cancel()
+        return elapsed
+
+    elapsed = asyncio.run(scenario())
+    assert elapsed < STARTUP_BUDGET_SECONDS
+    assert main.app.state.ready
+    main.app.state.ready = False
@@ -0,0 +1,205 @@
+import asyncio
+import hashlib
+from types import SimpleNamespace
+import services.summary as summary
+from services.claude import ClaudeCompletion
+
+
+async def _slow():
+    await asyncio.sleep(10)
+    return {"summary": "done"}
+
+
+async def _cancel_waiters(*waiters):
+    for waiter in waiters:
+        waiter.cancel()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            pass
+
+
+def test_generation_cancelled_only_when_last_waiter_leaves(monkeypatch):
+    """One client leaving doesn't cancel a generation another client is waiting on"""
+    monkeypatch.setattr(summary, "FILL_CACHE_AFTER_SECONDS", 60)
+
+    async def scenario():
+        flight = summary._start_flight("k1", _slow())
+        first = asyncio.create_task(summary._wait_for_flight(flight, 1))
+        second = asyncio.create_task(summary._wait_for_flight(flight, 1))
+        await asyncio.sleep(0.01)
+
+        await _cancel_waiters(first)
+        await asyncio.sleep(0.01)
+        still_running = not flight.task.done()
+
+        await _cancel_waiters(second)
+        await asyncio.sleep(0.01)
+        return still_running, flight.task.cancelled(), "k1" in summary._inflight
+
+    still_running, cancelled, registered = asyncio.run(scenario())
+    assert still_running
+    assert cancelled
+    assert not registered
+
+
+def test_long_running_generation_finishes_for_the_cache(monkeypatch):
+    """Past the fill-cache threshold the generation outlives its last waiter"""
+    monkeypatch.setattr(summary, "FILL_CACHE_AFTER_SECONDS", 0)
+
+    async def scenario():
+        flight = summary._start_flight("k2", _slow())
+        waiter = asyncio.create_task(summary._wait_for_flight(flight, 2))
+        await asyncio.sleep(0.01)
+        await _cancel_waiters(waiter)
+        await asyncio.sleep(0.01)
+        running = not flight.task.done()
+        flight.task.cancel()
+        return running
+
+    assert asyncio.run(scenario())
+
+
+class FakeCache:
+    def __init__(self, entries=None):
+        self.entries = entries or {}
+        self.written = {}
+
+    async def get_summary_entry(self, user_id, patient_id, form_id, revision=""):
+        summary = self.entries.get(form_id)
+        return (summary, False) if summary else None
+
+    async def get_summaries(self, user_id, patient_id, form_revisions):
+        return {form_id: self.entries[form_id] for form_id in form_revisions if form_id in self.entries}
+
+    async def set_summary(self, user_id, patient_id, form_id, summary_data, revision="", compute_seconds=0.0):
+        self.written[form_id] = (summary_data, revision)
+        return True
+
+
+class FakeArchive:
+    """Stands in for the Summary document: records inserts, answers find() newest first"""
+    records = []
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    async def insert(self):
+        FakeArchive.records.append(self)
+
+    @classmethod
+    def find(cls, query):
+        def matches(record):
+            for field, condition in query.items():
+                value = getattr(record, field)
+                if value not in (condition["$in"] if isinstance(condition, dict) else [condition]):
+                    return False
+            return True
+        found = sorted((r for r in cls.records if matches(r)), key=lambda r: r.created_at, reverse=True)
+        return SimpleNamespace(sort=lambda *_: SimpleNamespace(
+            first_or_none=lambda: _value(found[0] if found else None),
+            to_list=lambda: _value(found)
+        ))
+
+
+async def _value(value):
+    return value
+
+
+def _archived(form_id, revision, summary, created_at, user_type="field_clinician"):
+    return FakeArchive(form_id=form_id, patient_id=3, revision=revision, user_type=user_type, username="other",
+                       summary=summary, compute_seconds=12.0, created_at=created_at)
+
+
+def _install(monkeypatch, cache):
+    async def get_cache_client():
+        return cache
+    FakeArchive.records = []
+    monkeypatch.setattr(summary, "Summary", FakeArchive)
+    monkeypatch.setattr(summary, "get_cache_client", get_cache_client)
+
+
+USER = SimpleNamespace(username="bob", user_type=SimpleNamespace(value="field_clinician"))
+
+
+def test_redis_miss_reads_through_archive_and_backfills(monkeypatch):
+    cache = FakeCache({2: {"summary": "hot", "user_type": "field_clinician", "form_id": 2}})
+    _install(monkeypatch, cache)
+    FakeArchive.records = [
+        _archived(1, "f1.p1.t4", "older", 1),
+        _archived(1, "f1.p1.t4", "newest", 2),
+        _archived(1, "f1.p1.t4", "other type", 3, user_type="quality_administrator"),
+        _archived(5, "f0.p1.t4", "stale revision", 1),
+    ]
+    form = SimpleNamespace(form_id=1, patient_id=3)
+
+    entry = asyncio.run(summary.get_cached_summary(form, USER, "f1.p1.t4"))
+    assert entry == ({"summary": "newest", "user_type": "field_clinician", "form_id": 1}, False)
+    assert cache.written[1] == (entry[0], "f1.p1.t4")
+    assert asyncio.run(summary.get_cached_summary(SimpleNamespace(form_id=9, patient_id=3), USER, "f1.p1.t4")) is None
+
+    found = asyncio.run(summary.get_cached_summaries(USER, 3, {1: "f1.p1.t4", 2: "f2.p1.t4", 5: "f1.p1.t4"}))
+    assert {form_id: s["summary"] for form_id, s in found.items()} == {1: "newest", 2: "hot"}
+    assert set(cache.written) == {1}
+
+
+def test_generated_summaries_are_archived(monkeypatch):
+    cache = FakeCache()
+    _install(monkeypatch, cache)
+
+    async def no_decoder():
+        raise RuntimeError("no catalog")
+
+    class FakeClaude:
+        def __init__(self, model):
+            self.model = model
+
+        async def complete(self, prompt, max_tokens, priority):
+            return ClaudeCompletion("A summary", self.model, 1200, 300)
+
+    monkeypatch.setattr(summary, "get_form_decoder", no_decoder)
+    monkeypatch.setattr(summary, "generate_summary_prompt", lambda *args: "the prompt")
+    form = SimpleNamespace(form_id=1, patient_id=3, revision=2)
+    patient = SimpleNamespace(patient_id=3, revision=5)
+
+    revision = summary.summary_revision(2, 5, "v1")
+
+    monkeypatch.setattr(summary, "get_claude_service", lambda: FakeClaude("claude-test"))
+    result = asyncio.run(summary._generate_and_cache(form, patient, USER, revision))
+    assert result == {"summary": "A summary", "user_type": "field_clinician", "form_id": 1}
+    [record] = FakeArchive.records
+    assert (record.revision, record.model, record.input_tokens, record.output_tokens, record.username) == (
+        revision, "claude-test", 1200, 300, "bob")
+    assert record.prompt_hash == hashlib.sha256(b"the prompt").hexdigest()
+    assert cache.written[1][0] == result
+
+    # "Not configured" placeholders are cached but never archived
+    monkeypatch.setattr(summary, "get_claude_service", lambda: FakeClaude(None))
+    asyncio.run(summary._generate_and_cache(form, patient, USER, revision))
+    assert len(FakeArchive.records) == 1
+
+
+def test_catalog_refresh_changes_the_summary_revision(monkeypatch):
+    class FakeQuery:
+        def project(self, model):
+            return self
+
+        def __await__(self):
+            async def result():
+                return SimpleNamespace(patient_id=3, revision=5)
+            return result().__await__()
+
+    version = {"value": "v1"}
+
+    async def current_catalog_version():
+        return version["value"]
+
+    monkeypatch.setattr(summary.Patient, "find_one", lambda query: FakeQuery())
+    monkeypatch.setattr(summary, "current_catalog_version", current_catalog_version)
+    form = SimpleNamespace(form_id=1, patient_id=3, revision=2)
+
+    before = asyncio.run(summary.get_summary_revision(form))
+    version["value"] = "v2"
+    after = asyncio.run(summary.get_summary_revision(form))
+    assert before == summary.summary_revision(2, 5, "v1")
+    assert after != before
@@ -0,0 +1,164 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+import services.summary_jobs as summary_jobs
+from app.core.admission import AdmissionRejected
+from services.summary_jobs import SummaryJobManager, job_response
+
+
+async def _no_redis():
+    return SimpleNamespace(client=None)
+
+
+def test_long_poll_returns_when_local_job_finishes(monkeypatch):
+    """A long-poll on a job running on this worker wakes as soon as it's done"""
+    monkeypatch.setattr(summary_jobs, "get_cache_client", _no_redis)
+    jobs = SummaryJobManager()
+
+    async def scenario():
+        job = {"job_id": "j1", "form_id": 7, "username": "doc", "status": "running",
+               "result": None, "error": None, "created_at": "2024-01-01T00:00:00+00:00"}
+        await jobs._save(job)
+        jobs._done_events["j1"] = asyncio.Event()
+
+        async def finish():
+            await asyncio.sleep(0.05)
+            job["status"] = "succeeded"
+            job["result"] = {"summary": "ok", "user_type": "physician", "form_id": 7}
+            await jobs._save(job)
+            jobs._done_events.pop("j1").set()
+
+        asyncio.create_task(finish())
+        started = time.monotonic()
+        done = await jobs.wait("j1", 5)
+        return done, time.monotonic() - started
+
+    done, elapsed = asyncio.run(scenario())
+    assert elapsed < 1
+    response = job_response(done)
+    assert response.status.value == "succeeded"
+    assert response.result.summary == "ok"
+    assert response.status_url == "/summary-jobs/j1"
+
+
+def test_long_poll_times_out_with_current_status(monkeypatch):
+    """A job still running when the wait expires is returned as-is"""
+    monkeypatch.setattr(summary_jobs, "get_cache_client", _no_redis)
+    jobs = SummaryJobManager()
+
+    async def scenario():
+        await jobs._save({"job_id": "j2", "form_id": 8, "username": "doc", "status": "pending",
+                          "result": None, "error": None, "created_at": "2024-01-01T00:00:00+00:00"})
+        return await jobs.wait("j2", 0.2)
+
+    assert asyncio.run(scenario())["status"] == "pending"
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+
+def _install_jobs(monkeypatch, redis, generate):
+    async def cache_client():
+        return SimpleNamespace(client=redis)
+
+    async def revision(form):
+        return "f1.p1.t1"
+
+    admitted = []
+
+    class Admission:
+        @asynccontextmanager
+        async def admit(self, user_key):
+            admitted.append(user_key)
+            yield
+
+    monkeypatch.setattr(summary_jobs, "get_cache_client", cache_client)
+    monkeypatch.setattr(summary_jobs, "get_summary_revision", revision)
+    monkeypatch.setattr(summary_jobs, "generate_form_summary", generate)
+    monkeypatch.setattr(summary_jobs, "get_summary_admission", lambda: Admission())
+    return admitted
+
+
+def test_resubmits_find_the_job_and_jobs_run_under_admission(monkeypatch):
+    """The job record exists before its dedupe key, and generation is admitted per user"""
+    redis = FakeRedis()
+    release = asyncio.Event()
+
+    async def generate(form, user):
+        await release.wait()
+        return {"summary": "ok", "user_type": "physician", "form_id": form.form_id}
+
+    admitted = _install_jobs(monkeypatch, redis, generate)
+    original_claim = SummaryJobManager._claim
+
+    async def claim(self, dedupe_key, job_id):
+        assert redis.data[self._job_key(job_id)]
+        return await original_claim(self, dedupe_key, job_id)
+
+    monkeypatch.setattr(SummaryJobManager, "_claim", claim)
+    jobs = SummaryJobManager()
+    form = SimpleNamespace(form_id=7)
+    user = SimpleNamespace(username="doc")
+
+    async def scenario():
+        first, second = await asyncio.gather(jobs.submit(form, user), jobs.submit(form, user))
+        release.set()
+        done = await jobs.wait(first["job_id"], 5)
+        await jobs.close()
+        return first, second, done
+
+    first, second, done = asyncio.run(scenario())
+    assert second["job_id"] == first["job_id"]
+    assert done["status"] == "succeeded"
+    assert admitted == ["doc"]
+    # The duplicate's unused record was dropped
+    assert [key for key in redis.data if key.startswith("summary-job:")] == [f"summary-job:{first['job_id']}"]
+
+
+def test_one_user_cannot_fill_the_job_queue(monkeypatch):
+    redis = FakeRedis()
+    release = asyncio.Event()
+
+    async def generate(form, user):
+        await release.wait()
+        return {"summary": "ok", "user_type": "physician", "form_id": form.form_id}
+
+    _install_jobs(monkeypatch, redis, generate)
+    jobs = SummaryJobManager()
+    jobs.per_user_limit = 2
+
+    async def scenario():
+        user = SimpleNamespace(username="doc")
+        for form_id in (1, 2):
+            await jobs.submit(SimpleNamespace(form_id=form_id), user)
+        try:
+            await jobs.submit(SimpleNamespace(form_id=3), user)
+        except AdmissionRejected as e:
+            rejected = e.reason
+        other = await jobs.submit(SimpleNamespace(form_id=3), SimpleNamespace(username="nurse"))
+        release.set()
+        await jobs.close(drain_timeout=5)
+        return rejected, other
+
+    rejected, other = asyncio.run(scenario())
+    assert rejected == "per_user"
+    assert other["status"] == "succeeded"
+    assert jobs._per_user == {}
@@ -0,0 +1,87 @@
+import json
+import os
+import time
+import pytest
+from pydantic import ValidationError
+from app.models.form import FormCreate
+from services.validation import FormValidator
+
+# /app/assets in the container, the repo root's assets/ in a checkout
+ASSETS = next(
+    path for path in (
+        os.path.join(os.path.dirname(__file__), "..", "assets"),
+        os.path.join(os.path.dirname(__file__), "..", "..", "assets"),
+    ) if os.path.isdir(path)
+)
+
+CATALOG = [
+    {"qid": "r_directives", "description": "Advance directives", "visit_type": "SOC", "category": "History",
+     "casting": {"Yes": "phad1", "No": "phad2"},
+     "subitems": {"Yes": [{"qid": "t_attorney", "description": "Medical Power of Attorney", "casting": {"text": "admpoan"}}]}},
+    {"qid": "r_interest", "description": "Interest or pleasure", "visit_type": "SOC", "category": "Mood",
+     "casting": {"0. No": "D0150A1", "1. Yes": "D0150A1"},
+     "subitems": {"1. Yes": [{"qid": "r_weeks", "description": "Interest level past weeks",
+                              "casting": {"0. Never or 1 day": "D0150A2", "1. 2-6 days": "D0150A2"}}]}},
+    {"qid": "r_location", "description": "Location of care", "visit_type": "SOC", "category": "Tracking",
+     "casting": {"(Q5001) Care provided in home": "selectedQCode", "(Q5002) Care provided in facility": "selectedQCode"}},
+    {"qid": "n_pulse", "description": "Pulse", "visit_type": "SOC", "category": "Vitals", "casting": {"number": "cVS_pulse"}},
+    {"qid": "d_visit", "description": "Visit date", "visit_type": "SOC", "category": "Vitals", "casting": {"date": "cTO_visitdate"}},
+]
+
+
+def test_reports_every_error_in_one_pass():
+    validator = FormValidator.compile(CATALOG)
+    result = validator.validate({"SOC": {
+        "History": {"phad1": True, "admpoan": "Jane Doe"},
+        "Mood": {"D0150A1": "0. No", "D0150A2": "1. 2-6 days"},
+        "Tracking": {"selectedQCode": "Q5003", "M0020_PAT_ID": "68398"},
+        "Vitals": {"cVS_pulse": "seventy", "cTO_visitdate": {"value": "06/03/2025", "question_description": "Visit date"}},
+    }})
+
+    assert not result.valid
+    assert [(e.path, e.code) for e in result.errors] == [
+        ("SOC.Tracking.selectedQCode", "invalid_option"),
+        ("SOC.Vitals.cVS_pulse", "invalid_type"),
+    ]
+    assert sorted((w.path, w.code) for w in result.warnings) == [
+        ("SOC.Mood.D0150A2", "orphan_subitem"),
+        ("SOC.Tracking.M0020_PAT_ID", "unknown_field"),
+    ]
+
+    strict = validator.validate({"SOC": {"Mood": {"D0150A1": "0. No", "D0150A2": "1. 2-6 days"}}}, strict=True)
+    assert [(e.path, e.code) for e in strict.errors] == [("SOC.Mood.D0150A2", "orphan_subitem")]
+    assert strict.warnings == []
+
+    ok = validator.validate({"SOC": {"Tracking": {"selectedQCode": "(Q5001) Care provided in home"},
+                                     "Vitals": {"cVS_pulse": 72, "cTO_visitdate": None}}})
+    assert ok.valid and ok.warnings == []
+
+
+def test_form_create_rejects_malformed_survey_data():
+    with pytest.raises(ValidationError):
+        FormCreate(patient_id=1, form_date="2025-06-03", form_type="SOC", survey_data={"XYZ": {}})
+    with pytest.raises(ValidationError):
+        FormCreate(patient_id=1, form_date="2025-06-03", form_type="SOC", survey_data={"SOC": {"Vitals": [1, 2]}})
+
+
+def _connie():
+    validator = FormValidator.from_schema_file(os.path.join(ASSETS, "question_schema.json"))
+    with open(os.path.join(ASSETS, "form_response_example_connie.json"), encoding="utf-8") as f:
+        return validator, json.load(f)
+
+
+def test_real_form_is_valid():
+    validator, form = _connie()
+    assert validator.validate(form).valid
+
+
+@pytest.mark.skipif("VALIDATION_BUDGET_SECONDS" not in os.environ,
+                    reason="benchmark; set VALIDATION_BUDGET_SECONDS to run")
+def test_validation_throughput():
+    """Bulk ingestion needs thousands of forms per second per core"""
+    budget = float(os.environ["VALIDATION_BUDGET_SECONDS"])
+    validator, form = _connie()
+    started = time.perf_counter()
+    for _ in range(200):
+        validator.validate(form)
+    assert (time.perf_counter() - started) / 200 < budget
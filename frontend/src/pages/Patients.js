@@ -8,6 +8,24 @@ const Patients = () => {
   const [userInfo, setUserInfo] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
+  const [hpData, setHpData] = useState({});
+
+  // The H&P XML is fetched the first time its section is opened, and again
+  // on the next open if that failed
+  const loadHP = async (patientId, open) => {
+    const entry = hpData[patientId];
+    if (!open || (entry && !entry.failed)) return;
+    setHpData((current) => ({ ...current, [patientId]: { text: 'Loading...' } }));
+    try {
+      const xml = await patientsAPI.getPatientHP(patientId);
+      setHpData((current) => ({ ...current, [patientId]: { text: xml } }));
+    } catch (err) {
+      setHpData((current) => ({
+        ...current,
+        [patientId]: { text: 'Failed to load H&P XML. Close and reopen to retry.', failed: true }
+      }));
+    }
+  };
 
   useEffect(() => {
     const fetchData = async () => {
@@ -82,8 +100,8 @@ const Patients = () => {
                       <p><strong>Address:</strong> {patient.address}</p>
                       <p><strong>Phone:</strong> {patient.phone}</p>
                       <p><strong>Email:</strong> {patient.email}</p>
-                      {patient.xml_data && (
-                        <details>
+                      {patient.has_hp && (
+                        <details onToggle={(e) => loadHP(patient.patient_id, e.target.open)}>
                           <summary>View XML Data</summary>
                           <pre style={{ 
                             background: '#f5f5f5', 
@@ -92,7 +110,7 @@ const Patients = () => {
                             maxHeight: '200px',
                             fontSize: '12px'
                           }}>
-                            {patient.xml_data}
+                            {hpData[patient.patient_id] && hpData[patient.patient_id].text}
                           </pre>
                         </details>
                       )}
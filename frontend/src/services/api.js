@@ -50,6 +50,10 @@ export const patientsAPI = {
     const response = await api.get(`/patients/${id}`);
     return response.data;
   },
+  getPatientHP: async (id) => { // H&P XML, quality administrators only
+    const response = await api.get(`/patients/${id}/hp`, { responseType: 'text' });
+    return response.data;
+  },
 };
 
 export const formsAPI = {
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Query plan audit: run explain() on every query shape issued by the routers
+and fail if any of them falls back to a collection scan (COLLSCAN).
+
+Run after the API has started at least once (so Beanie has built the indexes):
+
+    python scripts/audit_query_plans.py
+"""
+import asyncio
+import sys
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+# Add the current directory to the Python path (since we're running from /app in the container)
+sys.path.append('/app')
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING
+
+
+# (collection, filter, sort) for every filtered query the routers issue.
+# Values are placeholders - only the shape matters to the planner.
+# Unfiltered listings (e.g. GET /patients) are full scans by design and are
+# not audited here.
+QUERY_SHAPES: List[Tuple[str, Dict[str, Any], Optional[List[Tuple[str, int]]]]] = [
+    # app/routers/auth.py
+    ("users", {"username": "Bob"}, None),
+    # app/routers/patients.py
+    ("patients", {"patient_id": 1}, None),
+    # app/routers/questions.py
+    ("questions", {"qid": "r_provided_cfc12d"}, None),
+    ("questions", {"visit_type": "SOC"}, None),
+    ("questions", {"category": "Patient_Tracking"}, None),
+    ("questions", {"visit_type": "SOC", "category": "Patient_Tracking"}, None),
+    # app/routers/forms.py
+    ("forms", {"form_id": 1}, None),
+    ("forms", {"patient_id": 1}, None),
+    ("forms", {"form_type": "SOC"}, None),
+    ("forms", {"patient_id": 1, "form_type": "SOC"}, None),
+    ("forms", {"patient_id": 1}, [("form_date", DESCENDING)]),
+    ("forms", {"form_type": "SOC"}, [("form_date", DESCENDING)]),
+    ("forms", {"patient_id": 1, "form_type": "SOC"}, [("form_date", DESCENDING)]),
+    ("forms", {"patient_id": 1, "form_type": "SOC"}, [("form_date", ASCENDING)]),
+    # services/form_diff.py
+    ("forms", {"form_id": {"$in": [1, 2]}}, None),
+    ("questions", {"qid": {"$in": ["r_provided_cfc12d"]}}, None),
+    # services/search.py (fallback until the in-memory index is built)
+    ("patients", {"$and": [{"name_tokens": {"$regex": "^chris"}}]}, [("name", ASCENDING)]),
+    ("patients", {"patient_id": {"$in": [1, 2]}}, None),
+    # services/summary.py (archive read-through)
+    ("summaries", {"form_id": 1, "revision": "f1.p1.t4", "user_type": "field_clinician"}, [("created_at", DESCENDING)]),
+    ("summaries", {"form_id": {"$in": [1, 2]}, "revision": {"$in": ["f1.p1.t4"]}, "user_type": "field_clinician"}, None),
+]
+
+
+def find_stages(plan: Any) -> List[str]:
+    """Collect every stage name in an explain() plan tree"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(find_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(find_stages(item))
+    return stages
+
+
+async def audit_query_plans() -> int:
+    """Explain every query shape and return the number of collection scans"""
+    # Connect to MongoDB
+    mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+    client = AsyncIOMotorClient(mongodb_url)
+    db = client[os.getenv("DATABASE_NAME", "patient_dashboard")]
+
+    failures = 0
+    for collection, query, sort in QUERY_SHAPES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+
+        stages = find_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+        shape = f"{collection}.find({query})" + (f".sort({sort})" if sort else "")
+
+        if "COLLSCAN" in stages:
+            failures += 1
+            print(f"FAIL  {shape}: {' <- '.join(stages)}")
+        else:
+            print(f"ok    {shape}: {' <- '.join(stages)}")
+
+    print(f"\n{len(QUERY_SHAPES)} query shapes audited, {failures} collection scan(s)")
+
+    # Close connection
+    client.close()
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if asyncio.run(audit_query_plans()) else 0)
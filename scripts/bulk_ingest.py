@@ -0,0 +1,178 @@
+"""
+Shared plumbing for the bulk ingestion scripts: file discovery, bounded
+batching, concurrent unordered bulk writers and progress reporting.
+"""
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+
+def source_root(source: str) -> str:
+    """The directory a source's files are named relative to: itself, a glob's fixed prefix, or a file's directory"""
+    if os.path.isdir(source):
+        return source
+    root = os.path.dirname(source)
+    while glob.has_magic(root):
+        root = os.path.dirname(root)
+    return root
+
+
+def expand_sources_with_names(sources: Iterable[str], pattern: str) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (path, name) for files from a mix of directories, globs and plain
+    paths (sorted, de-duplicated). The name is the path relative to the
+    source's root, with "/" separators, so it's the same wherever the tree is
+    mounted and tells apart same-named files in different directories.
+    """
+    seen = set()
+    for source in sources:
+        if os.path.isdir(source):
+            matches = glob.iglob(os.path.join(source, "**", pattern), recursive=True)
+        else:
+            matches = glob.iglob(source, recursive=True)
+
+        root = source_root(source)
+        for path in sorted(matches):
+            if os.path.isfile(path) and path not in seen:
+                seen.add(path)
+                yield path, os.path.relpath(path, root or os.curdir).replace(os.sep, "/")
+
+
+def expand_sources(sources: Iterable[str], pattern: str) -> Iterator[str]:
+    """Yield files from a mix of directories, globs and plain paths (sorted, de-duplicated)"""
+    for path, _ in expand_sources_with_names(sources, pattern):
+        yield path
+
+
+def content_hash(fields: Dict[str, Any]) -> str:
+    """Stable digest of a record's content, independent of key order"""
+    canonical = json.dumps(fields, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def revision_upsert(filter: Dict[str, Any], fields: Dict[str, Any],
+                    insert_only: Optional[Dict[str, Any]] = None, unset: Iterable[str] = ()) -> UpdateOne:
+    """
+    Upsert `fields`, bumping `revision` only when their content_hash changed.
+
+    Re-ingesting unchanged records therefore leaves revisions, and the
+    summaries cached by them, alone. A pipeline update, so the stored hash
+    can be compared in the same write; values are wrapped in $literal so
+    strings starting with "$" aren't read as field paths.
+    """
+    digest = content_hash(fields)
+    revision = {"$ifNull": ["$revision", 0]}
+    stage = {key: {"$literal": value} for key, value in fields.items()}
+    for key, value in (insert_only or {}).items():
+        stage[key] = {"$ifNull": [f"${key}", {"$literal": value}]}
+    stage["revision"] = {"$cond": [{"$eq": ["$content_hash", digest]}, revision, {"$add": [revision, 1]}]}
+    stage["content_hash"] = digest
+    pipeline = [{"$set": stage}]
+    if unset:
+        pipeline.append({"$unset": list(unset)})
+    return UpdateOne(filter, pipeline, upsert=True)
+
+
+class Progress:
+    """Counts ingested files/records and prints throughput at a fixed interval"""
+
+    def __init__(self, label: str, interval: float = 5.0):
+        self.label = label
+        self.interval = interval
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self.files = 0
+        self.records = 0
+        self.upserted = 0
+        self.modified = 0
+        self.errors: Dict[str, str] = {}
+
+    def file_done(self, records: int = 0):
+        self.files += 1
+        self.records += records
+        self.maybe_report()
+
+    def file_failed(self, path: str, error: str):
+        self.files += 1
+        self.errors[path] = error
+        print(f"  ! {path}: {error}")
+        self.maybe_report()
+
+    def maybe_report(self):
+        now = time.monotonic()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report()
+
+    def report(self, final: bool = False):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        prefix = "Done" if final else "Progress"
+        print(
+            f"{prefix}: {self.files} files, {self.records} {self.label} "
+            f"({self.upserted} new, {self.modified} updated, {len(self.errors)} errors) "
+            f"in {elapsed:.1f}s - {self.records / elapsed:.0f} {self.label}/s"
+        )
+
+
+class BulkWriter:
+    """
+    Buffers write operations into bounded batches and flushes them with
+    unordered bulk_write() calls across a fixed number of concurrent writers.
+
+    Memory is bounded by batch_size * (writers + queue depth) operations.
+    """
+
+    def __init__(self, collection, progress: Progress, batch_size: int = 1000, writers: int = 4):
+        self.collection = collection
+        self.progress = progress
+        self.batch_size = batch_size
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=writers * 2)
+        self.batch: List[Any] = []
+        self.batches = 0
+        self.tasks = [asyncio.create_task(self._writer()) for _ in range(writers)]
+
+    async def add(self, operation: Any):
+        """Queue one operation, blocking when all writers are busy"""
+        self.batch.append(operation)
+        if len(self.batch) >= self.batch_size:
+            await self._flush()
+
+    async def _flush(self):
+        # Numbered so errors from different batches don't overwrite each other
+        self.batches += 1
+        await self.queue.put((self.batches, self.batch))
+        self.batch = []
+
+    async def close(self):
+        """Flush the remaining batch and wait for the writers to drain"""
+        if self.batch:
+            await self._flush()
+        for _ in self.tasks:
+            await self.queue.put(None)
+        await asyncio.gather(*self.tasks)
+
+    async def _writer(self):
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            number, batch = item
+            try:
+                result = await self.collection.bulk_write(batch, ordered=False)
+                self.progress.upserted += result.upserted_count
+                self.progress.modified += result.modified_count
+            except BulkWriteError as e:
+                details = e.details or {}
+                self.progress.upserted += details.get("nUpserted", 0)
+                self.progress.modified += details.get("nModified", 0)
+                for error in details.get("writeErrors", []):
+                    self.progress.errors[f"batch {number} op {error.get('index')}"] = error.get("errmsg", "")
+                print(f"  ! bulk write had {len(details.get('writeErrors', []))} errors")
+            self.progress.maybe_report()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Bulk ingestion of form-response JSON files.
+
+Files are read one at a time, split into one form per top-level form type,
+and written with unordered bulk upserts in bounded batches. Form IDs are
+derived from (patient_id, file path, form_type) so re-running the same
+files updates the existing forms instead of duplicating them. A form's
+revision is bumped only when its content changed, so re-running leaves the
+summaries cached for unchanged forms valid.
+
+Every form is validated against the question catalog before it is written
+(see services/validation.py); a file with an invalid form is reported and
+skipped. --strict also rejects unknown fields and orphaned subitems.
+
+Each file is either a raw response ({"SOC": {...}, "RN": {...}}), in which
+case the patient comes from --patient-id or --patient-map, or an envelope:
+
+    {"patient_id": 1, "form_date": "2025-06-03", "survey_data": {"SOC": {...}}}
+
+Usage:
+    python scripts/ingest_forms.py assets/incoming/ --patient-map map.json
+    python scripts/ingest_forms.py 'exports/**/*.json' --batch-size 500 --writers 8
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Add the current directory to the Python path (since we're running from /app in the container)
+sys.path.append('/app')
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.models.form import FormType
+from bulk_ingest import BulkWriter, Progress, expand_sources_with_names, revision_upsert
+from migrate_forms import inject_question_descriptions, load_questions_cache_async
+from services.catalog import QUESTION_PROJECTION
+from services.validation import FormValidator
+
+
+# Field codes that carry the visit date, per form layout (MM/DD/YYYY)
+VISIT_DATE_FIELDS = ["cTO_visitdate", "VisitDate", "frm_visitdate", "M0090_INFO_COMPLETED_DT"]
+
+# Errors quoted per rejected file; the rest are counted
+MAX_REPORTED_ERRORS = 3
+
+# Form IDs are kept within 53 bits so they stay exact as JavaScript numbers
+FORM_ID_MASK = (1 << 53) - 1
+
+
+def deterministic_form_id(patient_id: int, source_name: str, form_type: str) -> int:
+    """Derive a stable form_id from the record's origin (its path relative to the source root)"""
+    key = f"{patient_id}:{source_name}:{form_type}".encode("utf-8")
+    digest = hashlib.blake2b(key, digest_size=8).digest()
+    return int.from_bytes(digest, "big") & FORM_ID_MASK or 1
+
+
+def parse_date(value: Any) -> Optional[datetime]:
+    """Parse the date formats found in form responses and envelopes"""
+    if not isinstance(value, str):
+        return None
+    for fmt in ("%m/%d/%Y", "%Y-%m-%d", "%Y-%m-%dT%H:%M:%S"):
+        try:
+            return datetime.strptime(value.strip(), fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def find_visit_date(categories: Dict[str, Any]) -> Optional[datetime]:
+    """Find the visit date inside one form type's categories"""
+    for field_code in VISIT_DATE_FIELDS:
+        for fields in categories.values():
+            if isinstance(fields, dict) and field_code in fields:
+                visit_date = parse_date(fields[field_code])
+                if visit_date:
+                    return visit_date
+    return None
+
+
+def parse_form_file(path: str, patient_map: Dict[str, int], default_patient_id: Optional[int],
+                    validator: Optional[FormValidator] = None, strict: bool = False,
+                    source_name: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Parse and validate one response file into form records (without descriptions).
+
+    source_name is the file's path relative to its source root (see
+    expand_sources_with_names); it defaults to the file name.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    file_name = os.path.basename(path)
+    source_name = source_name or file_name
+    if isinstance(data, dict) and "survey_data" in data:
+        patient_id = data.get("patient_id")
+        envelope_date = parse_date(data.get("form_date"))
+        survey_data = data["survey_data"]
+    else:
+        patient_id = None
+        envelope_date = None
+        survey_data = data
+
+    if patient_id is None:
+        patient_id = patient_map.get(source_name, patient_map.get(file_name, default_patient_id))
+    if patient_id is None:
+        raise ValueError("no patient_id (use an envelope, --patient-id or --patient-map)")
+    if not isinstance(survey_data, dict) or not survey_data:
+        raise ValueError("no survey data")
+
+    records = []
+    for form_type, categories in survey_data.items():
+        if form_type not in FormType.__members__:
+            raise ValueError(f"unknown form type {form_type!r}")
+        if not isinstance(categories, dict):
+            raise ValueError(f"{form_type} section is not an object")
+        if validator is not None:
+            result = validator.validate({form_type: categories}, strict)
+            if not result.valid:
+                quoted = "; ".join(f"{e.path}: {e.message}" for e in result.errors[:MAX_REPORTED_ERRORS])
+                more = len(result.errors) - MAX_REPORTED_ERRORS
+                raise ValueError(
+                    f"{len(result.errors)} validation error(s): {quoted}" + (f" (+{more} more)" if more > 0 else "")
+                )
+
+        records.append({
+            'form_id': deterministic_form_id(int(patient_id), source_name, form_type),
+            'patient_id': int(patient_id),
+            'form_date': envelope_date or find_visit_date(categories) or datetime.fromtimestamp(os.path.getmtime(path)),
+            'form_type': form_type,
+            'survey_data': {form_type: categories}
+        })
+    return records
+
+
+async def ingest_forms(
+    sources: List[str],
+    patient_map: Dict[str, int],
+    default_patient_id: Optional[int],
+    batch_size: int,
+    writers: int,
+    validate: bool = True,
+    strict: bool = False
+) -> Progress:
+    """Stream form files into the forms collection"""
+    # Connect to MongoDB
+    mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+    client = AsyncIOMotorClient(mongodb_url)
+    db = client["patient_dashboard"]
+
+    # Load questions cache for descriptions
+    print("Loading questions cache...")
+    questions_cache = await load_questions_cache_async(db)
+    print(f"Loaded {len(questions_cache)} questions for description lookup")
+
+    validator = None
+    if validate:
+        questions = await db.questions.find({}, QUESTION_PROJECTION).to_list(length=None)
+        validator = (
+            FormValidator.compile(questions) if questions
+            else FormValidator.from_schema_file('assets/question_schema.json')
+        )
+
+    progress = Progress("forms")
+    writer = BulkWriter(db.forms, progress, batch_size=batch_size, writers=writers)
+
+    for path, source_name in expand_sources_with_names(sources, "*.json"):
+        try:
+            # Parse off the event loop so writers keep flushing meanwhile
+            records = await asyncio.to_thread(
+                parse_form_file, path, patient_map, default_patient_id, validator, strict, source_name
+            )
+        except Exception as e:
+            progress.file_failed(path, str(e))
+            continue
+
+        for record in records:
+            record['survey_data'] = inject_question_descriptions(record['survey_data'], questions_cache)
+            await writer.add(revision_upsert({'form_id': record['form_id']}, record))
+        progress.file_done(len(records))
+
+    await writer.close()
+    progress.report(final=True)
+
+    # Close connection
+    client.close()
+    return progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk ingest form-response JSON files")
+    parser.add_argument("sources", nargs="+", help="Directories, globs or files to ingest")
+    parser.add_argument("--patient-id", type=int, help="Patient for raw response files")
+    parser.add_argument("--patient-map", help="JSON file mapping file name (or path under the source) -> patient_id")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Operations per bulk write")
+    parser.add_argument("--writers", type=int, default=4, help="Concurrent bulk writers")
+    parser.add_argument("--strict", action="store_true", help="Also reject unknown fields and orphaned subitems")
+    parser.add_argument("--no-validate", action="store_true", help="Skip validation against the question catalog")
+    args = parser.parse_args()
+
+    patient_map = {}
+    if args.patient_map:
+        with open(args.patient_map, 'r', encoding='utf-8') as f:
+            patient_map = {name: int(pid) for name, pid in json.load(f).items()}
+
+    progress = asyncio.run(ingest_forms(
+        args.sources, patient_map, args.patient_id, args.batch_size, args.writers,
+        validate=not args.no_validate, strict=args.strict
+    ))
+    sys.exit(1 if progress.errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Parallel ingestion of H&P summary XML files.
+
+XML parsing is fanned out over a process pool while the event loop streams
+parsed patients into unordered bulk upserts keyed by MRN. At most
+--window files are in flight at once, so memory stays bounded no matter
+how many files are ingested. New patients get IDs from the shared
+"patient_id" sequence; existing MRNs are updated in place, and their
+revision is bumped only when the parsed content changed. The H&P XML
+itself is compressed in the parser processes and stored in hp_documents.
+
+Usage:
+    python scripts/ingest_patients.py 'backfill/**/*.xml' --workers 8
+"""
+import argparse
+import asyncio
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+# Add the current directory to the Python path (since we're running from /app in the container)
+sys.path.append('/app')
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.core.counters import next_sequence, seed_sequence
+from bulk_ingest import BulkWriter, Progress, expand_sources, revision_upsert
+from migrate_patients import parse_xml_file
+from services.hp_store import hp_upsert, offload_hp
+
+
+def parse_patient_file(path: str) -> Tuple[str, Optional[Dict[str, Any]], Optional[Dict[str, Any]], Optional[str]]:
+    """Process pool entry point: (path, patient info, compressed H&P document, error)"""
+    try:
+        patient_info = parse_xml_file(path)
+    except Exception as e:
+        return path, None, None, str(e)
+    if patient_info['mrn'] is None:
+        return path, None, None, "no MRN found"
+    # Compress here too, so the event loop only moves bytes
+    hp_document = offload_hp(patient_info)
+    return path, patient_info, hp_document, None
+
+
+class PatientIdAllocator:
+    """Hands out patient IDs from blocks reserved on the shared sequence"""
+
+    def __init__(self, db, block_size: int):
+        self.db = db
+        self.block_size = block_size
+        self.next_id = 0
+        self.last_id = -1
+
+    async def next(self) -> int:
+        if self.next_id > self.last_id:
+            self.next_id = await next_sequence(self.db, "patient_id", self.block_size)
+            self.last_id = self.next_id + self.block_size - 1
+        patient_id = self.next_id
+        self.next_id += 1
+        return patient_id
+
+
+async def ingest_patients(sources: List[str], workers: int, window: int, batch_size: int, writers: int) -> Progress:
+    """Parse XML files in parallel and upsert patients by MRN"""
+    # Connect to MongoDB
+    mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+    client = AsyncIOMotorClient(mongodb_url)
+    db = client["patient_dashboard"]
+
+    await seed_sequence(db, "patient_id", "patients", "patient_id")
+    allocator = PatientIdAllocator(db, batch_size)
+
+    progress = Progress("patients")
+    writer = BulkWriter(db.patients, progress, batch_size=batch_size, writers=writers)
+    # H&P XML goes to hp_documents; a patient may briefly reference one that is
+    # still queued, and every document is written before the run finishes
+    hp_progress = Progress("H&P documents")
+    hp_writer = BulkWriter(db.hp_documents, hp_progress, batch_size=batch_size, writers=writers)
+
+    async def handle(done):
+        for future in done:
+            path, patient_info, hp_document, error = future.result()
+            if error:
+                progress.file_failed(path, error)
+                continue
+            if hp_document:
+                await hp_writer.add(hp_upsert(hp_document))
+            # IDs reserved for MRNs that already exist are simply skipped
+            await writer.add(revision_upsert(
+                {'mrn': patient_info['mrn']},
+                patient_info,
+                insert_only={'patient_id': await allocator.next()},
+                unset=['xml_data']
+            ))
+            progress.file_done(1)
+
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for path in expand_sources(sources, "*.xml"):
+            pending.add(loop.run_in_executor(pool, parse_patient_file, path))
+            if len(pending) >= window:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                await handle(done)
+        if pending:
+            done, _ = await asyncio.wait(pending)
+            await handle(done)
+
+    await hp_writer.close()
+    await writer.close()
+    progress.errors.update(hp_progress.errors)
+    progress.report(final=True)
+
+    # Close connection
+    client.close()
+    return progress
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Parallel ingest of H&P summary XML files")
+    parser.add_argument("sources", nargs="+", help="Directories, globs or files to ingest")
+    parser.add_argument("--workers", type=int, default=cpus, help="Parser processes (default: all cores)")
+    parser.add_argument("--window", type=int, default=cpus * 8, help="Max files in flight")
+    parser.add_argument("--batch-size", type=int, default=500, help="Operations per bulk write")
+    parser.add_argument("--writers", type=int, default=4, help="Concurrent bulk writers")
+    args = parser.parse_args()
+
+    progress = asyncio.run(ingest_patients(
+        args.sources, args.workers, args.window, args.batch_size, args.writers
+    ))
+    if progress.errors:
+        print(f"\n{len(progress.errors)} file(s) failed:")
+        for path, error in sorted(progress.errors.items()):
+            print(f"  - {path}: {error}")
+    sys.exit(1 if progress.errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Materialize form answers into the columnar analytics store.
+
+Compares every form's revision with the current snapshot and re-reads only
+forms that are new or changed (dropping deleted ones), then publishes a new
+snapshot for the API's /analytics endpoints. Run it on a schedule; a run
+with nothing to do costs one projected scan of form ids and revisions.
+
+Usage:
+    python scripts/materialize_answers.py
+    python scripts/materialize_answers.py --full        # rebuild from scratch
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import List
+
+# Add the current directory to the Python path (since we're running from /app in the container)
+sys.path.append('/app')
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from services.analytics import STORE_DIR, AnswerStore, AnswerStoreBuilder
+
+FORM_PROJECTION = {
+    "_id": 0, "form_id": 1, "patient_id": 1, "form_type": 1,
+    "form_date": 1, "revision": 1, "survey_data": 1
+}
+
+
+def chunks(items: List[int], size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+async def materialize(full: bool, batch_size: int, store_dir: str) -> bool:
+    """Bring the store up to date; returns False if nothing changed"""
+    # Connect to MongoDB
+    mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+    client = AsyncIOMotorClient(mongodb_url)
+    db = client[os.getenv("DATABASE_NAME", "patient_dashboard")]
+
+    started = time.monotonic()
+    os.makedirs(store_dir, exist_ok=True)
+    store = None if full else AnswerStore.load(store_dir)
+    store = store or AnswerStore.empty()
+    known = store.revisions()
+
+    current = {}
+    async for doc in db.forms.find({}, {"_id": 0, "form_id": 1, "revision": 1}):
+        current[doc["form_id"]] = doc.get("revision", 0)
+
+    changed = [form_id for form_id, revision in current.items() if known.get(form_id) != revision]
+    removed = set(known) - set(current)
+    if not changed and not removed:
+        print(f"Analytics store is up to date ({len(known)} forms)")
+        client.close()
+        return False
+
+    builder = AnswerStoreBuilder(store, set(changed) | removed)
+    for batch in chunks(changed, batch_size):
+        async for doc in db.forms.find({"form_id": {"$in": batch}}, FORM_PROJECTION):
+            builder.add_form(doc)
+
+    new_store = builder.build()
+    snapshot = new_store.save(store_dir)
+    client.close()
+
+    elapsed = time.monotonic() - started
+    print(
+        f"Published {snapshot}: {len(changed)} forms (re)read, {len(removed)} removed, "
+        f"{len(new_store.forms['form_id'])} forms / {len(new_store)} answers in {elapsed:.1f}s"
+    )
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Materialize form answers for analytics")
+    parser.add_argument("--full", action="store_true", help="Rebuild instead of updating by revision")
+    parser.add_argument("--batch-size", type=int, default=500, help="Forms read per query")
+    parser.add_argument("--store-dir", default=STORE_DIR, help="Snapshot directory (ANALYTICS_STORE_DIR)")
+    args = parser.parse_args()
+
+    asyncio.run(materialize(args.full, args.batch_size, args.store_dir))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Versioned migration runner.
+
+Every step has a version; applied versions are recorded in the
+`migrations` collection and a step only runs again when its version
+changes (or with --force). All steps share one Motor client, and steps
+whose dependencies are satisfied run concurrently.
+
+The indexes step builds the models' indexes (the API skips index
+management at startup so workers boot fast) and re-runs whenever the
+declared indexes change; the seed steps run after it so their upserts
+are backed by the unique indexes.
+
+The questions step versions itself by the schema file's content hash and
+only upserts questions whose definition hash changed, so refreshing
+question_schema.json touches just the edited questions. Seed steps use
+insert-only upserts and never overwrite existing documents. The hp_storage
+step moves H&P XML stored inline on patients into compressed hp_documents,
+and patient_name_tokens fills in the name_tokens patient search matches on.
+
+Usage:
+    python scripts/migrate.py               # apply pending steps
+    python scripts/migrate.py --force questions
+    python scripts/migrate.py --status
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+# Add the current directory to the Python path (since we're running from /app in the container)
+sys.path.append('/app')
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DeleteOne, UpdateOne
+from app.core.database import DOCUMENT_MODELS, ensure_indexes, index_version
+from app.models.patient import name_tokens
+from migrate_users import build_seed_users
+from migrate_patients import build_seed_patients
+from migrate_questions_schema import parse_question_schema
+from migrate_forms import build_seed_forms, load_questions_cache_async
+from services.hp_store import hp_upsert, offload_hp
+
+QUESTION_SCHEMA_FILE = 'assets/question_schema.json'
+HP_MIGRATION_BATCH_SIZE = 200
+NAME_TOKENS_BATCH_SIZE = 1000
+
+
+def file_version(path: str) -> str:
+    """Version a step by the content hash of its source file"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def question_definition_hash(question: Dict[str, Any]) -> str:
+    """Hash the parts of a question definition that the app reads"""
+    definition = {
+        'description': question['description'],
+        'casting': question['casting'],
+        'subitems': question.get('subitems')
+    }
+    canonical = json.dumps(definition, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def question_key(question: Dict[str, Any]) -> tuple:
+    return (question.get('visit_type'), question.get('category'), question['qid'])
+
+
+async def insert_missing(collection, documents: List[Dict[str, Any]], key: str) -> Dict[str, int]:
+    """Insert documents whose key does not exist yet, leaving existing ones untouched"""
+    if not documents:
+        return {'inserted': 0}
+    operations = [
+        UpdateOne({key: doc[key]}, {'$setOnInsert': doc}, upsert=True)
+        for doc in documents
+    ]
+    result = await collection.bulk_write(operations, ordered=False)
+    return {'inserted': result.upserted_count}
+
+
+async def build_indexes(db) -> Dict[str, int]:
+    await ensure_indexes(db)
+    return {'collections': len(DOCUMENT_MODELS)}
+
+
+async def seed_users(db) -> Dict[str, int]:
+    return await insert_missing(db.users, await asyncio.to_thread(build_seed_users), 'username')
+
+
+async def seed_patients(db) -> Dict[str, int]:
+    patients = await asyncio.to_thread(build_seed_patients)
+    hp_documents = [document for document in map(offload_hp, patients) if document]
+    if hp_documents:
+        await db.hp_documents.bulk_write([hp_upsert(document) for document in hp_documents], ordered=False)
+    return await insert_missing(db.patients, patients, 'patient_id')
+
+
+def encode_inline_hp(patients: List[Dict[str, Any]]) -> Tuple[List[UpdateOne], List[UpdateOne]]:
+    """hp_documents upserts and patient updates moving each inline xml_data out"""
+    hp_operations, patient_operations = [], []
+    for patient in patients:
+        document = offload_hp(patient)
+        hp_operations.append(hp_upsert(document))
+        # The H&P itself is unchanged, so the revision (and cached summaries) stay as they are
+        patient_operations.append(UpdateOne(
+            {'_id': patient['_id'], 'xml_data': {'$exists': True}},
+            {'$set': {'hp': patient['hp']}, '$unset': {'xml_data': ''}}
+        ))
+    return hp_operations, patient_operations
+
+
+async def move_hp_to_storage(db) -> Dict[str, int]:
+    """Compress inline patient xml_data into hp_documents, referenced by hash"""
+    moved = 0
+    while True:
+        # Each pass takes the next batch still holding xml_data, so an interrupted run resumes
+        patients = await db.patients.find(
+            {'xml_data': {'$type': 'string', '$ne': ''}}, {'_id': 1, 'xml_data': 1}
+        ).limit(HP_MIGRATION_BATCH_SIZE).to_list(length=HP_MIGRATION_BATCH_SIZE)
+        if not patients:
+            break
+        hp_operations, patient_operations = await asyncio.to_thread(encode_inline_hp, patients)
+        # Documents first, so no patient ever references a missing one
+        await db.hp_documents.bulk_write(hp_operations, ordered=False)
+        await db.patients.bulk_write(patient_operations, ordered=False)
+        moved += len(patients)
+    # Empty or null leftovers have nothing to move
+    cleared = await db.patients.update_many({'xml_data': {'$exists': True}}, {'$unset': {'xml_data': ''}})
+    return {'moved': moved, 'cleared': cleared.modified_count}
+
+
+async def fill_name_tokens(db) -> Dict[str, int]:
+    """Set name_tokens on patients written before it existed (or by raw writes that skipped it)"""
+    filled = 0
+    operations = []
+    async for patient in db.patients.find({'name_tokens': {'$exists': False}}, {'_id': 1, 'name': 1}):
+        # Derived from the name, so the revision (and cached summaries) stay as they are
+        operations.append(UpdateOne({'_id': patient['_id']}, {'$set': {'name_tokens': name_tokens(patient.get('name'))}}))
+        if len(operations) >= NAME_TOKENS_BATCH_SIZE:
+            await db.patients.bulk_write(operations, ordered=False)
+            filled += len(operations)
+            operations = []
+    if operations:
+        await db.patients.bulk_write(operations, ordered=False)
+        filled += len(operations)
+    return {'filled': filled}
+
+
+async def seed_forms(db) -> Dict[str, int]:
+    questions_cache = await load_questions_cache_async(db)
+    return await insert_missing(db.forms, build_seed_forms(questions_cache), 'form_id')
+
+
+async def sync_questions(db) -> Dict[str, int]:
+    """Upsert changed questions and remove ones dropped from the schema"""
+    questions = await asyncio.to_thread(parse_question_schema, QUESTION_SCHEMA_FILE)
+    if not questions:
+        raise RuntimeError(f"No questions parsed from {QUESTION_SCHEMA_FILE}")
+
+    existing = {}
+    projection = {'qid': 1, 'visit_type': 1, 'category': 1, 'definition_hash': 1}
+    async for doc in db.questions.find({}, projection):
+        existing[question_key(doc)] = doc.get('definition_hash')
+
+    operations = []
+    unchanged = 0
+    for question in questions:
+        question['definition_hash'] = question_definition_hash(question)
+        key = question_key(question)
+        if existing.pop(key, None) == question['definition_hash']:
+            unchanged += 1
+            continue
+        question.setdefault('subitems', None)
+        operations.append(UpdateOne(
+            {'visit_type': key[0], 'category': key[1], 'qid': key[2]},
+            {'$set': question},
+            upsert=True
+        ))
+
+    # Anything left in `existing` is no longer in the schema
+    for visit_type, category, qid in existing:
+        operations.append(DeleteOne({'visit_type': visit_type, 'category': category, 'qid': qid}))
+
+    if operations:
+        await db.questions.bulk_write(operations, ordered=False)
+    return {'changed': len(operations) - len(existing), 'removed': len(existing), 'unchanged': unchanged}
+
+
+class Step:
+    """A named, versioned migration step"""
+
+    def __init__(
+        self,
+        name: str,
+        version: Callable[[], str],
+        apply: Callable[[Any], Awaitable[Dict[str, int]]],
+        depends_on: List[str] = None
+    ):
+        self.name = name
+        self.version = version
+        self.apply = apply
+        self.depends_on = depends_on or []
+
+
+STEPS = [
+    Step("indexes", index_version, build_indexes),
+    Step("users", lambda: "1", seed_users, depends_on=["indexes"]),
+    Step("patients", lambda: "1", seed_patients, depends_on=["indexes"]),
+    Step("hp_storage", lambda: "1", move_hp_to_storage, depends_on=["patients"]),
+    Step("patient_name_tokens", lambda: "1", fill_name_tokens, depends_on=["patients"]),
+    Step("questions", lambda: file_version(QUESTION_SCHEMA_FILE), sync_questions, depends_on=["indexes"]),
+    # Forms embed question descriptions, so they run after the questions
+    Step("forms", lambda: "1", seed_forms, depends_on=["indexes", "questions"]),
+]
+
+
+async def run_step(db, step: Step, force: bool) -> str:
+    version = step.version()
+    applied = await db.migrations.find_one({'_id': step.name})
+    if applied and applied.get('version') == version and not force:
+        return f"{step.name}: up to date (version {version})"
+
+    started = datetime.utcnow()
+    result = await step.apply(db)
+    await db.migrations.update_one(
+        {'_id': step.name},
+        {'$set': {'version': version, 'applied_at': started, 'result': result}},
+        upsert=True
+    )
+    elapsed = (datetime.utcnow() - started).total_seconds()
+    return f"{step.name}: applied version {version} in {elapsed:.2f}s {result}"
+
+
+async def run_migrations(force: List[str], status_only: bool = False) -> bool:
+    """Run pending steps in dependency waves; returns False if any step failed"""
+    # Connect to MongoDB
+    mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+    client = AsyncIOMotorClient(mongodb_url)
+    db = client["patient_dashboard"]
+
+    if status_only:
+        for step in STEPS:
+            applied = await db.migrations.find_one({'_id': step.name}) or {}
+            pending = applied.get('version') != step.version()
+            print(f"{step.name}: {applied.get('version', 'never applied')}{' (pending)' if pending else ''}")
+        client.close()
+        return True
+
+    done = set()
+    failed = set()
+    remaining = list(STEPS)
+    while remaining:
+        ready = [s for s in remaining if all(d in done for d in s.depends_on)]
+        blocked = [s for s in remaining if any(d in failed for d in s.depends_on)]
+        for step in blocked:
+            print(f"{step.name}: skipped (dependency failed)")
+            failed.add(step.name)
+        if not ready:
+            break
+
+        results = await asyncio.gather(
+            *(run_step(db, s, s.name in force or "all" in force) for s in ready),
+            return_exceptions=True
+        )
+        for step, result in zip(ready, results):
+            if isinstance(result, Exception):
+                print(f"{step.name}: FAILED - {result}")
+                failed.add(step.name)
+            else:
+                print(result)
+                done.add(step.name)
+        remaining = [s for s in remaining if s.name not in done and s.name not in failed]
+
+    # Close connection
+    client.close()
+    return not failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply pending database migrations")
+    parser.add_argument("--force", nargs="*", default=[], help="Re-run these steps ('all' for every step)")
+    parser.add_argument("--status", action="store_true", help="Show applied versions and exit")
+    args = parser.parse_args()
+
+    ok = asyncio.run(run_migrations(args.force, args.status))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
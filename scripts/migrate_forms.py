@@ -45,11 +45,13 @@ def load_questions_cache() -> Dict[str, str]:
     return {}
 
 
-async def load_questions_cache_async() -> Dict[str, str]:
+async def load_questions_cache_async(db=None) -> Dict[str, str]:
     """Load questions from database to create a cache for descriptions"""
-    mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
-    client = AsyncIOMotorClient(mongodb_url)
-    db = client["patient_dashboard"]
+    client = None
+    if db is None:
+        mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+        client = AsyncIOMotorClient(mongodb_url)
+        db = client["patient_dashboard"]
     
     questions = await db.questions.find({}, {"qid": 1, "description": 1, "casting": 1}).to_list(length=None)
     
@@ -67,7 +69,8 @@ async def load_questions_cache_async() -> Dict[str, str]:
             if isinstance(value, str):
                 cache[value] = description
     
-    client.close()
+    if client:
+        client.close()
     return cache
 
 
@@ -82,25 +85,8 @@ def parse_form_response_file(file_path: str) -> Dict[str, Any]:
         return {}
 
 
-async def migrate_forms():
-    """Create forms from form_response_*.json files"""
-    # Connect to MongoDB
-    mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
-    client = AsyncIOMotorClient(mongodb_url)
-    db = client["patient_dashboard"]
-    
-    # Check if forms already exist
-    existing_forms = await db.forms.find().to_list(length=None)
-    if existing_forms:
-        print("Forms already exist in the database. Skipping migration.")
-        return
-    
-    # Load questions cache for descriptions
-    print("Loading questions cache...")
-    questions_cache = await load_questions_cache_async()
-    print(f"Loaded {len(questions_cache)} questions for description lookup")
-    
-    # Parse form response files
+def build_seed_forms(questions_cache: Dict[str, str]) -> List[Dict[str, Any]]:
+    """Build the sample forms from the form_response_*.json files"""
     forms_data = []
     
     # Christopher's SOC form
@@ -141,6 +127,29 @@ async def migrate_forms():
             })
             print("Added Connie's PTEVAL form")
     
+    return forms_data
+
+
+async def migrate_forms():
+    """Create forms from form_response_*.json files"""
+    # Connect to MongoDB
+    mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+    client = AsyncIOMotorClient(mongodb_url)
+    db = client["patient_dashboard"]
+    
+    # Check if forms already exist
+    if await db.forms.find_one({}, {"_id": 1}):
+        print("Forms already exist in the database. Skipping migration.")
+        return
+    
+    # Load questions cache for descriptions
+    print("Loading questions cache...")
+    questions_cache = await load_questions_cache_async(db)
+    print(f"Loaded {len(questions_cache)} questions for description lookup")
+    
+    # Parse form response files
+    forms_data = build_seed_forms(questions_cache)
+    
     if forms_data:
         # Insert forms
         result = await db.forms.insert_many(forms_data)
@@ -7,13 +7,32 @@ import sys
 import os
 import re
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 # Add the current directory to the Python path (since we're running from /app in the container)
 sys.path.append('/app')
 
 from motor.motor_asyncio import AsyncIOMotorClient
-from app.models.patient import Patient
+from app.models.patient import Patient, name_tokens
+
+
+# Patterns are compiled once per process; bulk ingestion calls parse_xml_file per file
+NAME_RE = re.compile(r'- Name: (.+)')
+DOB_RE = re.compile(r'- Date of Birth: (\d{1,2}/\d{1,2}/\d{4})')
+GENDER_RE = re.compile(r'- Gender: (\w+)')
+MRN_RE = re.compile(r'- MRN: (\d+)')
+ADDRESS_RE = re.compile(r'- (?:Home Address|Current Address): (.+)')
+PHONE_RES = [
+    re.compile(r'- Phone(?: Numbers)?:.*?(\d{3}-\d{3}-\d{4})', re.DOTALL),
+    re.compile(r'Phone: (\d{3}-\d{3}-\d{4})', re.DOTALL),
+    re.compile(r'(\d{3}-\d{3}-\d{4})', re.DOTALL)
+]
+EMAIL_RE = re.compile(r'- Email: ([^\s,]+)')
+SSN_RE = re.compile(r'(\d{3}-\d{2}-\d{4})')
+EMAIL_FALLBACK_RES = [
+    re.compile(r'Email: ([^\s,]+)'),
+    re.compile(r'([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})')
+]
 
 
 def parse_xml_file(file_path: str) -> Dict[str, Any]:
@@ -22,31 +41,26 @@ def parse_xml_file(file_path: str) -> Dict[str, Any]:
         content = f.read()
     
     # Extract basic demographics
-    name_match = re.search(r'- Name: (.+)', content)
-    dob_match = re.search(r'- Date of Birth: (\d{1,2}/\d{1,2}/\d{4})', content)
-    gender_match = re.search(r'- Gender: (\w+)', content)
-    mrn_match = re.search(r'- MRN: (\d+)', content)
+    name_match = NAME_RE.search(content)
+    dob_match = DOB_RE.search(content)
+    gender_match = GENDER_RE.search(content)
+    mrn_match = MRN_RE.search(content)
     
     # Extract contact information
-    address_match = re.search(r'- (?:Home Address|Current Address): (.+)', content)
+    address_match = ADDRESS_RE.search(content)
     
     # Try multiple phone number patterns
     phone = None
-    phone_patterns = [
-        r'- Phone(?: Numbers)?:.*?(\d{3}-\d{3}-\d{4})',
-        r'Phone: (\d{3}-\d{3}-\d{4})',
-        r'(\d{3}-\d{3}-\d{4})'
-    ]
-    for pattern in phone_patterns:
-        phone_match = re.search(pattern, content, re.DOTALL)
+    for pattern in PHONE_RES:
+        phone_match = pattern.search(content)
         if phone_match:
             phone = phone_match.group(1)
             break
     
-    email_match = re.search(r'- Email: ([^\s,]+)', content)
+    email_match = EMAIL_RE.search(content)
     
     # Extract SSN for MRN if not found
-    ssn_match = re.search(r'(\d{3}-\d{2}-\d{4})', content)
+    ssn_match = SSN_RE.search(content)
     
     # Parse date of birth
     dob = None
@@ -79,18 +93,16 @@ def parse_xml_file(file_path: str) -> Dict[str, Any]:
         email = email_match.group(1).strip()
     else:
         # Try alternative email patterns
-        email_patterns = [
-            r'Email: ([^\s,]+)',
-            r'([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})'
-        ]
-        for pattern in email_patterns:
-            email_match = re.search(pattern, content)
+        for pattern in EMAIL_FALLBACK_RES:
+            email_match = pattern.search(content)
             if email_match:
                 email = email_match.group(1).strip()
                 break
     
+    name = name_match.group(1).strip() if name_match else 'Unknown'
     return {
-        'name': name_match.group(1).strip() if name_match else 'Unknown',
+        'name': name,
+        'name_tokens': name_tokens(name),
         'dob': dob,
         'gender': gender_match.group(1) if gender_match else 'Unknown',
         'mrn': mrn,
@@ -101,20 +113,8 @@ def parse_xml_file(file_path: str) -> Dict[str, Any]:
     }
 
 
-async def migrate_patients():
-    """Create patients from XML files"""
-    # Connect to MongoDB
-    mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
-    client = AsyncIOMotorClient(mongodb_url)
-    db = client["patient_dashboard"]
-    
-    # Check if patients already exist
-    existing_patients = await db.patients.find().to_list(length=None)
-    if existing_patients:
-        print("Patients already exist in the database. Skipping migration.")
-        return
-    
-    # Parse XML files
+def build_seed_patients() -> List[Dict[str, Any]]:
+    """Parse the sample H&P XML files into patient documents"""
     xml_files = [
         ('assets/hp_summary_example_christopher.xml', 1),
         ('assets/hp_summary_example_connie.xml', 2)
@@ -135,6 +135,24 @@ async def migrate_patients():
         else:
             print(f"Warning: {xml_file} not found")
     
+    return patients_data
+
+
+async def migrate_patients():
+    """Create patients from XML files"""
+    # Connect to MongoDB
+    mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+    client = AsyncIOMotorClient(mongodb_url)
+    db = client["patient_dashboard"]
+    
+    # Check if patients already exist
+    if await db.patients.find_one({}, {"_id": 1}):
+        print("Patients already exist in the database. Skipping migration.")
+        return
+    
+    # Parse XML files
+    patients_data = build_seed_patients()
+    
     if patients_data:
         # Insert patients
         result = await db.patients.insert_many(patients_data)
@@ -63,8 +63,7 @@ async def migrate_questions():
     db = client["patient_dashboard"]
     
     # Check if questions already exist
-    existing_questions = await db.questions.find().to_list(length=None)
-    if existing_questions:
+    if await db.questions.find_one({}, {"_id": 1}):
         print("Questions already exist in the database. Skipping migration.")
         return
     
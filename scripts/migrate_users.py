@@ -14,21 +14,9 @@ from app.core.security import get_password_hash
 from app.models.user import User, UserType
 
 
-async def migrate_users():
-    """Create initial users in the database"""
-    # Connect to MongoDB (use service name in Docker, localhost for local development)
-    mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
-    client = AsyncIOMotorClient(mongodb_url)
-    db = client["patient_dashboard"]
-    
-    # Check if users already exist
-    existing_users = await db.users.find().to_list(length=None)
-    if existing_users:
-        print("Users already exist in the database. Skipping migration.")
-        return
-    
-    # Create users with hashed passwords
-    users_data = [
+def build_seed_users():
+    """Build the default users with hashed passwords"""
+    return [
         {
             "user_id": 1,
             "username": "Bob",
@@ -42,6 +30,22 @@ async def migrate_users():
             "user_type": UserType.QUALITY_ADMINISTRATOR
         }
     ]
+
+
+async def migrate_users():
+    """Create initial users in the database"""
+    # Connect to MongoDB (use service name in Docker, localhost for local development)
+    mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+    client = AsyncIOMotorClient(mongodb_url)
+    db = client["patient_dashboard"]
+    
+    # Check if users already exist
+    if await db.users.find_one({}, {"_id": 1}):
+        print("Users already exist in the database. Skipping migration.")
+        return
+    
+    # Create users with hashed passwords
+    users_data = build_seed_users()
     
     # Insert users
     result = await db.users.insert_many(users_data)